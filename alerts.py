@@ -0,0 +1,121 @@
+import threading
+import time
+
+
+class Ladder:
+    """Ordered alert levels with separate enter and exit thresholds (hysteresis).
+
+    A level is entered when the value reaches its `enter` threshold and is
+    only left once the value falls below its lower `exit` threshold, so a
+    value hovering around a boundary does not flap between levels.
+    """
+
+    def __init__(self, levels):
+        self.names = [name for name, _, _ in levels]
+        self.enter = [enter for _, enter, _ in levels]
+        self.exit = [exit_ for _, _, exit_ in levels]
+
+    def level(self, value, current=-1):
+        idx = -1
+        for i, threshold in enumerate(self.enter):
+            if value >= threshold:
+                idx = i
+        while current > idx and value < self.exit[current]:
+            current -= 1
+        return max(idx, current)
+
+
+# Zone occupancy in percent
+CAPACITY_LADDER = Ladder([('warning', 80, 75), ('over_capacity', 100, 95)])
+# Fraction of density points at Critical risk (5 of 25 points, as the per-event loop used)
+DENSITY_LADDER = Ladder([('Critical', 0.2, 0.12)])
+
+
+class AlertState:
+    __slots__ = ('level', 'last_notified', 'suppressed', 'total_suppressed')
+
+    def __init__(self):
+        self.level = -1
+        self.last_notified = 0.0
+        self.suppressed = 0
+        self.total_suppressed = 0
+
+
+class Decision:
+    __slots__ = ('level', 'notify', 'suppressed', 'escalated')
+
+    def __init__(self, level, notify=False, suppressed=0, escalated=False):
+        self.level = level
+        self.notify = notify
+        self.suppressed = suppressed  # alerts held back since the previous notification
+        self.escalated = escalated
+
+
+class AlertGate:
+    """Per-(event, zone, type) alert state with suppression windows.
+
+    Within the suppression window only an escalation to a higher level is
+    notified; repeats are counted instead. Once the window has passed the
+    current level is re-notified together with the suppressed count.
+    With several workers, set `shared` to a cluster.SharedGenerations so
+    `reset` clears an event's states in every worker.
+    """
+
+    def __init__(self, window_seconds=300, clock=time.monotonic):
+        self.window = window_seconds
+        self.clock = clock
+        self._states = {}
+        self._lock = threading.Lock()
+        self.shared = None
+
+    def _sync(self, event_id):
+        if self.shared is not None and self.shared.changed(event_id):
+            self._drop(event_id)
+
+    def observe(self, key, ladder, value):
+        self._sync(key[1])
+        now = self.clock()
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = AlertState()
+            idx = ladder.level(value, state.level)
+            if idx < 0:
+                # Condition cleared; the next crossing notifies immediately
+                state.level = -1
+                return Decision(None)
+            escalated = idx > state.level
+            state.level = idx
+            if escalated or now - state.last_notified >= self.window:
+                suppressed = state.suppressed
+                state.suppressed = 0
+                state.last_notified = now
+                return Decision(ladder.names[idx], True, suppressed, escalated)
+            state.suppressed += 1
+            state.total_suppressed += 1
+            return Decision(ladder.names[idx], False, state.suppressed)
+
+    def reset(self, event_id):
+        self._drop(event_id)
+        if self.shared is not None:
+            self.shared.bump(event_id)
+
+    def _drop(self, event_id):
+        with self._lock:
+            for key in [k for k in self._states if k[1] == event_id]:
+                del self._states[key]
+
+    def snapshot(self, event_id, ladders):
+        """Current level and suppression counters for every alert key of an event."""
+        self._sync(event_id)
+        with self._lock:
+            return [
+                {
+                    'type': key[0],
+                    'zone': key[2],
+                    'level': ladders[key[0]].names[s.level] if s.level >= 0 else None,
+                    'suppressed': s.suppressed,
+                    'total_suppressed': s.total_suppressed,
+                }
+                for key, s in self._states.items() if key[1] == event_id
+            ]
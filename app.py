@@ -6,20 +6,39 @@ from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_socketio import SocketIO
 from flask_mail import Mail
+import sqlite3
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
 
 load_dotenv()  # Load environment variables from .env if present
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL') or 'sqlite:///site.db'
 app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads')
 db = SQLAlchemy(app)
+
+@sa_event.listens_for(Engine, 'connect')
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets scanners read while another writes; busy_timeout waits instead of failing on lock
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.close()
+
 bcrypt = Bcrypt(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'info'
 
-# Initialize SocketIO for real-time features
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Initialize SocketIO for real-time features. With a message queue (e.g. redis://host:6379/0)
+# several workers share rooms and emits; stream leases default to the same server.
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+app.config['STREAM_LEASE_URL'] = os.getenv('STREAM_LEASE_URL') or app.config['SOCKETIO_MESSAGE_QUEUE']
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
+# Worker processes for missing-person media detection (default: half the CPU cores)
+app.config['DETECTION_PROCESSES'] = int(os.getenv('DETECTION_PROCESSES') or 0) or None
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER')
 app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT') or 0) or 0
 app.config['MAIL_USE_TLS'] = (os.getenv('MAIL_USE_TLS') or 'false').lower() == 'true'
@@ -31,11 +50,9 @@ mail = Mail(app)
 
 # Import routes at the bottom to avoid circular imports
 from routes import *
+import schema  # registers the upgrade-db and check-query-plans CLI commands
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-        # Ensure upload folder exists
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    # Run with SocketIO to enable WebSocket transport
-    socketio.run(app, debug=True)
\ No newline at end of file
+    # Prefer `python run.py`: worker processes re-run the main script, and this one builds the whole app
+    import run
+    run.main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+import uuid
+
+import click
+from sqlalchemy import insert, select
+
+from app import app, db
+from models import Attendee, Event
+import qr
+
+IMPORT_CHUNK = 2000  # rows per INSERT ... executemany and commit
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportResult:
+    def __init__(self):
+        self.attendees = []  # dicts with name, email and qr_code, in file order
+        self.errors = []     # (line, message)
+
+    @property
+    def imported(self):
+        return len(self.attendees)
+
+    def summary(self):
+        return {
+            'imported': self.imported,
+            'skipped': len(self.errors),
+            'errors': [{'line': line, 'error': msg} for line, msg in self.errors[:MAX_REPORTED_ERRORS]],
+        }
+
+
+def iter_records(stream, fmt='csv'):
+    """Yield (line, record, error) from a binary CSV or JSON-lines stream without reading it whole."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'jsonl':
+        for line, raw in enumerate(text, 1):
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                yield line, None, 'Invalid JSON'
+                continue
+            if isinstance(record, dict):
+                yield line, record, None
+            else:
+                yield line, None, 'Expected a JSON object'
+    else:
+        reader = csv.DictReader(text)
+        reader.fieldnames = [(f or '').strip().lower() for f in reader.fieldnames or []]
+        for record in reader:
+            yield reader.line_num, record, None
+
+
+def clean_record(record):
+    """Validate one record the way AttendeeForm does; raises ValueError."""
+    name = str(record.get('name') or '').strip()
+    if not 2 <= len(name) <= 100:
+        raise ValueError('Name must be 2-100 characters')
+    email = str(record.get('email') or '').strip() or None
+    if email and ('@' not in email or len(email) > 120):
+        raise ValueError('Invalid email')
+    phone = str(record.get('phone') or '').strip() or None
+    if phone and not 5 <= len(phone) <= 20:
+        raise ValueError('Phone must be 5-20 characters')
+    qr_code = str(record.get('qr_code') or '').strip() or None
+    if qr_code and not 3 <= len(qr_code) <= 100:
+        raise ValueError('qr_code must be 3-100 characters')
+    return {'name': name, 'email': email, 'phone': phone, 'qr_code': qr_code}
+
+
+def _flush(event_id, batch, result, seen):
+    # Caller-supplied codes must be unique across the file and the database
+    given = [row['qr_code'] for _, row in batch if row['qr_code']]
+    taken = set(db.session.scalars(select(Attendee.qr_code).where(Attendee.qr_code.in_(given)))) if given else set()
+    rows = []
+    for line, row in batch:
+        code = row['qr_code']
+        if code and (code in taken or code in seen):
+            result.errors.append((line, 'Duplicate qr_code'))
+            continue
+        row['qr_code'] = code or str(uuid.uuid4())
+        seen.add(row['qr_code'])
+        row['event_id'] = event_id
+        rows.append(row)
+    if rows:
+        db.session.execute(insert(Attendee), rows)
+        db.session.commit()
+        result.attendees.extend({'name': r['name'], 'email': r['email'], 'qr_code': r['qr_code']} for r in rows)
+
+
+def import_attendees(event_id, stream, fmt='csv', chunk_size=IMPORT_CHUNK):
+    """Bulk-insert attendees from a CSV/JSONL stream in chunks.
+
+    Columns: name (required), email, phone and qr_code; a UUID code is
+    generated when qr_code is empty. Invalid rows are skipped and reported.
+    Each chunk is committed on its own, so a large file never sits in one
+    transaction.
+    """
+    result = ImportResult()
+    seen = set()
+    batch = []
+    for line, record, error in iter_records(stream, fmt):
+        if error is None:
+            try:
+                batch.append((line, clean_record(record)))
+            except ValueError as e:
+                error = str(e)
+        if error:
+            result.errors.append((line, error))
+        if len(batch) >= chunk_size:
+            _flush(event_id, batch, result, seen)
+            batch = []
+    if batch:
+        _flush(event_id, batch, result, seen)
+    return result
+
+
+def detect_format(filename=None, content_type=None):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in (content_type or '') or 'jsonl' in (content_type or ''):
+        return 'jsonl'
+    return 'csv'
+
+
+@app.cli.command('import-attendees')
+@click.argument('event_id', type=int)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None, help='Defaults to the file extension.')
+@click.option('--zip', 'zip_path', type=click.Path(dir_okay=False), default=None, help='Write the QR codes to this ZIP file.')
+@click.option('--workers', type=int, default=None, help='QR rendering processes (default: CPU count).')
+def import_attendees_command(event_id, path, fmt, zip_path, workers):
+    """Import attendees for an event from a CSV or JSON-lines file."""
+    if db.session.get(Event, event_id) is None:
+        raise click.ClickException(f'Event {event_id} not found')
+    with open(path, 'rb') as stream:
+        result = import_attendees(event_id, stream, fmt or detect_format(path))
+    click.echo(f'Imported {result.imported} attendee(s), skipped {len(result.errors)}')
+    for line, msg in result.errors[:MAX_REPORTED_ERRORS]:
+        click.echo(f'  line {line}: {msg}')
+    if zip_path:
+        with open(zip_path, 'wb') as out:
+            qr.write_zip(out, result.attendees, workers=workers)
+        click.echo(f'Wrote {result.imported} QR code(s) to {zip_path}')
@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+SYSTEM_PROMPT = (
+    "You are CrowdSafe, a concise, helpful assistant for event crowd "
+    "safety. When asked, provide short, actionable guidance."
+)
+CACHE_TTL = 300.0       # seconds a finished answer is replayed for the same key
+CACHE_ITEMS = 512
+MAX_CONCURRENT = 4      # generations running against the model at once
+QUEUE_TIMEOUT = 15.0    # seconds a generation waits for a free slot before giving up
+
+
+class ChatUnavailable(Exception):
+    """The model is not configured, busy, or failed."""
+
+
+def normalize_query(query):
+    """Case, whitespace and trailing punctuation do not change the answer."""
+    return re.sub(r'\s+', ' ', (query or '').strip().lower()).rstrip(' ?!.')
+
+
+class GeminiModel:
+    """Process-wide Gemini client; configured once, on first use."""
+
+    def __init__(self, api_key, model_name='gemini-1.5-flash'):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _client(self):
+        if not self.api_key:
+            raise ChatUnavailable('GOOGLE_API_KEY not set')
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                # The fixed instructions go in once instead of with every prompt
+                self._model = genai.GenerativeModel(self.model_name, system_instruction=SYSTEM_PROMPT)
+            return self._model
+
+    def stream(self, context, query):
+        prompt = f"{context}\n\nUser question: {query or ''}"
+        for chunk in self._client().generate_content(prompt, stream=True):
+            text = getattr(chunk, 'text', '') or ''
+            if text:
+                yield text
+
+
+class FakeModel:
+    """Deterministic local model for tests and offline development."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def stream(self, context, query):
+        with self._lock:
+            self.calls += 1
+        answer = f"[fake] {context} You asked: {query or ''}"
+        for word in answer.split(' '):
+            if self.delay:
+                time.sleep(self.delay)
+            yield word + ' '
+
+
+class _Flight:
+    __slots__ = ('chunks', 'done', 'error', 'cond')
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+
+class ChatBackend:
+    """Streams model answers with caching and request coalescing.
+
+    Answers are cached per key, typically (event, zone, normalized query,
+    situation version), and replayed chunk by chunk. Requests for a key that
+    is already being generated attach to that generation and receive the
+    same chunks as they arrive. Generations run in their own task, so a
+    client disconnecting does not cut off the others, and at most
+    `max_concurrent` run against the model at once.
+    """
+
+    def __init__(self, model, cache_ttl=CACHE_TTL, cache_items=CACHE_ITEMS, max_concurrent=MAX_CONCURRENT,
+                 queue_timeout=QUEUE_TIMEOUT, start_task=None, clock=time.monotonic):
+        self.model = model
+        self.cache_ttl = cache_ttl
+        self.cache_items = cache_items
+        self.queue_timeout = queue_timeout
+        self.start_task = start_task or self._thread
+        self.clock = clock
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._cache = OrderedDict()  # key -> (chunks, stored_at)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {'generations': 0, 'cache_hits': 0, 'coalesced': 0, 'errors': 0}
+
+    @staticmethod
+    def _thread(fn, *args):
+        threading.Thread(target=fn, args=args, daemon=True).start()
+
+    def stream(self, key, context, query):
+        """Yield answer chunks; raises ChatUnavailable if generation fails."""
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and self.clock() - cached[1] < self.cache_ttl:
+                self._cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                flight = None
+            else:
+                cached = None
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    self.stats['generations'] += 1
+                    self.start_task(self._generate, key, flight, context, query)
+                else:
+                    self.stats['coalesced'] += 1
+        if cached is not None:
+            yield from cached[0]
+            return
+        sent = 0
+        while True:
+            with flight.cond:
+                while sent == len(flight.chunks) and not flight.done:
+                    flight.cond.wait()
+                chunks = flight.chunks[sent:]
+                done, error = flight.done, flight.error
+            for chunk in chunks:
+                yield chunk
+            sent += len(chunks)
+            if done and sent == len(flight.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    def _generate(self, key, flight, context, query):
+        error = None
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            error = ChatUnavailable('The assistant is busy; please try again shortly')
+        else:
+            try:
+                for chunk in self.model.stream(context, query):
+                    with flight.cond:
+                        flight.chunks.append(chunk)
+                        flight.cond.notify_all()
+            except ChatUnavailable as e:
+                error = e
+            except Exception as e:
+                error = ChatUnavailable(str(e))
+            finally:
+                self._slots.release()
+        with self._lock:
+            self._flights.pop(key, None)
+            if error is None:
+                self._cache[key] = (list(flight.chunks), self.clock())
+                while len(self._cache) > self.cache_items:
+                    self._cache.popitem(last=False)
+            else:
+                self.stats['errors'] += 1
+        with flight.cond:
+            flight.error = error
+            flight.done = True
+            flight.cond.notify_all()
@@ -0,0 +1,316 @@
+import os
+import socket
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except Exception:
+    redis = None
+
+LEASE_SECONDS = 10.0  # a leader that stops renewing loses its events after this long
+
+_ACQUIRE = """
+local owner = redis.call('get', KEYS[1])
+if owner == false or owner == ARGV[1] then
+    redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_RELEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LocalLeaseStore:
+    """In-process lease store: the default for one worker, and a stand-in for Redis in tests."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._leases = {}  # key -> (owner, expires)
+        self._counts = {}  # key -> {member: (count, expires)}
+        self._flags = {}   # key -> expires
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, owner, ttl):
+        """Take or renew a lease; returns True if `owner` holds it afterwards."""
+        now = self.clock()
+        with self._lock:
+            current = self._leases.get(key)
+            if current is None or current[0] == owner or current[1] <= now:
+                self._leases[key] = (owner, now + ttl)
+                return True
+            return False
+
+    def release(self, key, owner):
+        with self._lock:
+            current = self._leases.get(key)
+            if current is not None and current[0] == owner:
+                del self._leases[key]
+
+    def owner(self, key):
+        with self._lock:
+            current = self._leases.get(key)
+            return current[0] if current is not None and current[1] > self.clock() else None
+
+    def set_count(self, key, member, count, ttl):
+        with self._lock:
+            members = self._counts.setdefault(key, {})
+            if count:
+                members[member] = (count, self.clock() + ttl)
+            else:
+                members.pop(member, None)
+
+    def total(self, key):
+        now = self.clock()
+        with self._lock:
+            members = self._counts.get(key, {})
+            for member, (count, expires) in list(members.items()):
+                if expires <= now:
+                    del members[member]
+            return sum(count for count, _ in members.values())
+
+    def set_flag(self, key, ttl):
+        with self._lock:
+            self._flags[key] = self.clock() + ttl
+
+    def take_flag(self, key):
+        with self._lock:
+            expires = self._flags.pop(key, None)
+            return expires is not None and expires > self.clock()
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters[key] = self._counters.get(key, 0) + 1
+            return value
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+
+class RedisLeaseStore:
+    """Lease store shared by every worker through Redis (or a Redis-compatible server)."""
+
+    def __init__(self, url, prefix='crowdsafe:'):
+        if redis is None:
+            raise RuntimeError('The redis package is required for a redis:// lease store')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._acquire = self.client.register_script(_ACQUIRE)
+        self._release = self.client.register_script(_RELEASE)
+
+    def acquire(self, key, owner, ttl):
+        return bool(self._acquire(keys=[self.prefix + key], args=[owner, int(ttl * 1000)]))
+
+    def release(self, key, owner):
+        self._release(keys=[self.prefix + key], args=[owner])
+
+    def owner(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set_count(self, key, member, count, ttl):
+        # One hash per key; each field carries its own expiry so a dead worker's count ages out
+        name = self.prefix + key
+        if count:
+            pipe = self.client.pipeline()
+            pipe.hset(name, member, f'{count}:{time.time() + ttl}')
+            pipe.pexpire(name, int(ttl * 1000))
+            pipe.execute()
+        else:
+            self.client.hdel(name, member)
+
+    def total(self, key):
+        name = self.prefix + key
+        now = time.time()
+        total, stale = 0, []
+        for member, value in self.client.hgetall(name).items():
+            count, expires = value.decode().split(':')
+            if float(expires) <= now:
+                stale.append(member)
+            else:
+                total += int(count)
+        if stale:
+            self.client.hdel(name, *stale)
+        return total
+
+    def set_flag(self, key, ttl):
+        self.client.set(self.prefix + key, 1, px=int(ttl * 1000))
+
+    def take_flag(self, key):
+        return bool(self.client.delete(self.prefix + key))
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def counter(self, key):
+        value = self.client.get(self.prefix + key)
+        return int(value) if value is not None else 0
+
+
+def lease_store(url=None):
+    """Lease store for a URL: redis:// or rediss:// for Redis, anything else is in-process."""
+    if url and url.split('://', 1)[0] in ('redis', 'rediss', 'unix'):
+        return RedisLeaseStore(url)
+    return LocalLeaseStore()
+
+
+class SharedGenerations:
+    """Per-event generation counters in the lease store, so a per-process cache hears of other workers' changes.
+
+    A cache calls `bump(event_id)` after it drops or edits an event's entry
+    and `changed(event_id)` before serving one; `changed` is True when
+    another worker has bumped the event since this one last looked, and the
+    local entry must then be dropped. Each check is one read from the store.
+    """
+
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+        self._seen = {}  # event_id -> last generation this worker has caught up with
+        self._lock = threading.Lock()
+
+    def _key(self, event_id):
+        return f'cache:{self.name}:{event_id}'
+
+    def bump(self, event_id):
+        generation = self.store.incr(self._key(event_id))
+        with self._lock:
+            # Our own change is already applied locally, unless we had also missed someone else's
+            if self._seen.get(event_id) == generation - 1:
+                self._seen[event_id] = generation
+
+    def changed(self, event_id):
+        generation = self.store.counter(self._key(event_id))
+        with self._lock:
+            seen = self._seen.get(event_id)
+            self._seen[event_id] = generation
+        return seen is not None and seen != generation
+
+
+class StreamCoordinator:
+    """Decides which worker runs each event's density stream.
+
+    Every worker publishes how many of its own sockets watch an event; the
+    sum is the global subscriber count. The worker holding an event's lease
+    runs its stream and renews the lease on each heartbeat while anyone,
+    anywhere, is still watching. If that worker dies, its lease and counts
+    expire and a worker with local subscribers takes over.
+
+    `local_counts()` returns {event_id: subscribers on this worker};
+    `on_lead(event_id)` / `on_release(event_id)` start and stop the stream here.
+    """
+
+    def __init__(self, store, local_counts, on_lead, on_release, lease_seconds=LEASE_SECONDS, worker_id=None):
+        self.store = store
+        self.local_counts = local_counts
+        self.on_lead = on_lead
+        self.on_release = on_release
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self._leading = set()
+        self._lock = threading.Lock()
+        self._running = False
+
+    @staticmethod
+    def _lease_key(event_id):
+        return f'stream:lease:{event_id}'
+
+    @staticmethod
+    def _subs_key(event_id):
+        return f'stream:subs:{event_id}'
+
+    def publish(self, event_id, count):
+        self.store.set_count(self._subs_key(event_id), self.worker_id, count, self.lease_seconds)
+
+    def subscribers(self, event_id):
+        """Subscribers across all workers."""
+        return self.store.total(self._subs_key(event_id))
+
+    def leader(self, event_id):
+        return self.store.owner(self._lease_key(event_id))
+
+    def is_leader(self, event_id):
+        with self._lock:
+            return event_id in self._leading
+
+    def leading(self):
+        with self._lock:
+            return set(self._leading)
+
+    def claim(self, event_id):
+        """Try to lead an event now; returns True if this worker leads it."""
+        if not self.store.acquire(self._lease_key(event_id), self.worker_id, self.lease_seconds):
+            return False
+        with self._lock:
+            new = event_id not in self._leading
+            self._leading.add(event_id)
+        if new:
+            self.on_lead(event_id)
+        return True
+
+    def release_if_idle(self, event_id):
+        """Stop leading an event once nobody in the cluster watches it; returns True if released."""
+        if not self.is_leader(event_id) or self.subscribers(event_id):
+            return False
+        self._drop(event_id)
+        self.store.release(self._lease_key(event_id), self.worker_id)
+        return True
+
+    def request_keyframe(self, event_id):
+        # Picked up by the leader on its next tick
+        self.store.set_flag(f'stream:keyframe:{event_id}', self.lease_seconds)
+
+    def keyframe_requested(self, event_id):
+        return self.store.take_flag(f'stream:keyframe:{event_id}')
+
+    def _drop(self, event_id):
+        with self._lock:
+            if event_id not in self._leading:
+                return
+            self._leading.discard(event_id)
+        self.on_release(event_id)
+
+    def heartbeat(self):
+        """Publish counts, renew or give up leases, and take over orphaned events."""
+        counts = self.local_counts()
+        for event_id in set(counts) | self.leading():
+            local = counts.get(event_id, 0)
+            self.publish(event_id, local)
+            if self.is_leader(event_id):
+                if not self.release_if_idle(event_id) and not self.claim(event_id):
+                    self._drop(event_id)  # another worker took over after we stalled
+            elif local:
+                self.claim(event_id)
+        return bool(counts) or bool(self.leading())
+
+    def run(self, sleep):
+        """Heartbeat loop; exits once this worker has neither subscribers nor leases."""
+        while True:
+            try:
+                busy = self.heartbeat()
+            except Exception as e:
+                print('Stream coordinator error:', e)
+                busy = True
+            if not busy:
+                with self._lock:
+                    if not self._leading and not self.local_counts():
+                        self._running = False
+                        return
+            sleep(self.lease_seconds / 3)
+
+    def ensure_running(self, start_task, sleep):
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        start_task(self.run, sleep)
+        return True
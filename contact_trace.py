@@ -0,0 +1,105 @@
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import aliased
+
+from app import db
+from models import Attendee, CheckIn
+
+STREAM_BATCH = 1000
+
+
+def parse_time(value):
+    """ISO timestamp as a naive UTC datetime, the form check-in times are stored in."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _overlaps(checkin, start, end):
+    # A stay [check_in, check_out or still present] overlaps [start, end]
+    return and_(
+        checkin.check_in_time <= end,
+        or_(checkin.check_out_time.is_(None), checkin.check_out_time >= start),
+    )
+
+
+def zone_presence_query(event_id, zone_id, start, end):
+    """Everyone whose stay in a zone overlapped the window, with attendee details in one join."""
+    return (
+        select(
+            Attendee.id, Attendee.name, Attendee.email, Attendee.phone,
+            CheckIn.zone_id, CheckIn.check_in_time, CheckIn.check_out_time,
+        )
+        .join(Attendee, Attendee.id == CheckIn.attendee_id)
+        .where(CheckIn.event_id == event_id, CheckIn.zone_id == zone_id, _overlaps(CheckIn, start, end))
+        .order_by(CheckIn.check_in_time)
+    )
+
+
+def shared_contacts_query(event_id, attendee_id, start, end, zone_id=None):
+    """Who shared a zone with an attendee between start and end.
+
+    Self-joins the attendee's own stays in the window against every other
+    stay in the same zone whose interval overlaps it.
+    """
+    case = aliased(CheckIn)
+    other = aliased(CheckIn)
+    conditions = [
+        case.event_id == event_id,
+        case.attendee_id == attendee_id,
+        _overlaps(case, start, end),
+        other.attendee_id != attendee_id,
+        _overlaps(other, start, end),
+        other.check_in_time <= db.func.coalesce(case.check_out_time, end),
+        or_(other.check_out_time.is_(None), other.check_out_time >= case.check_in_time),
+    ]
+    if zone_id:
+        conditions.append(case.zone_id == zone_id)
+    return (
+        select(
+            Attendee.id, Attendee.name, Attendee.email, Attendee.phone,
+            other.zone_id, other.check_in_time, other.check_out_time,
+            case.check_in_time.label('case_in'), case.check_out_time.label('case_out'),
+        )
+        .select_from(case)
+        .join(other, and_(other.event_id == case.event_id, other.zone_id == case.zone_id))
+        .join(Attendee, Attendee.id == other.attendee_id)
+        .where(*conditions)
+        .order_by(other.check_in_time)
+    )
+
+
+def _row_dict(row, start, end):
+    out = {
+        'attendee_id': row.id,
+        'name': row.name,
+        'email': row.email,
+        'phone': row.phone,
+        'zone_id': row.zone_id,
+        'check_in_time': row.check_in_time.isoformat(),
+        'check_out_time': row.check_out_time.isoformat() if row.check_out_time else None,
+    }
+    # Clip the overlap to the query window (and to the case's stay when tracing an attendee)
+    lo = max(row.check_in_time, start)
+    hi = min(row.check_out_time or end, end)
+    if 'case_in' in row._fields:
+        lo = max(lo, row.case_in)
+        hi = min(hi, row.case_out or end)
+    out['overlap_start'] = lo.isoformat()
+    out['overlap_end'] = hi.isoformat()
+    return out
+
+
+def iter_results(stmt, start, end):
+    """Yield result dicts without loading the whole trace into memory."""
+    result = db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH))
+    for row in result:
+        yield _row_dict(row, start, end)
+
+
+def iter_json_lines(stmt, start, end):
+    for item in iter_results(stmt, start, end):
+        yield json.dumps(item) + '\n'
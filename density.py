@@ -0,0 +1,213 @@
+import threading
+
+import numpy as np
+
+RISK_LEVELS = np.array(['Low', 'Medium', 'High', 'Critical'])
+RISK_THRESHOLDS = np.array([0.4, 0.6, 0.8])  # Medium, High, Critical lower bounds
+CRITICAL_LEVEL = 3
+
+
+def risk_codes(intensities):
+    """Vectorized risk classification: 0=Low, 1=Medium, 2=High, 3=Critical."""
+    return np.digitize(intensities, RISK_THRESHOLDS)
+
+
+def grid_cells(lats, lngs, intensities, centers, half_extent_deg, size):
+    """Mean intensity per cell of a size x size grid centred on each event.
+
+    Takes (events, points) arrays and (events, 2) centers and returns an
+    (events, size * size) array, row-major from the south-west corner, with
+    NaN where no point fell this tick. Points outside the grid land in the
+    nearest edge cell.
+    """
+    n_events = lats.shape[0]
+    n_cells = size * size
+    rows = np.clip(((lats - centers[:, 0:1]) / (2 * half_extent_deg) + 0.5) * size, 0, size - 1).astype(np.intp)
+    cols = np.clip(((lngs - centers[:, 1:2]) / (2 * half_extent_deg) + 0.5) * size, 0, size - 1).astype(np.intp)
+    flat = (rows * size + cols + np.arange(n_events)[:, None] * n_cells).ravel()
+    counts = np.bincount(flat, minlength=n_events * n_cells)
+    sums = np.bincount(flat, weights=intensities.ravel(), minlength=n_events * n_cells)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return means.reshape(n_events, n_cells)
+
+
+class DensityFrame:
+    """One tick of density points for a single event."""
+
+    __slots__ = ('event_id', 'lats', 'lngs', 'intensities', 'codes', 'critical', 'critical_centroid', 'critical_mean', 'zone_ids', 'cells')
+
+    def __init__(self, event_id, lats, lngs, intensities, codes, critical, centroid, mean, zone_ids=None, cells=None):
+        self.event_id = event_id
+        self.lats = lats
+        self.lngs = lngs
+        self.intensities = intensities
+        self.codes = codes
+        self.critical = critical
+        self.critical_centroid = centroid
+        self.critical_mean = mean
+        self.zone_ids = zone_ids  # zone of each point when known (sensor frames), else None
+        self.cells = cells        # mean intensity per venue grid cell (see grid_cells), set by the engine
+
+    @property
+    def total(self):
+        return len(self.intensities)
+
+    @property
+    def critical_ratio(self):
+        return self.critical / self.total if self.total else 0.0
+
+    def points(self):
+        risks = RISK_LEVELS[self.codes].tolist()
+        return [
+            {'lat': lat, 'lng': lng, 'intensity': x, 'risk': r}
+            for lat, lng, x, r in zip(self.lats.tolist(), self.lngs.tolist(), self.intensities.tolist(), risks)
+        ]
+
+
+def frame_from_points(event_id, lats, lngs, intensities, zone_ids=None):
+    """Build a frame for one event from measured points (e.g. aggregated sensor readings)."""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    intensities = np.clip(np.asarray(intensities, dtype=float), 0.0, 1.0)
+    codes = risk_codes(intensities)
+    crit = codes == CRITICAL_LEVEL
+    count = int(crit.sum())
+    if count:
+        centroid = (float(lats[crit].mean()), float(lngs[crit].mean()))
+        mean = float(intensities[crit].mean())
+    else:
+        centroid, mean = (0.0, 0.0), 0.0
+    return DensityFrame(event_id, lats, lngs, intensities, codes, count, centroid, mean, zone_ids)
+
+
+class DensityEngine:
+    """Simulates density for every active event in one batched NumPy step per tick.
+
+    A single scheduler task drives all events, so CPU cost follows the total
+    number of points rather than the number of events being watched. Events
+    for which `live_source(event_ids)` returns a measured frame use that frame
+    instead of a simulated one. Every frame is also binned into a
+    `grid_size` x `grid_size` venue grid spanning the simulation spread.
+    """
+
+    def __init__(self, points_per_event=25, spread_deg=0.001, tick_seconds=2.0, seed=None, live_source=None, grid_size=6):
+        self.points_per_event = points_per_event
+        self.spread_deg = spread_deg
+        self.grid_size = grid_size
+        self.tick_seconds = tick_seconds
+        self.rng = np.random.default_rng(seed)
+        self.live_source = live_source
+        self._events = {}  # event_id -> (lat, lng)
+        self._lock = threading.Lock()
+        self._running = False
+
+    def add_event(self, event_id, latitude, longitude):
+        with self._lock:
+            self._events[event_id] = (latitude, longitude)
+
+    def move_event(self, event_id, latitude, longitude):
+        """Re-centre an active event (e.g. after its venue moved); inactive events are left alone."""
+        with self._lock:
+            if event_id in self._events:
+                self._events[event_id] = (latitude, longitude)
+
+    def remove_event(self, event_id):
+        with self._lock:
+            self._events.pop(event_id, None)
+
+    def is_active(self, event_id):
+        with self._lock:
+            return event_id in self._events
+
+    def active_events(self):
+        with self._lock:
+            return list(self._events)
+
+    def grid_origin(self, event_id):
+        """(size, south, west, step in degrees) of the event's grid, or None if it is not active."""
+        with self._lock:
+            center = self._events.get(event_id)
+        if center is None:
+            return None
+        return (self.grid_size, center[0] - self.spread_deg, center[1] - self.spread_deg,
+                2 * self.spread_deg / self.grid_size)
+
+    def cell_center(self, event_id, cell):
+        """(lat, lng) of the centre of a grid cell, or None if the event is not active."""
+        origin = self.grid_origin(event_id)
+        if origin is None:
+            return None
+        size, south, west, step = origin
+        row, col = divmod(cell, size)
+        return south + (row + 0.5) * step, west + (col + 0.5) * step
+
+    def step(self):
+        """Advance all active events by one tick and return their frames."""
+        with self._lock:
+            ids = list(self._events)
+        if not ids:
+            return []
+        live = {}
+        if self.live_source is not None:
+            try:
+                live = self.live_source(ids)
+            except Exception as e:
+                print('Live density source error:', e)
+        frames = list(live.values())
+        with self._lock:
+            live_centers = [self._events.get(frame.event_id) for frame in frames]
+            ids = [i for i in ids if i not in live and i in self._events]
+            centers = np.array([self._events[i] for i in ids], dtype=float).reshape(-1, 2)
+        for frame, center in zip(frames, live_centers):
+            if center is not None and frame.total:
+                frame.cells = grid_cells(frame.lats[None], frame.lngs[None], frame.intensities[None],
+                                         np.array([center], dtype=float), self.spread_deg, self.grid_size)[0]
+        if not ids:
+            return frames
+        shape = (len(ids), self.points_per_event)
+        lats = centers[:, 0:1] + self.rng.uniform(-self.spread_deg, self.spread_deg, shape)
+        lngs = centers[:, 1:2] + self.rng.uniform(-self.spread_deg, self.spread_deg, shape)
+        intensities = np.clip(self.rng.random(shape) * 1.2, 0.0, 1.0)
+        codes = risk_codes(intensities)
+
+        crit = codes == CRITICAL_LEVEL
+        crit_counts = crit.sum(axis=1)
+        denom = np.maximum(crit_counts, 1)
+        crit_lat = (lats * crit).sum(axis=1) / denom
+        crit_lng = (lngs * crit).sum(axis=1) / denom
+        crit_mean = (intensities * crit).sum(axis=1) / denom
+        cells = grid_cells(lats, lngs, intensities, centers, self.spread_deg, self.grid_size)
+
+        return frames + [
+            DensityFrame(
+                event_id, lats[k], lngs[k], intensities[k], codes[k], int(crit_counts[k]),
+                (float(crit_lat[k]), float(crit_lng[k])), float(crit_mean[k]), cells=cells[k]
+            )
+            for k, event_id in enumerate(ids)
+        ]
+
+    def run(self, on_frame, sleep):
+        """Scheduler loop; exits once no events remain so an idle process has no ticking task."""
+        while True:
+            frames = self.step()
+            if not frames:
+                with self._lock:
+                    if not self._events:
+                        self._running = False
+                        return
+                continue
+            for frame in frames:
+                try:
+                    on_frame(frame)
+                except Exception as e:
+                    print('Density frame error:', e)
+            sleep(self.tick_seconds)
+
+    def ensure_running(self, start_task, on_frame, sleep):
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        start_task(self.run, on_frame, sleep)
+        return True
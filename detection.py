@@ -0,0 +1,142 @@
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+import framesampler
+
+MAX_SIDE = 1280         # larger images are scaled down before detection; boxes are mapped back
+FACE_MIN_SIZE = 24
+FACE_CASCADE = 'haarcascade_frontalface_default.xml'
+MAX_VIDEO_FRAMES = 300  # sampled frames analyzed per video at most
+
+# Loaded once per worker process
+_face = None
+_hog = None
+
+
+def _detectors():
+    global _face, _hog
+    if _face is None:
+        _face = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, FACE_CASCADE))
+        _hog = cv2.HOGDescriptor()
+        _hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    return _face, _hog
+
+
+def _confidence(weight):
+    # Cascade level weights and SVM margins are unbounded scores; squash them into 0..1
+    return 1.0 / (1.0 + math.exp(-float(weight)))
+
+
+def detect_frame(image):
+    """Faces and people in a BGR image, as dicts with type, confidence and box (x, y, w, h)."""
+    height, width = image.shape[:2]
+    scale = min(1.0, MAX_SIDE / max(height, width))
+    if scale < 1.0:
+        image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    face, hog = _detectors()
+    gray = cv2.equalizeHist(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+
+    found = []
+    boxes, _, weights = face.detectMultiScale3(
+        gray, scaleFactor=1.1, minNeighbors=5, minSize=(FACE_MIN_SIZE, FACE_MIN_SIZE), outputRejectLevels=True)
+    for box, weight in zip(boxes, np.ravel(weights)):
+        found.append(('face', box, weight))
+    boxes, weights = hog.detectMultiScale(image, winStride=(8, 8), padding=(8, 8), scale=1.05)
+    for box, weight in zip(boxes, np.ravel(weights)):
+        found.append(('person', box, weight))
+
+    return [
+        {'type': kind, 'confidence': round(_confidence(weight), 4),
+         'box': [int(round(v / scale)) for v in box]}
+        for kind, box, weight in found
+    ]
+
+
+def detect_image(path):
+    """Run detect_frame on an image file; raises ValueError if OpenCV cannot read it."""
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f'Unreadable image: {os.path.basename(path)}')
+    return detect_frame(image)
+
+
+def detect_video(path, max_frames=MAX_VIDEO_FRAMES):
+    """Run detect_frame on the informative frames of a video; each detection also carries its time in seconds."""
+    found = []
+    sampler = framesampler.FrameSampler()
+    for n, frame in enumerate(sampler.sample(path)):
+        if n >= max_frames:
+            break
+        for d in detect_frame(frame.image):
+            d['time'] = round(frame.time, 2)
+            found.append(d)
+    return found
+
+
+def detect_media(path, media_type):
+    return detect_video(path) if media_type == 'video' else detect_image(path)
+
+
+def summarize(detections):
+    """Best detection per type: {type: (count, best detection)}."""
+    best = {}
+    for d in detections:
+        count, top = best.get(d['type'], (0, None))
+        best[d['type']] = (count + 1, d if top is None or d['confidence'] > top['confidence'] else top)
+    return best
+
+
+def _init_worker():
+    # One process per core already; OpenCV's own thread pool would oversubscribe it
+    cv2.setNumThreads(1)
+
+
+def default_processes():
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+class DetectionPool:
+    """Process pool for CPU-bound detection, created on first use.
+
+    Workers are spawned rather than forked so they do not inherit the web
+    server's threads and locks. Spawning re-runs the parent's main script
+    in each worker; started with `python run.py` (or under gunicorn) that
+    builds nothing, and a worker imports only this module and its
+    dependencies.
+    """
+
+    def __init__(self, processes=None):
+        self.processes = processes or default_processes()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            try:
+                return self._executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool
+                self._executor = self._new_executor()
+                return self._executor.submit(fn, *args)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,192 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from app import db
+from models import DetectionJob, DetectionResult, MissingPersonMedia
+import detection
+
+ACTIVE = ('queued', 'running')
+POLL_SECONDS = 1.0     # how often a running job saves progress and checks for cancellation
+STALE_SECONDS = 300    # an active job without a heartbeat for this long is presumed dead
+
+
+def job_status(job):
+    return {
+        'id': job.id, 'event_id': job.event_id, 'missing_person_id': job.missing_person_id,
+        'status': job.status, 'total': job.total or 0, 'processed': job.processed or 0,
+        'failed': job.failed or 0, 'skipped': job.skipped or 0, 'detections': job.detections or 0,
+        'cancel_requested': bool(job.cancel_requested), 'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def result_dict(r):
+    return {
+        'id': r.id, 'media_id': r.media_id, 'job_id': r.job_id, 'result_type': r.result_type,
+        'confidence': r.confidence, 'details': r.details,
+        'timestamp': r.timestamp.isoformat() if r.timestamp else None
+    }
+
+
+def _stale(job):
+    # The runner saves a heartbeat every POLL_SECONDS; without one it has died (e.g. a restart)
+    return datetime.utcnow() - (job.updated_at or job.created_at) >= timedelta(seconds=STALE_SECONDS)
+
+
+def _details(kind, count, best, name):
+    x, y, w, h = best['box']
+    where = f'best at x={x}, y={y}, {w}x{h} px'
+    if 'time' in best:
+        minutes, seconds = divmod(best['time'], 60)
+        return f'{count} {kind} detection(s) across sampled frames of {name}; {where} at {int(minutes):02d}:{seconds:04.1f}'
+    return f'{count} {kind}(s) found in {name}; {where}'
+
+
+class DetectionJobService:
+    """Runs detection jobs for missing-person media on a process pool.
+
+    A job covers every image and video of one person that no earlier job has
+    analyzed, so re-running only picks up new uploads; while a job is active,
+    starting another returns it instead. Progress and cancellation go through
+    the job row, so any web worker can report on or cancel a job another one
+    runs.
+    `notify(name, payload)` is called with 'detection_progress' and
+    'detection_result' updates.
+    """
+
+    def __init__(self, pool, start_task, media_root, notify=None):
+        self.pool = pool
+        self.start_task = start_task
+        self.media_root = media_root
+        self.notify = notify or (lambda name, payload: None)
+        self._lock = threading.Lock()
+
+    def start(self, person, user_id):
+        """Queue a job for a person; returns (job, created)."""
+        with self._lock:
+            active = db.session.scalars(
+                select(DetectionJob)
+                .where(DetectionJob.missing_person_id == person.id, DetectionJob.status.in_(ACTIVE))
+                .order_by(DetectionJob.id.desc())).first()
+            if active is not None:
+                if not _stale(active):
+                    return active, False
+                active.status = 'failed'
+                active.error = 'Stopped without finishing'
+                active.finished_at = datetime.utcnow()
+            job = DetectionJob(missing_person_id=person.id, event_id=person.event_id, requested_by_user_id=user_id)
+            db.session.add(job)
+            db.session.commit()
+        self.start_task(self.run, job.id)
+        return job, True
+
+    def cancel(self, job):
+        """Ask an active job to stop; returns False if it has already finished."""
+        if job.status not in ACTIVE:
+            return False
+        job.cancel_requested = True
+        if job.status == 'queued' or _stale(job):
+            # Nothing is running it, so nothing else would ever mark it finished
+            job.status = 'cancelled'
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        self.notify('detection_progress', job_status(job))
+        return True
+
+    def _pending_media(self, job):
+        analyzed = select(DetectionResult.media_id).where(
+            DetectionResult.missing_person_id == job.missing_person_id,
+            DetectionResult.job_id.is_not(None),
+            DetectionResult.media_id.is_not(None))
+        return db.session.scalars(
+            select(MissingPersonMedia)
+            .where(MissingPersonMedia.missing_person_id == job.missing_person_id,
+                   MissingPersonMedia.id.not_in(analyzed))
+            .order_by(MissingPersonMedia.id)).all()
+
+    def _record(self, job, media_id, file_path, detections):
+        # Placeholder rows from before jobs existed are replaced by the real results
+        db.session.execute(delete(DetectionResult).where(
+            DetectionResult.media_id == media_id, DetectionResult.job_id.is_(None)))
+        name = os.path.basename(file_path)
+        rows = [
+            DetectionResult(
+                missing_person_id=job.missing_person_id, media_id=media_id, job_id=job.id,
+                result_type=kind, confidence=best['confidence'], details=_details(kind, count, best, name)
+            )
+            for kind, (count, best) in detection.summarize(detections).items()
+        ] or [DetectionResult(
+            missing_person_id=job.missing_person_id, media_id=media_id, job_id=job.id,
+            result_type='none', confidence=0.0, details=f'No faces or people found in {name}'
+        )]
+        db.session.add_all(rows)
+        job.processed += 1
+        job.detections += len(detections)
+        return rows
+
+    def run(self, job_id):
+        job = db.session.get(DetectionJob, job_id)
+        if job is None or job.status != 'queued':
+            return
+        media = self._pending_media(job)
+        supported = [m for m in media if m.media_type in ('image', 'video')]
+        job.status = 'running'
+        job.started_at = job.updated_at = datetime.utcnow()
+        job.total = len(supported)
+        job.skipped = len(media) - len(supported)
+        db.session.commit()
+        self.notify('detection_progress', job_status(job))
+
+        # Videos are reduced to their informative frames inside the worker, so only those are analyzed
+        futures = {
+            self.pool.submit(detection.detect_media, os.path.join(self.media_root, m.file_path), m.media_type): (m.id, m.file_path)
+            for m in supported
+        }
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                results = []
+                for future in done:
+                    media_id, file_path = futures[future]
+                    try:
+                        results.extend(self._record(job, media_id, file_path, future.result()))
+                    except Exception as e:
+                        print('Detection error:', e)
+                        job.failed += 1
+                        job.error = str(e)
+                job.updated_at = datetime.utcnow()
+                db.session.commit()
+                if results:
+                    self.notify('detection_result', {
+                        'event_id': job.event_id, 'missing_person_id': job.missing_person_id, 'job_id': job.id,
+                        'results': [result_dict(r) for r in results]
+                    })
+                if done:
+                    self.notify('detection_progress', job_status(job))
+                if job.cancel_requested:  # reloaded after the commit, so set by any worker
+                    break
+            for future in pending:
+                future.cancel()
+            if job.cancel_requested:
+                job.status = 'cancelled'
+            elif job.total and job.failed == job.total:
+                job.status = 'failed'
+            else:
+                job.status = 'completed'
+        except Exception as e:
+            print('Detection job error:', e)
+            db.session.rollback()
+            for future in pending:
+                future.cancel()
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = job.updated_at = datetime.utcnow()
+        db.session.commit()
+        self.notify('detection_progress', job_status(job))
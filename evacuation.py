@@ -0,0 +1,342 @@
+import heapq
+import math
+import threading
+
+import numpy as np
+
+from geofence import points_in_polygon
+
+# Severity weights for safety scoring (same scale the map used client-side)
+SEVERITY_WEIGHT = {'Low': 10, 'Medium': 20, 'High': 50, 'Critical': 100}
+
+CELL_SIZE_M = 3.0          # walk grid resolution
+MAX_GRID_CELLS = 200       # cap per side so precompute stays bounded
+MIN_HALF_SPAN_DEG = 0.0015 # covers the simulated density area around the venue
+RESTRICTED_COST = 50.0     # cost multiplier for walking through a restricted area
+INCIDENT_RADIUS_M = 30.0   # incident influence radius
+FULL_RECOMPUTE_RATIO = 0.25
+
+# Used when an event has no exits stored yet (the offsets the map used to hard-code)
+DEFAULT_EXIT_OFFSETS = [
+    ('Main Exit', 0.0005, 0.0005),
+    ('Emergency Exit 1', -0.0003, 0.0007),
+    ('Emergency Exit 2', 0.0008, -0.0003),
+]
+
+_NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+class VenueGrid:
+    """Regular lat/lng grid of walkable cells centred on the venue."""
+
+    def __init__(self, min_lat, min_lng, max_lat, max_lng, cell_size_m=CELL_SIZE_M):
+        mid_lat = (min_lat + max_lat) / 2.0
+        self.m_per_deg_lat = 111320.0
+        self.m_per_deg_lng = 111320.0 * max(math.cos(math.radians(mid_lat)), 0.01)
+        height_m = (max_lat - min_lat) * self.m_per_deg_lat
+        width_m = (max_lng - min_lng) * self.m_per_deg_lng
+        self.rows = int(min(MAX_GRID_CELLS, max(2, math.ceil(height_m / cell_size_m))))
+        self.cols = int(min(MAX_GRID_CELLS, max(2, math.ceil(width_m / cell_size_m))))
+        self.min_lat, self.min_lng = min_lat, min_lng
+        self.dlat = (max_lat - min_lat) / self.rows
+        self.dlng = (max_lng - min_lng) / self.cols
+        self.cell_h_m = self.dlat * self.m_per_deg_lat
+        self.cell_w_m = self.dlng * self.m_per_deg_lng
+        rr, cc = np.meshgrid(np.arange(self.rows), np.arange(self.cols), indexing='ij')
+        self.center_lats = (self.min_lat + (rr.ravel() + 0.5) * self.dlat)
+        self.center_lngs = (self.min_lng + (cc.ravel() + 0.5) * self.dlng)
+
+    @property
+    def size(self):
+        return self.rows * self.cols
+
+    def cells(self, lats, lngs):
+        """Flat cell indices for arrays of coordinates (clamped to the grid)."""
+        r = np.floor((np.asarray(lats, dtype=float) - self.min_lat) / self.dlat).astype(np.int64)
+        c = np.floor((np.asarray(lngs, dtype=float) - self.min_lng) / self.dlng).astype(np.int64)
+        r = np.clip(r, 0, self.rows - 1)
+        c = np.clip(c, 0, self.cols - 1)
+        return r * self.cols + c
+
+    def cell(self, lat, lng):
+        return int(self.cells([lat], [lng])[0])
+
+    def latlng(self, idx):
+        return [float(self.center_lats[idx]), float(self.center_lngs[idx])]
+
+    def neighbours(self, idx):
+        r, c = divmod(idx, self.cols)
+        for dr, dc in _NEIGHBOURS:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < self.rows and 0 <= nc < self.cols:
+                step = math.hypot(dr * self.cell_h_m, dc * self.cell_w_m)
+                yield nr * self.cols + nc, step
+
+
+class ExitField:
+    """Distance-to-exit and next-hop table for one exit over the whole grid."""
+
+    def __init__(self, exit_info, source):
+        self.exit = exit_info
+        self.source = source
+        self.dist = None
+        self.next_hop = None
+
+
+class EvacuationRouter:
+    """Precomputed per-exit distance fields; route lookups are table reads.
+
+    Cell costs come from restricted areas (multiplier) and unresolved incidents
+    (severity-weighted penalty falling off with distance). When hazards change,
+    only the parts of each field that depended on a changed cell are repaired.
+    """
+
+    def __init__(self, grid, exits, restricted_polygons=(), incidents=()):
+        self.grid = grid
+        self.lock = threading.RLock()
+        self.fields = [ExitField(e, grid.cell(e['latitude'], e['longitude'])) for e in exits]
+        self.cost = self._cost_array(restricted_polygons, incidents)
+        for f in self.fields:
+            self._full_dijkstra(f)
+        self._rebuild_best()
+
+    # ---- cost model ----
+    def _cost_array(self, restricted_polygons, incidents):
+        g = self.grid
+        cost = np.ones(g.size, dtype=np.float64)
+        for poly in restricted_polygons:
+            if poly is None:
+                continue
+            inside = points_in_polygon(g.center_lats, g.center_lngs, poly)
+            cost[inside] *= RESTRICTED_COST
+        for inc in incidents:
+            weight = SEVERITY_WEIGHT.get(inc.get('severity'), 0)
+            if not weight or inc.get('status') == 'Resolved':
+                continue
+            d_m = np.hypot((g.center_lats - inc['latitude']) * g.m_per_deg_lat,
+                           (g.center_lngs - inc['longitude']) * g.m_per_deg_lng)
+            cost += (weight / 10.0) * np.clip(1.0 - d_m / INCIDENT_RADIUS_M, 0.0, None)
+        return cost
+
+    def _edge(self, u, v, step):
+        return step * (self.cost[u] + self.cost[v]) * 0.5
+
+    # ---- field computation ----
+    def _full_dijkstra(self, field):
+        n = self.grid.size
+        field.dist = np.full(n, np.inf)
+        field.next_hop = np.full(n, -1, dtype=np.int64)
+        field.dist[field.source] = 0.0
+        self._propagate(field, [(0.0, field.source)])
+
+    def _propagate(self, field, heap):
+        dist, nxt, grid = field.dist, field.next_hop, self.grid
+        heapq.heapify(heap)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, step in grid.neighbours(u):
+                nd = d + self._edge(u, v, step)
+                if nd < dist[v]:
+                    dist[v] = nd
+                    nxt[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+    def _descendants(self, field, changed_mask):
+        """Cells whose path to the exit passes through a changed cell (pointer doubling)."""
+        flag = changed_mask.copy()
+        anc = field.next_hop.copy()
+        roots = anc < 0
+        anc[roots] = np.nonzero(roots)[0]
+        for _ in range(int(math.ceil(math.log2(max(self.grid.size, 2)))) + 1):
+            flag |= flag[anc]
+            anc = anc[anc]
+        return flag
+
+    def _repair(self, field, increased, decreased):
+        grid = self.grid
+        dist, nxt = field.dist, field.next_hop
+        seeds = set()
+        if increased.any():
+            affected = self._descendants(field, increased)
+            affected[field.source] = False
+            dist[affected] = np.inf
+            nxt[affected] = -1
+            seeds.update(np.nonzero(affected)[0].tolist())
+        for u in np.nonzero(decreased)[0].tolist():
+            seeds.add(u)
+            seeds.update(v for v, _ in grid.neighbours(u))
+        heap = []
+        for v in seeds:
+            if v == field.source:
+                heap.append((0.0, v))
+                continue
+            best, best_u = dist[v], nxt[v]
+            for u, step in grid.neighbours(v):
+                cand = dist[u] + self._edge(u, v, step)
+                if cand < best:
+                    best, best_u = cand, u
+            if best < dist[v]:
+                dist[v], nxt[v] = best, best_u
+            if np.isfinite(dist[v]):
+                heap.append((dist[v], v))
+        self._propagate(field, heap)
+
+    def _rebuild_best(self):
+        if not self.fields:
+            self.best_exit = np.full(self.grid.size, -1, dtype=np.int64)
+            self.best_dist = np.full(self.grid.size, np.inf)
+            return
+        stacked = np.vstack([f.dist for f in self.fields])
+        self.best_exit = np.argmin(stacked, axis=0)
+        self.best_dist = stacked[self.best_exit, np.arange(self.grid.size)]
+
+    def update_hazards(self, restricted_polygons, incidents):
+        """Apply new hazard costs, repairing only the affected parts of each field."""
+        with self.lock:
+            new_cost = self._cost_array(restricted_polygons, incidents)
+            increased = new_cost > self.cost
+            decreased = new_cost < self.cost
+            changed = int(increased.sum() + decreased.sum())
+            if not changed:
+                return 0
+            self.cost = new_cost
+            for f in self.fields:
+                if changed > FULL_RECOMPUTE_RATIO * self.grid.size:
+                    self._full_dijkstra(f)
+                else:
+                    self._repair(f, increased, decreased)
+            self._rebuild_best()
+            return changed
+
+    # ---- lookups ----
+    def route(self, lat, lng, include_path=True):
+        with self.lock:
+            cell = self.grid.cell(lat, lng)
+            k = int(self.best_exit[cell])
+            if k < 0 or not np.isfinite(self.best_dist[cell]):
+                return None
+            field = self.fields[k]
+            result = {
+                'exit': field.exit,
+                'cost': round(float(self.best_dist[cell]), 1),
+            }
+            if include_path:
+                result['path'], result['length_m'] = self._walk(field, cell, lat, lng)
+            return result
+
+    def route_many(self, lats, lngs):
+        """Nearest safe exit and path cost for many positions at once; same shape as `route` without the path."""
+        with self.lock:
+            cells = self.grid.cells(lats, lngs)
+            ks = self.best_exit[cells]
+            costs = self.best_dist[cells]
+            results = []
+            for k, c in zip(ks.tolist(), costs.tolist()):
+                if k < 0 or not math.isfinite(c):
+                    results.append(None)
+                    continue
+                results.append({'exit': self.fields[k].exit, 'cost': round(c, 1)})
+            return results
+
+    def _walk(self, field, cell, lat, lng):
+        grid = self.grid
+        path = [[lat, lng]]
+        length = 0.0
+        prev_dir = None
+        u = cell
+        while u != field.source and u >= 0:
+            v = int(field.next_hop[u])
+            if v < 0:
+                break
+            ur, uc = divmod(u, grid.cols)
+            vr, vc = divmod(v, grid.cols)
+            direction = (vr - ur, vc - uc)
+            length += math.hypot(direction[0] * grid.cell_h_m, direction[1] * grid.cell_w_m)
+            # Keep only turning points so the polyline stays small
+            if direction != prev_dir and u != cell:
+                path.append(grid.latlng(u))
+            prev_dir = direction
+            u = v
+        path.append([field.exit['latitude'], field.exit['longitude']])
+        return path, round(length, 1)
+
+
+def exits_for_event(event, stored_exits):
+    """Exit dicts for an event, falling back to the default venue offsets."""
+    exits = [
+        {'id': e.id, 'name': e.name, 'latitude': e.latitude, 'longitude': e.longitude}
+        for e in stored_exits
+    ]
+    if exits:
+        return exits
+    return [
+        {'id': None, 'name': name, 'latitude': event.latitude + dlat, 'longitude': event.longitude + dlng}
+        for name, dlat, dlng in DEFAULT_EXIT_OFFSETS
+    ]
+
+
+def grid_for_event(event, exits, polygons=(), incidents=()):
+    """Venue grid covering the event centre plus every exit, restricted area and incident."""
+    lats = [event.latitude] + [e['latitude'] for e in exits] + [i['latitude'] for i in incidents]
+    lngs = [event.longitude] + [e['longitude'] for e in exits] + [i['longitude'] for i in incidents]
+    for poly in polygons:
+        if poly is not None:
+            lats.extend(poly[:, 0].tolist())
+            lngs.extend(poly[:, 1].tolist())
+    pad = 0.0002
+    return VenueGrid(
+        min(min(lats) - pad, event.latitude - MIN_HALF_SPAN_DEG),
+        min(min(lngs) - pad, event.longitude - MIN_HALF_SPAN_DEG),
+        max(max(lats) + pad, event.latitude + MIN_HALF_SPAN_DEG),
+        max(max(lngs) + pad, event.longitude + MIN_HALF_SPAN_DEG),
+    )
+
+
+class RouterRegistry:
+    """Process-wide cache of one router per event.
+
+    A generation counter per event keeps a router built from a read that
+    raced with `invalidate` from being cached. With several workers, set
+    `shared` to a cluster.SharedGenerations so `invalidate` reaches them all.
+    """
+
+    def __init__(self):
+        self._routers = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.shared = None
+
+    def get(self, event_id, build):
+        if self.shared is not None and self.shared.changed(event_id):
+            self._drop(event_id)
+        with self._lock:
+            router = self._routers.get(event_id)
+            generation = self._generations.get(event_id, 0)
+        if router is not None:
+            return router
+        router = build()
+        with self._lock:
+            if self._generations.get(event_id, 0) != generation:
+                return router
+            return self._routers.setdefault(event_id, router)
+
+    def peek(self, event_id):
+        if self.shared is not None and self.shared.changed(event_id):
+            self._drop(event_id)
+        with self._lock:
+            return self._routers.get(event_id)
+
+    def invalidate(self, event_id):
+        self._drop(event_id)
+        if self.shared is not None:
+            self.shared.bump(event_id)
+
+    def _drop(self, event_id):
+        with self._lock:
+            self._routers.pop(event_id, None)
+            self._generations[event_id] = self._generations.get(event_id, 0) + 1
+
+
+routers = RouterRegistry()
@@ -0,0 +1,112 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+
+from app import db
+from models import Incident, BottleneckAlert, CapacityAlert, MissingPerson, Zone
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(row):
+    raw = f'{row.timestamp.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from a cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _incident(i, _):
+    return {
+        'id': i.id, 'incident_type': i.incident_type, 'severity': i.severity, 'status': i.status,
+        'location_description': i.location_description, 'latitude': i.latitude, 'longitude': i.longitude,
+        'timestamp': _iso(i.timestamp)
+    }
+
+
+def _bottleneck(a, _):
+    return {
+        'id': a.id, 'risk_level': a.risk_level, 'density_level': a.density_level, 'prediction': a.prediction,
+        'location_description': a.location_description, 'latitude': a.latitude, 'longitude': a.longitude,
+        'suppressed_count': a.suppressed_count or 0, 'timestamp': _iso(a.timestamp)
+    }
+
+
+def _capacity(a, zone_names):
+    return {
+        'id': a.id, 'alert_type': a.alert_type, 'zone_id': a.zone_id, 'zone': zone_names.get(a.zone_id),
+        'capacity_percentage': a.capacity_percentage, 'current_count': a.current_count,
+        'max_capacity': a.max_capacity, 'message': a.message, 'resolved': bool(a.resolved),
+        'suppressed_count': a.suppressed_count or 0, 'timestamp': _iso(a.timestamp)
+    }
+
+
+def _missing(p, _):
+    return {
+        'id': p.id, 'name': p.name, 'age': p.age, 'status': p.status, 'description': p.description,
+        'last_seen_location': p.last_seen_location, 'last_seen_time': _iso(p.last_seen_time),
+        'reporter_name': p.reporter_name, 'reporter_contact': p.reporter_contact, 'timestamp': _iso(p.timestamp)
+    }
+
+
+FEEDS = {
+    'incidents': (Incident, _incident),
+    'bottleneck-alerts': (BottleneckAlert, _bottleneck),
+    'capacity-alerts': (CapacityAlert, _capacity),
+    'missing': (MissingPerson, _missing),
+}
+
+
+def fetch(kind, event_id, before=None, since=None, limit=PAGE_SIZE):
+    """One page of a feed.
+
+    Without `since`, returns rows newest first on (timestamp, id), older
+    than the `before` cursor when given; `next` is the cursor for the
+    following page, or None on the last one. With `since`, returns rows
+    added after that cursor in id order, so a row committed late with an
+    earlier timestamp still shows up; `more` says whether another call is
+    needed to catch up. `latest` is the cursor of the last row added, to
+    poll `since` with. Every page is an index range scan, whatever the size
+    of the history. Rows without a timestamp are left out.
+    """
+    model, serialize = FEEDS[kind]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    stmt = select(model).where(model.event_id == event_id, model.timestamp.is_not(None))
+    if since is not None:
+        _, row_id = decode_cursor(since)
+        stmt = stmt.where(model.id > row_id).order_by(model.id.asc())
+    else:
+        if before is not None:
+            ts, row_id = decode_cursor(before)
+            stmt = stmt.where(or_(model.timestamp < ts, and_(model.timestamp == ts, model.id < row_id)))
+        stmt = stmt.order_by(model.timestamp.desc(), model.id.desc())
+    rows = db.session.scalars(stmt.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    zone_names = {}
+    if model is CapacityAlert and rows:
+        zone_names = dict(db.session.execute(
+            select(Zone.id, Zone.name).where(Zone.id.in_({r.zone_id for r in rows}))).all())
+    page = {'kind': kind, 'items': [serialize(r, zone_names) for r in rows]}
+    if since is not None:
+        page['more'] = has_more
+        page['latest'] = encode_cursor(rows[-1]) if rows else since
+    else:
+        page['next'] = encode_cursor(rows[-1]) if has_more else None
+        if before is None:
+            page['latest'] = encode_cursor(max(rows, key=lambda r: r.id)) if rows else None
+    return page
@@ -0,0 +1,146 @@
+import threading
+
+import numpy as np
+
+HORIZON_MINUTES = (5, 10, 20)
+ALPHA = 0.1        # level smoothing
+BETA = 0.01        # trend smoothing
+PHI = 0.995        # trend damping per tick, so long horizons do not extrapolate noise
+VAR_ALPHA = 0.1    # smoothing of the squared one-step error
+BAND = 0.1         # confidence is P(actual within ±BAND intensity of the forecast)
+MIN_SAMPLES = 5    # cells with fewer readings report zero confidence
+RESET_GAP_SECONDS = 120  # a cell silent this long starts over
+
+
+def erf(x):
+    """Vectorized error function for x >= 0 (Abramowitz & Stegun 7.1.26, |error| < 1.5e-7)."""
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return 1.0 - poly * np.exp(-x * x)
+
+
+class _EventState:
+    __slots__ = ('level', 'trend', 'var', 'samples', 'last_ts')
+
+    def __init__(self, n_cells):
+        self.level = np.full(n_cells, np.nan)
+        self.trend = np.zeros(n_cells)
+        self.var = np.zeros(n_cells)
+        self.samples = np.zeros(n_cells, dtype=np.int64)
+        self.last_ts = np.zeros(n_cells)
+
+
+class Forecast:
+    """Per-cell forecasts for one event: (horizons, cells) arrays of intensity in 0..1."""
+
+    __slots__ = ('event_id', 'ts', 'minutes', 'mean', 'lower', 'upper', 'confidence')
+
+    def __init__(self, event_id, ts, minutes, mean, lower, upper, confidence):
+        self.event_id = event_id
+        self.ts = ts
+        self.minutes = minutes
+        self.mean = mean
+        self.lower = lower
+        self.upper = upper
+        self.confidence = confidence
+
+    def horizon(self, minutes):
+        return self.minutes.index(minutes)
+
+    def peak(self, minutes):
+        """(cell, mean, confidence) of the cell with the highest forecast, or None."""
+        row = self.mean[self.horizon(minutes)]
+        if np.isnan(row).all():
+            return None
+        cell = int(np.nanargmax(row))
+        return cell, float(row[cell]), float(self.confidence[self.horizon(minutes), cell])
+
+    def venue(self, minutes):
+        """(mean over cells, mean confidence) for one horizon, or None."""
+        i = self.horizon(minutes)
+        if np.isnan(self.mean[i]).all():
+            return None
+        return float(np.nanmean(self.mean[i])), float(np.nanmean(self.confidence[i]))
+
+
+class HoltForecaster:
+    """Damped-trend Holt exponential smoothing per venue grid cell.
+
+    Each density tick updates every cell of an event with a handful of
+    NumPy operations, so the cost per tick is constant per cell and no
+    history is kept. Cells without a reading in a tick keep their state.
+    Forecast intervals widen with the horizon using the damped Holt h-step
+    error variance, and confidence is the probability (under Gaussian
+    errors) that the actual value lands within ±BAND of the forecast.
+    """
+
+    def __init__(self, tick_seconds=2.0, alpha=ALPHA, beta=BETA, phi=PHI):
+        self.tick_seconds = tick_seconds
+        self.alpha = alpha
+        self.beta = beta
+        self.phi = phi
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def update(self, event_id, cells, ts):
+        """Feed one tick of per-cell intensities (NaN = no reading) taken at epoch `ts`."""
+        cells = np.asarray(cells, dtype=float)
+        with self._lock:
+            state = self._events.get(event_id)
+            if state is None or len(state.level) != len(cells):
+                state = self._events[event_id] = _EventState(len(cells))
+            seen = ~np.isnan(cells)
+            fresh = seen & ((state.samples == 0) | (ts - state.last_ts > RESET_GAP_SECONDS))
+            known = seen & ~fresh
+
+            # Frames closer together than a tick count as one tick
+            steps = np.maximum((ts - state.last_ts) / self.tick_seconds, 1.0)
+            damped = self._damped(steps)
+            predicted = state.level + state.trend * damped
+            error = cells - predicted
+            level = predicted + self.alpha * error
+            trend = self.beta * (level - state.level) / steps + (1 - self.beta) * state.trend * damped / steps
+            var = (1 - VAR_ALPHA) * state.var + VAR_ALPHA * error ** 2
+
+            state.level = np.where(known, level, np.where(fresh, cells, state.level))
+            state.trend = np.where(known, trend, np.where(fresh, 0.0, state.trend))
+            state.var = np.where(known, var, np.where(fresh, 0.0, state.var))
+            state.samples = np.where(known, state.samples + 1, np.where(fresh, 1, state.samples))
+            state.last_ts = np.where(seen, ts, state.last_ts)
+
+    def forecast(self, event_id, minutes=HORIZON_MINUTES):
+        """Forecast for each horizon in `minutes`, or None if the event has no state."""
+        with self._lock:
+            state = self._events.get(event_id)
+            if state is None:
+                return None
+            level, trend, var, samples = state.level.copy(), state.trend.copy(), state.var.copy(), state.samples.copy()
+            ts = float(state.last_ts.max())
+        k = np.array([round(m * 60 / self.tick_seconds) for m in minutes])
+        mean = np.clip(level + trend * self._damped(k)[:, None], 0.0, 1.0)
+        # h-step variance: var * (1 + sum_{j=1}^{k-1} (alpha * (1 + beta * damped(j)))^2)
+        j = np.arange(1, max(k))
+        cumulative = np.concatenate(([0.0], np.cumsum((self.alpha * (1 + self.beta * self._damped(j))) ** 2)))
+        sd = np.sqrt(var * (1 + cumulative[k - 1])[:, None])
+        with np.errstate(divide='ignore'):
+            confidence = erf(BAND / (sd * np.sqrt(2)))
+        confidence = np.where(samples >= MIN_SAMPLES, confidence, 0.0)
+        confidence = np.where(np.isnan(level), np.nan, confidence)
+        return Forecast(
+            event_id, ts, tuple(minutes), mean,
+            np.clip(mean - 1.96 * sd, 0.0, 1.0), np.clip(mean + 1.96 * sd, 0.0, 1.0), confidence
+        )
+
+    def _damped(self, steps):
+        # phi + phi^2 + ... + phi^steps
+        if self.phi >= 1:
+            return steps
+        return self.phi * (1 - self.phi ** steps) / (1 - self.phi)
+
+    def remove(self, event_id):
+        with self._lock:
+            self._events.pop(event_id, None)
+
+    def active_events(self):
+        with self._lock:
+            return list(self._events)
@@ -0,0 +1,234 @@
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+ANALYSIS_WIDTH = 96          # probes are compared at this width
+PROBE_MIN_SECONDS = 0.2      # probe interval while the picture is changing
+PROBE_MAX_SECONDS = 1.6      # probe interval after a long still stretch
+MIN_GAP_SECONDS = 0.5        # closest two sampled frames may be, except across a scene cut
+MAX_GAP_SECONDS = 5.0        # longest stretch without a sample, however still the picture
+GRID = 4                     # motion and hashes are measured per block of a GRID x GRID split
+MOTION_BUDGET = 0.06         # accumulated block change (0..1) that earns a new sample
+MOTION_FLOOR = 0.0075        # block change below this is sensor noise and does not accumulate
+SCENE_CHANGE = 0.15          # whole-picture change between two probes treated as a cut
+DUPLICATE_DISTANCE = 10      # dHash bits (of 64), in the most changed block, within which two frames are the same picture
+DUPLICATE_WINDOW = 32        # recent sampled hashes to compare against
+DEFAULT_FPS = 25.0
+
+
+def dhash(gray):
+    """64-bit difference hash of a grayscale image."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def _blocks(gray, grid=GRID):
+    for band in np.array_split(gray, grid, axis=0):
+        yield from np.array_split(band, grid, axis=1)
+
+
+def block_hash(gray, grid=GRID):
+    """dHash of each block, so a change confined to one part of the picture still shows."""
+    return tuple(dhash(block) for block in _blocks(gray, grid))
+
+
+def block_distance(a, b):
+    return max(hamming(x, y) for x, y in zip(a, b))
+
+
+class SampledFrame:
+    __slots__ = ('index', 'time', 'image', 'reason', 'change', 'hash')  # hash: block_hash of the thumbnail
+
+    def __init__(self, index, time, image, reason, change, hash):
+        self.index = index
+        self.time = time        # seconds from the start of the clip
+        self.image = image      # full-resolution BGR frame
+        self.reason = reason    # first, scene, motion or interval
+        self.change = change
+        self.hash = hash
+
+
+class SamplerStats:
+    __slots__ = ('decoded', 'probed', 'sampled', 'duplicates', 'seconds')
+
+    def __init__(self):
+        self.decoded = self.probed = self.sampled = self.duplicates = 0
+        self.seconds = 0.0
+
+    @property
+    def fps(self):
+        return self.decoded / self.seconds if self.seconds else 0.0
+
+    @property
+    def skipped_fraction(self):
+        return 1 - self.sampled / self.decoded if self.decoded else 0.0
+
+    def to_dict(self):
+        return {'decoded': self.decoded, 'probed': self.probed, 'sampled': self.sampled,
+                'duplicates': self.duplicates, 'seconds': round(self.seconds, 3),
+                'fps': round(self.fps, 1), 'skipped_fraction': round(self.skipped_fraction, 4)}
+
+
+class FrameSampler:
+    """Picks the informative frames of a video in one sequential pass.
+
+    Frames are grabbed in order and only every probe interval is converted
+    and compared, at ANALYSIS_WIDTH, with the previous probe; the interval
+    stretches while the picture is still and snaps back when it moves. Change
+    is measured per block, so one person crossing a static shot counts. A
+    probe is sampled on a scene cut, once enough movement has built up since
+    the last sample, or after MAX_GAP_SECONDS regardless. Cuts and interval
+    samples are dropped if their block hashes match a recent sample (a cut
+    back to an earlier shot, footage that never changed); motion samples are
+    always kept. Memory stays at one frame plus a few small thumbnails and
+    hashes, whatever the clip length.
+    `stats` describes the last (or current) pass.
+    """
+
+    def __init__(self, probe_min=PROBE_MIN_SECONDS, probe_max=PROBE_MAX_SECONDS, min_gap=MIN_GAP_SECONDS,
+                 max_gap=MAX_GAP_SECONDS, motion_budget=MOTION_BUDGET, scene_change=SCENE_CHANGE,
+                 duplicate_distance=DUPLICATE_DISTANCE, duplicate_window=DUPLICATE_WINDOW):
+        self.probe_min = probe_min
+        self.probe_max = probe_max
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.motion_budget = motion_budget
+        self.scene_change = scene_change
+        self.duplicate_distance = duplicate_distance
+        self.duplicate_window = duplicate_window
+        self.stats = SamplerStats()
+
+    @staticmethod
+    def _thumbnail(image):
+        height, width = image.shape[:2]
+        size = (ANALYSIS_WIDTH, max(1, round(height * ANALYSIS_WIDTH / width)))
+        return cv2.cvtColor(cv2.resize(image, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+    def sample(self, path):
+        """Yield SampledFrames from a video file; raises ValueError if it cannot be opened."""
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f'Unreadable video: {os.path.basename(path)}')
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        if not fps or fps <= 0 or fps > 240:
+            fps = DEFAULT_FPS
+        min_step = max(1, round(self.probe_min * fps))
+        max_step = max(min_step, round(self.probe_max * fps))
+        stats = self.stats = SamplerStats()
+        recent = deque(maxlen=self.duplicate_window)
+        previous = None
+        step = min_step
+        next_probe = 0
+        motion = 0.0
+        last_time = None
+        index = -1
+        started = time.perf_counter()
+        try:
+            while capture.grab():
+                index += 1
+                stats.decoded += 1
+                if index < next_probe:
+                    continue
+                ok, image = capture.retrieve()
+                if not ok:
+                    break
+                stats.probed += 1
+                now = index / fps
+                gray = self._thumbnail(image)
+                if previous is None:
+                    change = local = 0.0
+                else:
+                    diff = cv2.absdiff(gray, previous)
+                    change = float(diff.mean()) / 255
+                    local = max(float(block.mean()) for block in _blocks(diff)) / 255
+                previous = gray
+                moving = local >= MOTION_FLOOR
+                if moving:
+                    motion += local
+                step = min_step if moving else min(step * 2, max_step)
+                next_probe = index + step
+
+                if last_time is None:
+                    reason = 'first'
+                elif change >= self.scene_change:
+                    reason = 'scene'
+                elif now - last_time < self.min_gap:
+                    continue
+                elif motion >= self.motion_budget:
+                    reason = 'motion'
+                elif now - last_time >= self.max_gap:
+                    reason = 'interval'
+                else:
+                    continue
+
+                frame_hash = block_hash(gray)
+                if reason != 'motion' and any(
+                        block_distance(frame_hash, seen) <= self.duplicate_distance for seen in recent):
+                    # Nothing new. Timers keep running so the next real change is not held back,
+                    # but a cut back to a known shot does not count as movement either.
+                    stats.duplicates += 1
+                    if reason == 'scene':
+                        motion = 0.0
+                    continue
+                motion = 0.0
+                last_time = now
+                recent.append(frame_hash)
+                stats.sampled += 1
+                stats.seconds = time.perf_counter() - started
+                yield SampledFrame(index, now, image, reason, change, frame_hash)
+        finally:
+            capture.release()
+            stats.seconds = time.perf_counter() - started
+
+
+def _synthetic_clip(path, seconds=60, fps=25, size=(640, 360)):
+    """Still shots, a walking figure, cuts, and a cut back to an earlier shot: typical CCTV footage."""
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    rng = np.random.default_rng(7)
+    scenes = [cv2.resize((rng.random((4, 6, 3)) * 255).astype(np.uint8), size, interpolation=cv2.INTER_CUBIC)
+              for _ in range(3)]
+    for i in range(seconds * fps):
+        t = i / fps
+        scene = scenes[0] if t < 20 or t >= 50 else (scenes[1] if t < 35 else scenes[2])
+        frame = scene.copy()
+        if 8 <= t < 20 or 40 <= t < 45:
+            for k in range(3):
+                x = int(((t + 3 * k) % 10) / 10 * (width - 60))
+                cv2.rectangle(frame, (x, height // 4 + 40 * k), (x + 50, height // 4 + 40 * k + 140), (30, 30, 200), -1)
+        noise = rng.integers(-3, 4, frame.shape, dtype=np.int16)
+        writer.write(np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    writer.release()
+
+
+def benchmark(paths):
+    sampler = FrameSampler()
+    for path in paths:
+        reasons = {}
+        for frame in sampler.sample(path):
+            reasons[frame.reason] = reasons.get(frame.reason, 0) + 1
+        s = sampler.stats
+        print(f'{os.path.basename(path)}: decoded {s.decoded} frames in {s.seconds:.2f}s ({s.fps:.0f} fps), '
+              f'probed {s.probed}, sampled {s.sampled} {reasons}, duplicates dropped {s.duplicates}, '
+              f'skipped {s.skipped_fraction:.1%}')
+
+
+if __name__ == '__main__':
+    # python framesampler.py [clip ...]; without clips, runs on a generated one
+    if len(sys.argv) > 1:
+        benchmark(sys.argv[1:])
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            clip = os.path.join(tmp, 'synthetic.mp4')
+            _synthetic_clip(clip)
+            benchmark([clip])
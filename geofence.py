@@ -0,0 +1,192 @@
+import json
+import threading
+
+import numpy as np
+
+INDEX_CELLS = 32  # spatial index resolution per side
+
+
+def parse_polygon(coordinates):
+    """Parse a stored `[[lat, lng], ...]` JSON polygon into an (n, 2) array, or None."""
+    try:
+        coords = json.loads(coordinates) if isinstance(coordinates, str) else coordinates
+        arr = np.asarray(coords, dtype=float)
+    except Exception:
+        return None
+    if arr.ndim != 2 or arr.shape[0] < 3 or arr.shape[1] < 2:
+        return None
+    return arr[:, :2]
+
+
+def points_in_polygon(lats, lngs, polygon):
+    """Vectorized ray casting of many points against one polygon."""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    inside = np.zeros(lats.shape, dtype=bool)
+    ys, xs = polygon[:, 0], polygon[:, 1]
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        yi, xi, yj, xj = ys[i], xs[i], ys[j], xs[j]
+        if yi != yj:
+            crosses = (yi > lats) != (yj > lats)
+            x_cross = (xj - xi) * (lats - yi) / (yj - yi) + xi
+            inside ^= crosses & (lngs < x_cross)
+        j = i
+    return inside
+
+
+class PreparedPolygon:
+    __slots__ = ('id', 'kind', 'name', 'coords', 'bbox')
+
+    def __init__(self, id, kind, name, coords):
+        self.id = id
+        self.kind = kind
+        self.name = name
+        self.coords = coords
+        self.bbox = (coords[:, 0].min(), coords[:, 1].min(), coords[:, 0].max(), coords[:, 1].max())
+
+
+class GeofenceIndex:
+    """Parsed polygons of one event bucketed into a uniform grid by bounding box.
+
+    `classify` only ray-casts points whose grid cell overlaps a polygon's
+    bounding box, so checking a batch against hundreds of polygons avoids a
+    full points x polygons scan.
+    """
+
+    def __init__(self, polygons, cells=INDEX_CELLS):
+        self.polygons = [p for p in polygons if p is not None]
+        self.cells = cells
+        if not self.polygons:
+            self.bounds = None
+            return
+        boxes = np.array([p.bbox for p in self.polygons])
+        min_lat, min_lng = boxes[:, 0].min(), boxes[:, 1].min()
+        max_lat, max_lng = boxes[:, 2].max(), boxes[:, 3].max()
+        self.bounds = (min_lat, min_lng, max_lat, max_lng)
+        self.dlat = max(max_lat - min_lat, 1e-9) / cells
+        self.dlng = max(max_lng - min_lng, 1e-9) / cells
+        # Per polygon, which index cells its bounding box touches
+        self.cell_masks = []
+        for p in self.polygons:
+            mask = np.zeros((cells, cells), dtype=bool)
+            r0, c0 = self._cell(p.bbox[0], p.bbox[1])
+            r1, c1 = self._cell(p.bbox[2], p.bbox[3])
+            mask[r0:r1 + 1, c0:c1 + 1] = True
+            self.cell_masks.append(mask.ravel())
+
+    def _cell(self, lat, lng):
+        r = int(min(self.cells - 1, max(0, (lat - self.bounds[0]) // self.dlat)))
+        c = int(min(self.cells - 1, max(0, (lng - self.bounds[1]) // self.dlng)))
+        return r, c
+
+    def of_kind(self, kind):
+        return [p for p in self.polygons if p.kind == kind]
+
+    def classify(self, lats, lngs):
+        """Return a list of (kind, polygon_id, point_indices) hits for arrays of points."""
+        lats = np.asarray(lats, dtype=float).ravel()
+        lngs = np.asarray(lngs, dtype=float).ravel()
+        if self.bounds is None or not len(lats):
+            return []
+        min_lat, min_lng, max_lat, max_lng = self.bounds
+        in_bounds = (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+        idx = np.nonzero(in_bounds)[0]
+        if not len(idx):
+            return []
+        r = np.clip(((lats[idx] - min_lat) // self.dlat).astype(np.int64), 0, self.cells - 1)
+        c = np.clip(((lngs[idx] - min_lng) // self.dlng).astype(np.int64), 0, self.cells - 1)
+        point_cells = r * self.cells + c
+        hits = []
+        for p, mask in zip(self.polygons, self.cell_masks):
+            cand = idx[mask[point_cells]]
+            if not len(cand):
+                continue
+            b = p.bbox
+            plat, plng = lats[cand], lngs[cand]
+            in_box = (plat >= b[0]) & (plat <= b[2]) & (plng >= b[1]) & (plng <= b[3])
+            cand = cand[in_box]
+            if not len(cand):
+                continue
+            inside = cand[points_in_polygon(lats[cand], lngs[cand], p.coords)]
+            if len(inside):
+                hits.append((p.kind, p.id, inside))
+        return hits
+
+    def membership(self, lats, lngs):
+        """Per-point lists of restricted area ids and zone ids."""
+        n = len(np.asarray(lats).ravel())
+        out = [{'restricted': [], 'zones': []} for _ in range(n)]
+        for kind, pid, points in self.classify(lats, lngs):
+            key = 'restricted' if kind == 'restricted' else 'zones'
+            for i in points.tolist():
+                out[i][key].append(pid)
+        return out
+
+    def count_inside(self, lats, lngs, kind='restricted'):
+        """Number of points inside at least one polygon of a kind."""
+        return count_hits(self.classify(lats, lngs), len(np.asarray(lats).ravel()), kind)
+
+
+def count_hits(hits, n, kind='restricted'):
+    """Number of the `n` classified points inside at least one polygon of a kind."""
+    flags = np.zeros(n, dtype=bool)
+    for k, _, points in hits:
+        if k == kind:
+            flags[points] = True
+    return int(flags.sum())
+
+
+def build_index(restricted_areas, zones):
+    polygons = []
+    for ra in restricted_areas:
+        coords = parse_polygon(ra.coordinates)
+        if coords is not None:
+            polygons.append(PreparedPolygon(ra.id, 'restricted', ra.name, coords))
+    for z in zones:
+        coords = parse_polygon(z.coordinates) if z.coordinates else None
+        if coords is not None:
+            polygons.append(PreparedPolygon(z.id, 'zone', z.name, coords))
+    return GeofenceIndex(polygons)
+
+
+class GeofenceCache:
+    """Process-wide cache of one prepared index per event.
+
+    A generation counter per event keeps an index built from a read that
+    raced with `invalidate` from being cached. With several workers, set
+    `shared` to a cluster.SharedGenerations so `invalidate` reaches them all.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.shared = None
+
+    def get(self, event_id, build):
+        if self.shared is not None and self.shared.changed(event_id):
+            self._drop(event_id)
+        with self._lock:
+            index = self._indexes.get(event_id)
+            generation = self._generations.get(event_id, 0)
+        if index is not None:
+            return index
+        index = build()
+        with self._lock:
+            if self._generations.get(event_id, 0) != generation:
+                return index
+            return self._indexes.setdefault(event_id, index)
+
+    def invalidate(self, event_id):
+        self._drop(event_id)
+        if self.shared is not None:
+            self.shared.bump(event_id)
+
+    def _drop(self, event_id):
+        with self._lock:
+            self._indexes.pop(event_id, None)
+            self._generations[event_id] = self._generations.get(event_id, 0) + 1
+
+
+indexes = GeofenceCache()
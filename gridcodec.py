@@ -0,0 +1,81 @@
+import struct
+import threading
+
+import numpy as np
+
+LEVELS = 64  # quantized intensity steps; 0 means empty
+
+_KEY_HEADER = struct.Struct('<cIHHddd')   # b'K', seq, size, levels, south, west, step
+_DELTA_HEADER = struct.Struct('<cIH')     # b'D', seq, count
+
+
+def quantize(cells, levels=LEVELS):
+    """Map 0..1 intensities (NaN = empty) to uint8 steps 0..levels-1."""
+    return np.rint(np.nan_to_num(np.clip(cells, 0.0, 1.0)) * (levels - 1)).astype(np.uint8)
+
+
+class _Grid:
+    __slots__ = ('seq', 'values', 'origin')
+
+    def __init__(self, values, origin):
+        self.seq = 0
+        self.values = values
+        self.origin = origin
+
+
+class GridEncoder:
+    """Keyframe + delta encoding of per-event venue grids.
+
+    `encode` keeps the last quantized grid per event and returns only the
+    cells whose step changed since the previous tick, or a keyframe when the
+    event is new or its grid geometry changed. `keyframe` returns the full
+    current grid for a client that just joined. Sequence numbers let clients
+    detect a gap and ask for a fresh keyframe.
+
+    Payloads are either JSON-friendly dicts or compact little-endian bytes:
+    keyframe b'K' | seq u32 | size u16 | levels u16 | south, west, step f64 | u8 * size²
+    delta    b'D' | seq u32 | count u16 | u16 cell * count | u8 value * count
+    """
+
+    def __init__(self, binary=True, levels=LEVELS):
+        self.binary = binary
+        self.levels = levels
+        self._grids = {}
+        self._lock = threading.Lock()
+
+    def encode(self, event_id, cells, origin):
+        """`origin` is (size, south, west, step) of the grid; returns a payload."""
+        values = quantize(cells, self.levels)
+        with self._lock:
+            grid = self._grids.get(event_id)
+            if grid is None or grid.origin != origin or len(grid.values) != len(values):
+                grid = self._grids[event_id] = _Grid(values, origin)
+                return self._keyframe(grid)
+            grid.seq += 1
+            changed = np.flatnonzero(values != grid.values)
+            grid.values = values
+            return self._delta(grid.seq, changed, values[changed])
+
+    def keyframe(self, event_id):
+        with self._lock:
+            grid = self._grids.get(event_id)
+            return self._keyframe(grid) if grid is not None else None
+
+    def remove(self, event_id):
+        with self._lock:
+            self._grids.pop(event_id, None)
+
+    def _keyframe(self, grid):
+        size, south, west, step = grid.origin
+        if self.binary:
+            return _KEY_HEADER.pack(b'K', grid.seq, size, self.levels, south, west, step) + grid.values.tobytes()
+        return {
+            'key': True, 'seq': grid.seq, 'size': size, 'levels': self.levels,
+            'south': south, 'west': west, 'step': step, 'values': grid.values.tolist()
+        }
+
+    def _delta(self, seq, cells, values):
+        if self.binary:
+            return (_DELTA_HEADER.pack(b'D', seq, len(cells))
+                    + cells.astype('<u2').tobytes() + values.tobytes())
+        return {'key': False, 'seq': seq, 'cells': cells.tolist(), 'values': values.tolist()}
@@ -1,26 +1,43 @@
+import os
 from flask import Flask, request, jsonify
 from flask_socketio import SocketIO, emit, join_room
-import requests
+from prediction_gateway import PredictionGateway, HTTPPredictor, StubPredictor, GatewayUnavailable
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# PREDICTOR_STUB=1 swaps the model service for a local stub (tests, offline dev)
+if (os.getenv('PREDICTOR_STUB') or '').lower() in ('1', 'true'):
+    predictor = StubPredictor()
+else:
+    predictor = HTTPPredictor(os.getenv('PREDICTOR_URL') or 'http://127.0.0.1:5001/predict')
+gateway = PredictionGateway(predictor, ttl=float(os.getenv('PREDICTION_TTL_SECONDS') or 10))
+
 @app.route('/health')
 def health():
-    return jsonify(status="MCP Server Running ✅")
+    return jsonify(status="MCP Server Running ✅", predictor=gateway.breaker.state, stats=gateway.stats)
 
 # Route triggered when UI wants crowd prediction
 @app.route('/analyze', methods=['POST'])
 def analyze():
-    data = request.json
-    event_id = data['eventId']
-
-    # Call AI model / ML script on your machine
-    ai_response = requests.post("http://127.0.0.1:5001/predict", json=data)
-
-    # Send result to connected clients (dashboard)
-    socketio.emit('crowdPrediction', ai_response.json(), room=event_id)
-    return jsonify(success=True)
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify(success=False, error='Body must be a JSON object'), 400
+    event_id = data.get('eventId')
+    # Used as the coalescing and cache key, so it must be a plain string or number
+    if isinstance(event_id, bool) or not isinstance(event_id, (str, int)) or event_id == '':
+        return jsonify(success=False, error='eventId must be a string or integer'), 400
+
+    # One model call per event per TTL; concurrent clicks share it
+    try:
+        prediction, meta = gateway.predict(event_id, data)
+    except GatewayUnavailable as e:
+        return jsonify(success=False, error=str(e)), 503
+
+    # Only a new prediction is pushed; cached/coalesced callers were already sent it
+    if meta['source'] == 'model':
+        socketio.emit('crowdPrediction', prediction, room=event_id)
+    return jsonify(success=True, source=meta['source'], prediction=prediction)
 
 # SocketIO connection for live event monitoring
 @socketio.on('joinEvent')
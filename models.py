@@ -40,11 +40,15 @@ class Event(db.Model):
     attendees = db.relationship('Attendee', backref='event', lazy=True)
     check_ins = db.relationship('CheckIn', backref='event', lazy=True)
     capacity_alerts = db.relationship('CapacityAlert', backref='event', lazy=True)
+    exits = db.relationship('EvacuationExit', backref='event', lazy=True)
     
     def __repr__(self):
         return f"Event('{self.name}', '{self.venue_name}', '{self.date_time}')"
 
 class Incident(db.Model):
+    __table_args__ = (
+        db.Index('ix_incident_event_timestamp', 'event_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     incident_type = db.Column(db.String(50), nullable=False)  # Medical, Security, Other
     description = db.Column(db.Text, nullable=False)
@@ -61,6 +65,9 @@ class Incident(db.Model):
         return f"Incident('{self.incident_type}', '{self.severity}', '{self.status}')"
 
 class MissingPerson(db.Model):
+    __table_args__ = (
+        db.Index('ix_missing_person_event_timestamp', 'event_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer, nullable=True)
@@ -90,10 +97,14 @@ class MissingPersonMedia(db.Model):
         return f"MissingPersonMedia('{self.media_type}', '{self.file_path}')"
 
 class DetectionResult(db.Model):
+    __table_args__ = (
+        db.Index('ix_detection_result_media_job', 'media_id', 'job_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     missing_person_id = db.Column(db.Integer, db.ForeignKey('missing_person.id'), nullable=False)
     media_id = db.Column(db.Integer, db.ForeignKey('missing_person_media.id'), nullable=True)
-    result_type = db.Column(db.String(20), nullable=False)  # face, clothing, reid
+    job_id = db.Column(db.Integer, db.ForeignKey('detection_job.id'), nullable=True)  # Set once the media has been analyzed
+    result_type = db.Column(db.String(20), nullable=False)  # face, person, none, clothing, reid
     confidence = db.Column(db.Float, nullable=True)
     details = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -101,6 +112,30 @@ class DetectionResult(db.Model):
     def __repr__(self):
         return f"DetectionResult('{self.result_type}', confidence='{self.confidence}')"
 
+class DetectionJob(db.Model):
+    __table_args__ = (
+        db.Index('ix_detection_job_person_status', 'missing_person_id', 'status'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    missing_person_id = db.Column(db.Integer, db.ForeignKey('missing_person.id'), nullable=False)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    requested_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed, cancelled
+    total = db.Column(db.Integer, default=0)       # Media to analyze in this run
+    processed = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    skipped = db.Column(db.Integer, default=0)     # Media of a type this run cannot analyze
+    detections = db.Column(db.Integer, default=0)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # Heartbeat while running
+
+    def __repr__(self):
+        return f"DetectionJob({self.id}, '{self.status}', {self.processed}/{self.total})"
+
 class RestrictedArea(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -111,7 +146,21 @@ class RestrictedArea(db.Model):
     def __repr__(self):
         return f"RestrictedArea('{self.name}', Event ID: '{self.event_id}')"
 
+class EvacuationExit(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+
+    def __repr__(self):
+        return f"EvacuationExit('{self.name}', Event ID: '{self.event_id}')"
+
 class BottleneckAlert(db.Model):
+    __table_args__ = (
+        db.Index('ix_bottleneck_alert_event_timestamp', 'event_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     location_description = db.Column(db.String(200), nullable=False)
     latitude = db.Column(db.Float, nullable=False)
@@ -119,6 +168,7 @@ class BottleneckAlert(db.Model):
     density_level = db.Column(db.Float, nullable=False)  # People per square meter
     risk_level = db.Column(db.String(20), nullable=False)  # Low, Medium, High, Critical
     prediction = db.Column(db.Text, nullable=True)  # AI prediction text
+    suppressed_count = db.Column(db.Integer, default=0)  # Repeats held back since the previous alert
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
     
@@ -154,7 +204,42 @@ class CrowdDensity(db.Model):
     def __repr__(self):
         return f"CrowdDensity('{self.zone_name}', density={self.density_value}, risk='{self.risk_level}')"
 
+class DensityBlock(db.Model):
+    """One minute of 1-second density readings for a series (venue or zone)."""
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'series', 'minute', name='uq_density_block'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    series = db.Column(db.String(50), nullable=False)  # 'venue' or 'zone:<id>'
+    minute = db.Column(db.Integer, nullable=False)  # Epoch seconds of the minute start (UTC)
+    values = db.Column(db.LargeBinary, nullable=False)  # 60 packed float32, NaN where no reading
+
+    def __repr__(self):
+        return f"DensityBlock('{self.series}', minute={self.minute})"
+
+class DensityRollup(db.Model):
+    """Aggregate of a series over a 1-minute, 5-minute or 1-hour bucket."""
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'series', 'resolution', 'bucket', name='uq_density_rollup'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    series = db.Column(db.String(50), nullable=False)
+    resolution = db.Column(db.Integer, nullable=False)  # Bucket length in seconds
+    bucket = db.Column(db.Integer, nullable=False)  # Epoch seconds of the bucket start (UTC)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    min_value = db.Column(db.Float, nullable=True)
+    max_value = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f"DensityRollup('{self.series}', {self.resolution}s @ {self.bucket})"
+
 class EmergencyContact(db.Model):
+    __table_args__ = (
+        db.Index('ix_emergency_contact_event_active', 'event_id', 'is_active'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
@@ -171,7 +256,28 @@ class EmergencyContact(db.Model):
     def __repr__(self):
         return f"EmergencyContact('{self.name}', channels='{self.preferred_channels}')"
 
+class NotificationDelivery(db.Model):
+    __table_args__ = (
+        db.Index('ix_notification_delivery_event_created', 'event_id', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=True)
+    channel = db.Column(db.String(10), nullable=False)  # email, sms
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=True)
+    status = db.Column(db.String(10), nullable=False)  # sent, failed, dropped
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # when queued
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"NotificationDelivery('{self.channel}', '{self.recipient}', '{self.status}')"
+
 class Zone(db.Model):
+    __table_args__ = (
+        db.Index('ix_zone_event', 'event_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -199,6 +305,9 @@ class Zone(db.Model):
         return f"Zone('{self.name}', {self.current_capacity}/{self.max_capacity})"
 
 class Attendee(db.Model):
+    __table_args__ = (
+        db.Index('ix_attendee_event_registered', 'event_id', 'registration_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), nullable=True)
@@ -206,21 +315,24 @@ class Attendee(db.Model):
     qr_code = db.Column(db.String(100), unique=True, nullable=False)
     registration_time = db.Column(db.DateTime, default=datetime.utcnow)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    # Zone of the open check-in, kept in step by the scan/checkout paths
+    current_zone_id = db.Column(db.Integer, db.ForeignKey('zone.id'), nullable=True)
     check_ins = db.relationship('CheckIn', backref='attendee', lazy=True)
-    
-    @property
-    def current_zone(self):
-        latest_checkin = CheckIn.query.filter_by(attendee_id=self.id, check_out_time=None).first()
-        return latest_checkin.zone if latest_checkin else None
+    current_zone = db.relationship('Zone', foreign_keys=[current_zone_id])
     
     @property
     def is_checked_in(self):
-        return CheckIn.query.filter_by(attendee_id=self.id, check_out_time=None).first() is not None
+        return self.current_zone_id is not None
     
     def __repr__(self):
         return f"Attendee('{self.name}', QR: {self.qr_code})"
 
 class CheckIn(db.Model):
+    __table_args__ = (
+        db.Index('ix_check_in_event_attendee_open', 'event_id', 'attendee_id', 'check_out_time'),
+        db.Index('ix_check_in_event_zone_time', 'event_id', 'zone_id', 'check_in_time'),
+        db.Index('ix_check_in_attendee_open', 'attendee_id', 'check_out_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     attendee_id = db.Column(db.Integer, db.ForeignKey('attendee.id'), nullable=False)
     zone_id = db.Column(db.Integer, db.ForeignKey('zone.id'), nullable=False)
@@ -238,6 +350,9 @@ class CheckIn(db.Model):
         return f"CheckIn(Attendee: {self.attendee_id}, Zone: {self.zone_id}, Time: {self.check_in_time})"
 
 class CapacityAlert(db.Model):
+    __table_args__ = (
+        db.Index('ix_capacity_alert_event_timestamp', 'event_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     zone_id = db.Column(db.Integer, db.ForeignKey('zone.id'), nullable=False)
     alert_type = db.Column(db.String(20), nullable=False)  # warning, critical, over_capacity
@@ -245,6 +360,7 @@ class CapacityAlert(db.Model):
     current_count = db.Column(db.Integer, nullable=False)
     max_capacity = db.Column(db.Integer, nullable=False)
     message = db.Column(db.Text, nullable=True)
+    suppressed_count = db.Column(db.Integer, default=0)  # Repeats held back since the previous alert
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
     resolved = db.Column(db.Boolean, default=False)
@@ -0,0 +1,203 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+RECIPIENT_BATCH = 50   # recipients per email message / SMS job
+MAX_ATTEMPTS = 3
+BACKOFF_SECONDS = 1.0  # doubled after every failed attempt
+SMTP_IDLE_CHECK = 60   # seconds of idleness before probing a pooled SMTP connection
+
+
+class LocalTransport:
+    """Records messages in memory instead of sending them (dev and tests)."""
+
+    def __init__(self, channel, echo=True):
+        self.channel = channel
+        self.echo = echo
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, subject, recipients, body):
+        with self._lock:
+            self.sent.append((subject, list(recipients), body))
+        if self.echo:
+            print(f'[{self.channel} disabled] Would send to:', recipients, subject or '', body)
+
+
+class SMTPTransport:
+    """Sends email over one reused SMTP connection per worker thread."""
+
+    def __init__(self, mail, sender):
+        self.mail = mail
+        self.sender = sender
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        last = getattr(self._local, 'last_used', 0)
+        if conn is not None and time.time() - last > SMTP_IDLE_CHECK:
+            try:
+                conn.host.noop()
+            except Exception:
+                self.close()
+                conn = None
+        if conn is None:
+            conn = self.mail.connect()
+            conn.__enter__()
+            self._local.conn = conn
+        return conn
+
+    def send(self, subject, recipients, body):
+        from flask_mail import Message
+        msg = Message(subject=subject, recipients=list(recipients), body=body, sender=self.sender)
+        try:
+            self._connection().send(msg)
+            self._local.last_used = time.time()
+        except Exception:
+            # Drop the connection so the retry starts from a fresh one
+            self.close()
+            raise
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.__exit__(None, None, None)
+            except Exception:
+                pass
+
+
+class TwilioTransport:
+    """Sends SMS through one shared Twilio client."""
+
+    def __init__(self, sid, token, from_number):
+        from twilio.rest import Client
+        self.client = Client(sid, token)
+        self.from_number = from_number
+
+    def send(self, subject, recipients, body):
+        failed = []
+        for r in recipients:
+            try:
+                self.client.messages.create(to=r, from_=self.from_number, body=body)
+            except Exception:
+                failed.append(r)
+        if failed:
+            raise PartialDeliveryError(failed)
+
+
+class PartialDeliveryError(Exception):
+    def __init__(self, failed):
+        super().__init__(f'{len(failed)} recipient(s) failed')
+        self.failed = failed
+
+
+class NotificationJob:
+    __slots__ = ('channel', 'subject', 'recipients', 'body', 'event_id', 'attempts', 'queued_at')
+
+    def __init__(self, channel, subject, recipients, body, event_id=None):
+        self.channel = channel
+        self.subject = subject
+        self.recipients = recipients
+        self.body = body
+        self.event_id = event_id
+        self.attempts = 0
+        self.queued_at = datetime.utcnow()
+
+
+class NotificationDispatcher:
+    """Bounded queue of outbound notifications drained by a worker pool.
+
+    `submit` only enqueues, so callers in request handlers or the density
+    loop return immediately. Workers send through the channel's transport,
+    retry with exponential backoff and hand every outcome to `recorder`.
+    """
+
+    def __init__(self, transports, workers=4, queue_size=1000, recorder=None, wrap=None):
+        self.transports = transports
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.recorder = recorder
+        self.wrap = wrap  # e.g. run workers inside an app context
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                target = self._worker if self.wrap is None else (lambda: self.wrap(self._worker))
+                t = threading.Thread(target=target, name=f'notify-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, channel, subject, recipients, body, event_id=None):
+        """Queue a message for every recipient; returns the number of jobs queued."""
+        recipients = [r for r in recipients if r]
+        if not recipients or channel not in self.transports:
+            return 0
+        self._ensure_workers()
+        queued = 0
+        for i in range(0, len(recipients), RECIPIENT_BATCH):
+            job = NotificationJob(channel, subject, recipients[i:i + RECIPIENT_BATCH], body, event_id)
+            try:
+                self.queue.put_nowait(job)
+                queued += 1
+            except queue.Full:
+                print('Notification queue full; dropping', channel, 'job for', len(job.recipients), 'recipient(s)')
+                self._record(job, 'dropped', 'queue full')
+        return queued
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self._deliver(job)
+            except Exception as e:
+                print('Notification worker error:', e)
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, job):
+        transport = self.transports[job.channel]
+        delay = BACKOFF_SECONDS
+        while True:
+            job.attempts += 1
+            try:
+                transport.send(job.subject, job.recipients, job.body)
+                self._record(job, 'sent')
+                return
+            except PartialDeliveryError as e:
+                sent = [r for r in job.recipients if r not in e.failed]
+                if sent:
+                    self._record(job, 'sent', recipients=sent)
+                job.recipients = e.failed
+                error = str(e)
+            except Exception as e:
+                error = str(e)
+            if job.attempts >= MAX_ATTEMPTS:
+                print(f'{job.channel} delivery failed after {job.attempts} attempts:', error)
+                self._record(job, 'failed', error)
+                return
+            time.sleep(delay)
+            delay *= 2
+
+    def _record(self, job, status, error=None, recipients=None):
+        if self.recorder is None:
+            return
+        try:
+            self.recorder(job, status, error, recipients or job.recipients)
+        except Exception as e:
+            print('Notification status record error:', e)
+
+    def drain(self, timeout=None):
+        """Block until the queue is empty (used by tests and shutdown)."""
+        deadline = time.time() + timeout if timeout else None
+        while self.queue.unfinished_tasks:
+            if deadline and time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
@@ -0,0 +1,89 @@
+from sqlalchemy import case, func, select, update
+
+from app import db
+from models import Zone, CheckIn, Attendee
+
+
+def apply_delta(zone_id, delta):
+    """Atomically add `delta` to a zone's occupancy in the current transaction.
+
+    The arithmetic happens inside the UPDATE statement, so concurrent scanners
+    never overwrite each other's counts. Occupancy never drops below zero.
+    """
+    current = func.coalesce(Zone.current_capacity, 0)
+    db.session.execute(
+        update(Zone)
+        .where(Zone.id == zone_id)
+        .values(current_capacity=case((current + delta < 0, 0), else_=current + delta))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def apply_deltas(deltas):
+    """Apply several zone deltas ({zone_id: delta}) in the current transaction."""
+    for zone_id, delta in deltas.items():
+        if delta:
+            apply_delta(zone_id, delta)
+
+
+def open_checkin_counts(event_id):
+    """Number of open CheckIn rows per zone of an event."""
+    rows = db.session.execute(
+        select(CheckIn.zone_id, func.count(CheckIn.id))
+        .where(CheckIn.event_id == event_id, CheckIn.check_out_time.is_(None))
+        .group_by(CheckIn.zone_id)
+    ).all()
+    return {zone_id: count for zone_id, count in rows}
+
+
+def reconcile(event_id):
+    """Reset every zone counter of an event to its number of open check-ins.
+
+    The reset is one correlated UPDATE, so scans landing meanwhile are not
+    lost. Attendee presence is rebuilt in the same transaction. Returns
+    {zone_id: (old, new)} for the zones that had drifted. Commits.
+    """
+    before = {z.id: (z.current_capacity or 0) for z in Zone.query.filter_by(event_id=event_id).all()}
+    open_count = (
+        select(func.count(CheckIn.id))
+        .where(CheckIn.zone_id == Zone.id, CheckIn.check_out_time.is_(None))
+        .correlate(Zone)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(Zone)
+        .where(Zone.event_id == event_id)
+        .values(current_capacity=open_count)
+        .execution_options(synchronize_session=False)
+    )
+    rebuild_presence(event_id=event_id)
+    db.session.commit()
+    counts = open_checkin_counts(event_id)
+    return {
+        zone_id: (old, counts.get(zone_id, 0))
+        for zone_id, old in before.items()
+        if old != counts.get(zone_id, 0)
+    }
+
+
+def rebuild_presence(conn=None, event_id=None):
+    """Recompute Attendee.current_zone_id from open CheckIn rows.
+
+    Runs on `conn` when given (used by schema upgrades), otherwise in the
+    current session without committing.
+    """
+    open_zone = (
+        select(CheckIn.zone_id)
+        .where(CheckIn.attendee_id == Attendee.id, CheckIn.check_out_time.is_(None))
+        .order_by(CheckIn.check_in_time.desc())
+        .limit(1)
+        .correlate(Attendee)
+        .scalar_subquery()
+    )
+    stmt = update(Attendee).values(current_zone_id=open_zone)
+    if event_id is not None:
+        stmt = stmt.where(Attendee.event_id == event_id)
+    if conn is not None:
+        conn.execute(stmt)
+    else:
+        db.session.execute(stmt.execution_options(synchronize_session=False))
@@ -0,0 +1,91 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+
+def benchmark(scanners=8, attendees=2000, batch=0):
+    """Check attendees in to one zone from concurrent scanners, check every third one out, and verify the count.
+
+    With `batch` 0 every scan is its own request to the scan and checkout
+    endpoints; otherwise each scanner posts `batch` operations at a time to
+    the batch endpoint, as a gate that buffers scans would.
+    """
+    from app import app, db
+    from models import User, Event, Zone, Attendee, CheckIn
+    import occupancy
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        event = Event(name='Bench', objective='o', target_audience='t', date_time=datetime.utcnow(),
+                      venue_name='v', venue_address='a', latitude=0.0, longitude=0.0, description='d',
+                      user_id=user.id)
+        db.session.add(event)
+        db.session.commit()
+        zone = Zone(name='Gate', max_capacity=attendees * 10, current_capacity=0, event_id=event.id)
+        db.session.add(zone)
+        db.session.add_all([Attendee(name=f'A{i}', qr_code=f'BENCH-{i}', event_id=event.id) for i in range(attendees)])
+        db.session.commit()
+        user_id, event_id, zone_id = user.id, event.id, zone.id
+
+    leaving = {f'BENCH-{i}' for i in range(0, attendees, 3)}
+    errors = []
+
+    def scanner(codes):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        # Every third attendee goes straight back out, so check-ins and checkouts interleave
+        ops = []
+        for code in codes:
+            ops.append({'op': 'checkin', 'qr_code': code, 'zone_id': zone_id})
+            if code in leaving:
+                ops.append({'op': 'checkout', 'qr_code': code})
+        if not batch:
+            for op in ops:
+                url = f'/event/{event_id}/scan' if op['op'] == 'checkin' else f'/event/{event_id}/checkout'
+                r = client.post(url, json=op)
+                if r.status_code != 200:
+                    errors.append((op['op'], op['qr_code'], r.status_code))
+            return
+        for i in range(0, len(ops), batch):
+            r = client.post(f'/event/{event_id}/scan/batch', json={'operations': ops[i:i + batch]})
+            if r.status_code != 200:
+                errors.append(('batch', i, r.status_code))
+            else:
+                errors.extend(('batch', result.get('error')) for result in r.get_json()['results'] if not result['ok'])
+
+    codes = [f'BENCH-{i}' for i in range(attendees)]
+    threads = [threading.Thread(target=scanner, args=(codes[n::scanners],)) for n in range(scanners)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - started
+
+    scans = attendees + len(leaving)
+    with app.app_context():
+        counter = db.session.get(Zone, zone_id).current_capacity
+        present = CheckIn.query.filter_by(zone_id=zone_id, check_out_time=None).count()
+        drift = occupancy.reconcile(event_id)
+    expected = attendees - len(leaving)
+    mode = f'batches of {batch}' if batch else 'single scans'
+    print(f'{scanners} scanners, {mode}: {scans} scans in {seconds:.2f}s ({scans / seconds:.0f} scans/s); '
+          f'zone counter {counter}, open check-ins {present}, expected {expected}, failed scans {len(errors)}')
+    if errors or counter != present or present != expected or drift:
+        sys.exit(f'Occupancy mismatch: errors={errors[:5]} drift={drift}')
+
+
+if __name__ == '__main__':
+    # python occupancy_bench.py [scanners] [attendees] [batch]; runs against a throwaway SQLite database
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        os.environ.pop('MAIL_SERVER', None)
+        benchmark(*(int(a) for a in sys.argv[1:4]))
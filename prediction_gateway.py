@@ -0,0 +1,184 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = 1.0   # seconds
+READ_TIMEOUT = 5.0
+CACHE_TTL = 10.0        # seconds a prediction is reused for the same event
+FAILURE_THRESHOLD = 5   # consecutive failures that open the breaker
+RESET_TIMEOUT = 30.0    # seconds the breaker stays open before one trial call
+
+
+class GatewayUnavailable(Exception):
+    """The predictor failed or the breaker is open, and no cached prediction exists."""
+
+
+class HTTPPredictor:
+    """Calls the model service over one keep-alive connection pool."""
+
+    def __init__(self, url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), pool_size=10):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __call__(self, payload):
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+class StubPredictor:
+    """Deterministic local predictor for tests and offline development."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, payload):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        density = float(payload.get('density', 0.5) or 0.5)
+        return {
+            'eventId': payload.get('eventId'),
+            'riskLevel': 'Critical' if density >= 0.8 else 'High' if density >= 0.6 else 'Medium' if density >= 0.4 else 'Low',
+            'predictedDensity': round(min(1.0, density * 1.1), 3),
+            'horizonMinutes': 10,
+            'source': 'stub',
+        }
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures -> half-open after `reset_timeout`."""
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if self.clock() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # Once the timeout passes, let exactly one trial call through
+            if self.clock() - self.opened_at >= self.reset_timeout and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PredictionGateway:
+    """One model call per event per TTL, however many clients ask.
+
+    Concurrent requests for the same event share a single in-flight call;
+    results are cached per event for `ttl` seconds. When the predictor fails
+    or the breaker is open, the last prediction is served as stale if there
+    is one, otherwise GatewayUnavailable is raised.
+    """
+
+    def __init__(self, predictor, ttl=CACHE_TTL, breaker=None, clock=time.monotonic):
+        self.predictor = predictor
+        self.ttl = ttl
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.clock = clock
+        self._cache = {}     # event_id -> (result, stored_at)
+        self._flights = {}   # event_id -> _Flight
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'cache_hits': 0, 'coalesced': 0, 'stale': 0, 'failures': 0}
+
+    def predict(self, event_id, payload):
+        """Return (result, meta) where meta says whether it was fresh, cached or stale."""
+        with self._lock:
+            cached = self._cache.get(event_id)
+            if cached and self.clock() - cached[1] < self.ttl:
+                self.stats['cache_hits'] += 1
+                return cached[0], {'source': 'cache', 'age': round(self.clock() - cached[1], 3)}
+            flight = self._flights.get(event_id)
+            leader = flight is None
+            if leader:
+                flight = self._flights[event_id] = _Flight()
+            else:
+                self.stats['coalesced'] += 1
+        if leader:
+            self._call(event_id, payload, flight)
+        else:
+            flight.done.wait()
+        if flight.error is None:
+            return flight.result, {'source': 'model' if leader else 'coalesced', 'age': 0.0}
+        return self._stale(event_id, flight.error)
+
+    def _call(self, event_id, payload, flight):
+        try:
+            if not self.breaker.allow():
+                raise GatewayUnavailable('Predictor circuit is open')
+            with self._lock:
+                self.stats['calls'] += 1
+            try:
+                result = self.predictor(payload)
+            except Exception as e:
+                self.breaker.record_failure()
+                raise GatewayUnavailable(f'Predictor failed: {e}')
+            self.breaker.record_success()
+            with self._lock:
+                self._cache[event_id] = (result, self.clock())
+            flight.result = result
+        except GatewayUnavailable as e:
+            flight.error = e
+            with self._lock:
+                self.stats['failures'] += 1
+        finally:
+            with self._lock:
+                self._flights.pop(event_id, None)
+            flight.done.set()
+
+    def _stale(self, event_id, error):
+        with self._lock:
+            cached = self._cache.get(event_id)
+            if cached is None:
+                raise error
+            self.stats['stale'] += 1
+            return cached[0], {'source': 'stale', 'age': round(self.clock() - cached[1], 3), 'error': str(error)}
+
+    def invalidate(self, event_id):
+        with self._lock:
+            self._cache.pop(event_id, None)
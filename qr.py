@@ -0,0 +1,188 @@
+import csv
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import struct
+import tempfile
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_M
+except Exception:
+    qrcode = None
+
+SCALE = 8           # pixels per module
+BORDER = 4          # quiet zone in modules
+RENDER_CHUNK = 250  # codes per process-pool task
+SAFE_NAME = re.compile(r'[A-Za-z0-9_-]{1,100}')
+RENDER_VERSION = 1  # bump when the rendered output changes, so cached files and ETags roll over
+MIME_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def matrix(data):
+    """QR modules for `data` as a boolean array (True = dark), quiet zone included.
+
+    The mask pattern is fixed instead of searched: every mask is valid and
+    skipping the eight-way penalty search makes encoding several times faster.
+    """
+    code = qrcode.QRCode(error_correction=ERROR_CORRECT_M, border=BORDER, mask_pattern=0)
+    code.add_data(data)
+    code.make(fit=True)
+    return np.array(code.get_matrix(), dtype=bool)
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+
+def render_png(data, scale=SCALE):
+    """Encode `data` as a 1-bit grayscale PNG."""
+    modules = matrix(data)
+    light = np.repeat(np.repeat(~modules, scale, axis=0), scale, axis=1)
+    rows = np.packbits(light, axis=1)
+    # Each scanline starts with filter type 0
+    raw = np.hstack([np.zeros((rows.shape[0], 1), dtype=np.uint8), rows]).tobytes()
+    height, width = light.shape
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 1, 0, 0, 0, 0))
+        + _png_chunk(b'IDAT', zlib.compress(raw, 6))
+        + _png_chunk(b'IEND', b'')
+    )
+
+
+def render_svg(data, scale=SCALE):
+    """Encode `data` as an SVG with one path run per horizontal stretch of dark modules."""
+    modules = matrix(data)
+    size = modules.shape[0]
+    runs = []
+    for y, row in enumerate(modules):
+        # Edges of dark runs: +1 where a run starts, -1 just past where it ends
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], row.astype(np.int8), [0]))))
+        for start, end in zip(edges[::2], edges[1::2]):
+            runs.append(f'M{start} {y}h{end - start}v1h-{end - start}z')
+    pixels = size * scale
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/><path fill="#000" d="{"".join(runs)}"/></svg>'
+    ).encode('utf-8')
+
+
+RENDERERS = {'png': render_png, 'svg': render_svg}
+
+
+def _render_batch(codes):
+    return [render_png(code) for code in codes]
+
+
+def render_many(codes, workers=None):
+    """Yield (code, png) for every code, rendering chunks in a process pool.
+
+    Small batches (or workers=1) render in-process, where pool start-up
+    would cost more than it saves.
+    """
+    codes = list(codes)
+    if workers == 1 or len(codes) <= RENDER_CHUNK:
+        for code in codes:
+            yield code, render_png(code)
+        return
+    chunks = [codes[i:i + RENDER_CHUNK] for i in range(0, len(codes), RENDER_CHUNK)]
+    # Spawned, not forked: this runs inside the threaded web server, and a fork can inherit held locks.
+    # Each worker re-runs the main script, which under `python run.py` or gunicorn builds nothing.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for chunk, images in zip(chunks, pool.map(_render_batch, chunks)):
+            yield from zip(chunk, images)
+
+
+def write_zip(fileobj, attendees, workers=None):
+    """Write a ZIP with one `codes/<qr_code>.png` per attendee plus manifest.csv.
+
+    `attendees` are dicts with name, email and qr_code. Codes that are not
+    safe file names are stored under their row number instead. PNGs are
+    stored uncompressed since they are already deflated.
+    """
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(['name', 'email', 'qr_code', 'file'])
+    by_code = {a['qr_code']: a for a in attendees}
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for n, (code, png) in enumerate(render_many(by_code, workers=workers), 1):
+            name = f'codes/{code if SAFE_NAME.fullmatch(code) else f"{n:06d}"}.png'
+            archive.writestr(name, png)
+            writer.writerow([by_code[code]['name'], by_code[code].get('email') or '', code, name])
+        archive.writestr('manifest.csv', manifest.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+    return len(by_code)
+
+
+class QRCache:
+    """Content-addressed QR image cache: an LRU in memory over files on disk.
+
+    Images are keyed by a hash of (format, render settings, code), which
+    doubles as a strong ETag. Each code is rendered once per process at most
+    and once per cache directory in the common case; files are written
+    atomically so concurrent renders of the same code are harmless.
+    """
+
+    def __init__(self, directory, memory_items=2048):
+        self.directory = directory
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0, 'render': 0}
+
+    @staticmethod
+    def key(data, fmt):
+        raw = f'{RENDER_VERSION}:{fmt}:{SCALE}:{BORDER}:{data}'.encode('utf-8')
+        return hashlib.sha256(raw).hexdigest()
+
+    def _path(self, key, fmt):
+        return os.path.join(self.directory, key[:2], f'{key}.{fmt}')
+
+    def _remember(self, key, image):
+        with self._lock:
+            self._memory[key] = image
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, data, fmt='png'):
+        """Return (image_bytes, etag) for `data` rendered as `fmt`."""
+        key = self.key(data, fmt)
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+                self.hits['memory'] += 1
+                return image, key
+        path = self._path(key, fmt)
+        try:
+            with open(path, 'rb') as f:
+                image = f.read()
+            self.hits['disk'] += 1
+        except FileNotFoundError:
+            image = RENDERERS[fmt](data)
+            self.hits['render'] += 1
+            self._write(path, image)
+        self._remember(key, image)
+        return image, key
+
+    def _write(self, path, image):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image)
+            os.replace(tmp, path)
+        except OSError as e:
+            # A read-only or full disk only costs re-rendering
+            print('QR cache write error:', e)
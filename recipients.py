@@ -0,0 +1,82 @@
+import threading
+
+from sqlalchemy import select
+
+from app import db
+from models import EmergencyContact
+
+CHANNELS = ('email', 'sms', 'inapp')
+
+
+class RecipientTable:
+    """Active emergency contacts of one event, split by notification channel."""
+
+    __slots__ = ('email', 'sms', 'inapp')
+
+    def __init__(self, email=(), sms=(), inapp=()):
+        self.email = tuple(email)
+        self.sms = tuple(sms)
+        self.inapp = tuple(inapp)
+
+    def for_channel(self, channel):
+        return getattr(self, channel, ())
+
+
+def build_table(event_id):
+    """Load the routing table with one column-only query (no ORM objects)."""
+    rows = db.session.execute(
+        select(EmergencyContact.email, EmergencyContact.phone, EmergencyContact.preferred_channels, EmergencyContact.name)
+        .where(EmergencyContact.event_id == event_id, EmergencyContact.is_active.is_(True))
+    ).all()
+    routes = {channel: [] for channel in CHANNELS}
+    for email, phone, preferred, name in rows:
+        channels = {c.strip() for c in (preferred or '').split(',') if c.strip()}
+        if 'email' in channels and email:
+            routes['email'].append(email)
+        if 'sms' in channels and phone:
+            routes['sms'].append(phone)
+        if 'inapp' in channels:
+            routes['inapp'].append(name)
+    return RecipientTable(**routes)
+
+
+class RecipientCache:
+    """Process-wide routing table per event, rebuilt after contacts change.
+
+    A generation counter per event keeps a table built from a read that
+    raced with `invalidate` from being cached. With several workers, set
+    `shared` to a cluster.SharedGenerations so `invalidate` reaches them all.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.shared = None
+
+    def get(self, event_id, build=None):
+        if self.shared is not None and self.shared.changed(event_id):
+            self._drop(event_id)
+        with self._lock:
+            table = self._tables.get(event_id)
+            generation = self._generations.get(event_id, 0)
+        if table is not None:
+            return table
+        table = (build or build_table)(event_id)
+        with self._lock:
+            if self._generations.get(event_id, 0) != generation:
+                return table
+            return self._tables.setdefault(event_id, table)
+
+    def invalidate(self, event_id):
+        self._drop(event_id)
+        if self.shared is not None:
+            self.shared.bump(event_id)
+
+    def _drop(self, event_id):
+        with self._lock:
+            self._tables.pop(event_id, None)
+            self._generations[event_id] = self._generations.get(event_id, 0) + 1
+
+
+tables = RecipientCache()
@@ -1,23 +1,41 @@
-from flask import render_template, url_for, flash, redirect, request, jsonify, abort, Response
+from flask import render_template, url_for, flash, redirect, request, jsonify, abort, Response, send_file
 from flask import stream_with_context
 from app import app, db, bcrypt, socketio
 from flask_socketio import join_room, leave_room, emit
 from forms import RegistrationForm, LoginForm, EventForm, IncidentForm, MissingPersonForm, RestrictedAreaForm, MissingMediaForm, EmergencyContactForm, ZoneForm, AttendeeForm, CheckInForm
-from models import User, Event, Incident, MissingPerson, RestrictedArea, BottleneckAlert, MissingPersonMedia, DetectionResult, EmergencyContact, Zone, Attendee, CheckIn, CapacityAlert
+from models import User, Event, Incident, MissingPerson, RestrictedArea, BottleneckAlert, MissingPersonMedia, DetectionResult, DetectionJob, EmergencyContact, Zone, Attendee, CheckIn, CapacityAlert, EvacuationExit, NotificationDelivery
 from flask_login import login_user, current_user, logout_user, login_required
 from datetime import datetime, timedelta
+from sqlalchemy.orm import Session, joinedload
+import csv
+import hmac
 import json
+import math
 import os
 from werkzeug.utils import secure_filename
-import google.generativeai as genai
-from flask_mail import Message
-from twilio.rest import Client
-import base64
-import io
-try:
-    import qrcode
-except Exception:
-    qrcode = None
+import tempfile
+import time
+import evacuation
+import density
+import streams
+import geofence
+import occupancy
+import contact_trace
+import notifications
+import alerts
+import recipients
+import qr
+import attendee_import
+import timeseries
+import sensors
+import forecast
+import gridcodec
+import cluster
+import chat
+import situation
+import feeds
+import detection
+import detection_jobs
 
 # Home route
 @app.route('/')
@@ -115,6 +133,7 @@ def update_event(event_id):
         abort(403)
     form = EventForm()
     if form.validate_on_submit():
+        moved = (event.latitude, event.longitude) != (form.latitude.data, form.longitude.data)
         event.name = form.name.data
         event.objective = form.objective.data
         event.target_audience = form.target_audience.data
@@ -127,6 +146,8 @@ def update_event(event_id):
         event.sponsors = form.sponsors.data
         event.description = form.description.data
         db.session.commit()
+        if moved:
+            _venue_moved(event)
         flash('Your event has been updated!', 'success')
         return redirect(url_for('event', event_id=event.id))
     elif request.method == 'GET':
@@ -143,6 +164,14 @@ def update_event(event_id):
         form.description.data = event.description
     return render_template('create_event.html', title='Update Event', form=form, legend='Update Event')
 
+def _venue_moved(event):
+    # Routing grids, geofence indexes and the density grid are all laid out around the venue
+    evacuation.routers.invalidate(event.id)
+    geofence.indexes.invalidate(event.id)
+    density_engine.move_event(event.id, event.latitude, event.longitude)
+    forecaster.remove(event.id)
+    grid_encoder.remove(event.id)  # the next frame goes out as a keyframe on the new origin
+
 # Delete Event
 @app.route('/event/<int:event_id>/delete', methods=['POST'])
 @login_required
@@ -152,6 +181,12 @@ def delete_event(event_id):
         abort(403)
     db.session.delete(event)
     db.session.commit()
+    evacuation.routers.invalidate(event_id)
+    geofence.indexes.invalidate(event_id)
+    alert_gate.reset(event_id)
+    recipients.tables.invalidate(event_id)
+    sensor_hub.invalidate_zones(event_id)
+    situations.invalidate(event_id)
     flash('Your event has been deleted!', 'success')
     return redirect(url_for('dashboard'))
 
@@ -174,6 +209,8 @@ def new_incident(event_id):
         )
         db.session.add(incident)
         db.session.commit()
+        situations.incident_added(event.id, incident.severity)
+        _refresh_evacuation_hazards(event)
         # Automated alert trigger based on severity
         if incident.severity in ['High', 'Critical']:
             broadcast_incident_alert(incident)
@@ -188,8 +225,9 @@ def event_incidents(event_id):
     event = Event.query.get_or_404(event_id)
     if event.organizer != current_user:
         abort(403)
-    incidents = Incident.query.filter_by(event_id=event.id).order_by(Incident.timestamp.desc()).all()
-    return render_template('event_incidents.html', title='Event Incidents', incidents=incidents, event=event)
+    # First page only; the template pages further back and polls for new rows through the feed API
+    page = feeds.fetch('incidents', event.id)
+    return render_template('event_incidents.html', title='Event Incidents', page=page, event=event)
 
 # View Incident Detail
 @app.route('/incident/<int:incident_id>')
@@ -221,6 +259,7 @@ def report_missing(event_id):
         )
         db.session.add(missing_person)
         db.session.commit()
+        situations.missing_added(event.id)
 
         # Save uploaded reference image if provided
         if form.image.data:
@@ -244,8 +283,8 @@ def event_missing(event_id):
     event = Event.query.get_or_404(event_id)
     if event.organizer != current_user:
         abort(403)
-    missing_persons = MissingPerson.query.filter_by(event_id=event.id).order_by(MissingPerson.timestamp.desc()).all()
-    return render_template('event_missing.html', title='Missing Persons', missing_persons=missing_persons, event=event)
+    page = feeds.fetch('missing', event.id)
+    return render_template('event_missing.html', title='Missing Persons', page=page, event=event)
 
 # View Missing Person Detail, manage media and run detection
 @app.route('/missing/<int:person_id>', methods=['GET', 'POST'])
@@ -283,9 +322,21 @@ def missing_detail(person_id):
 
     media_items = MissingPersonMedia.query.filter_by(missing_person_id=person.id).order_by(MissingPersonMedia.timestamp.desc()).all()
     results = DetectionResult.query.filter_by(missing_person_id=person.id).order_by(DetectionResult.timestamp.desc()).all()
-    return render_template('missing_detail.html', title=f"Missing: {person.name}", person=person, event=event, media_form=media_form, media_items=media_items, results=results)
+    job = DetectionJob.query.filter_by(missing_person_id=person.id).order_by(DetectionJob.id.desc()).first()
+    return render_template('missing_detail.html', title=f"Missing: {person.name}", person=person, event=event, media_form=media_form, media_items=media_items, results=results, job=job)
+
+def _emit_detection(name, payload):
+    socketio.emit(name, payload, room=f"event_{payload['event_id']}")
 
-# Trigger detection on uploaded media (stub)
+# Face and person detection runs in worker processes so it never holds up request handling
+detection_service = detection_jobs.DetectionJobService(
+    detection.DetectionPool(app.config.get('DETECTION_PROCESSES')),
+    lambda *args: socketio.start_background_task(_run_in_app_context, *args),
+    media_root=app.static_folder,
+    notify=_emit_detection
+)
+
+# Queue detection on uploaded media
 @app.route('/missing/<int:person_id>/detect', methods=['POST'])
 @login_required
 def run_detection(person_id):
@@ -293,24 +344,42 @@ def run_detection(person_id):
     event = Event.query.get_or_404(person.event_id)
     if event.organizer != current_user:
         abort(403)
-    media_items = MissingPersonMedia.query.filter_by(missing_person_id=person.id).all()
-    if not media_items:
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    if not MissingPersonMedia.query.filter_by(missing_person_id=person.id).first():
+        if wants_json:
+            return jsonify({'ok': False, 'error': 'No media to analyze'}), 400
         flash('No media to analyze. Please upload images or videos.', 'warning')
         return redirect(url_for('missing_detail', person_id=person.id))
-    # Basic stub: record a pending detection result entry for each media
-    for m in media_items:
-        result = DetectionResult(
-            missing_person_id=person.id,
-            media_id=m.id,
-            result_type='face',
-            confidence=None,
-            details=f"Detection pending for {m.file_path}."
-        )
-        db.session.add(result)
-    db.session.commit()
-    flash('Detection job queued (stub). Results will appear below.', 'info')
+    job, created = detection_service.start(person, current_user.id)
+    if wants_json:
+        return jsonify({'ok': True, 'created': created, 'job': detection_jobs.job_status(job)}), 202
+    if created:
+        flash('Detection job queued. Results will appear below as they are ready.', 'info')
+    else:
+        flash('A detection job for this person is already running.', 'info')
     return redirect(url_for('missing_detail', person_id=person.id))
 
+def _detection_job_or_abort(job_id):
+    job = DetectionJob.query.get_or_404(job_id)
+    event = Event.query.get_or_404(job.event_id)
+    if event.organizer != current_user:
+        abort(403)
+    return job
+
+@app.route('/api/detection/jobs/<int:job_id>')
+@login_required
+def api_detection_job(job_id):
+    job = _detection_job_or_abort(job_id)
+    return jsonify({'ok': True, 'job': detection_jobs.job_status(job)})
+
+@app.route('/api/detection/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def api_cancel_detection_job(job_id):
+    job = _detection_job_or_abort(job_id)
+    if not detection_service.cancel(job):
+        return jsonify({'ok': False, 'error': f'Job already {job.status}', 'job': detection_jobs.job_status(job)}), 409
+    return jsonify({'ok': True, 'job': detection_jobs.job_status(job)})
+
 # Create Restricted Area
 @app.route('/event/<int:event_id>/restricted/new', methods=['GET', 'POST'])
 @login_required
@@ -328,6 +397,8 @@ def new_restricted_area(event_id):
         )
         db.session.add(restricted_area)
         db.session.commit()
+        geofence.indexes.invalidate(event.id)
+        _refresh_evacuation_hazards(event)
         flash('Restricted area has been created!', 'success')
         return redirect(url_for('event', event_id=event.id))
     return render_template('create_restricted_area.html', title='New Restricted Area', form=form, legend='New Restricted Area', event=event)
@@ -339,9 +410,95 @@ def bottleneck_analysis(event_id):
     event = Event.query.get_or_404(event_id)
     if event.organizer != current_user:
         abort(403)
-    alerts = BottleneckAlert.query.filter_by(event_id=event.id).order_by(BottleneckAlert.timestamp.desc()).all()
     contacts = EmergencyContact.query.filter_by(event_id=event.id).order_by(EmergencyContact.timestamp.desc()).all()
-    return render_template('bottleneck_analysis.html', title='Bottleneck Analysis', alerts=alerts, event=event, contacts=contacts)
+    bottleneck_page = feeds.fetch('bottleneck-alerts', event.id, limit=20)
+    capacity_page = feeds.fetch('capacity-alerts', event.id, limit=20)
+    return render_template('bottleneck_analysis.html', title='Bottleneck Analysis', bottleneck_page=bottleneck_page, capacity_page=capacity_page, event=event, contacts=contacts)
+
+@app.route('/api/event/<int:event_id>/feed/<kind>')
+@login_required
+def api_event_feed(event_id, kind):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    if kind not in feeds.FEEDS:
+        abort(404)
+    try:
+        limit = int(request.args.get('limit') or feeds.PAGE_SIZE)
+        page = feeds.fetch(kind, event.id, before=request.args.get('before') or None,
+                           since=request.args.get('since') or None, limit=limit)
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'Invalid cursor or limit'}), 400
+    return jsonify({'ok': True, 'event_id': event.id, **page})
+
+@app.route('/api/event/<int:event_id>/density/series')
+@login_required
+def api_density_series(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    # Either an explicit epoch-second range or the last `minutes`
+    try:
+        end = int(request.args.get('end') or time.time())
+        start = int(request.args.get('start') or end - 60 * int(request.args.get('minutes', 60)))
+        resolution = int(request.args['resolution']) if request.args.get('resolution') else None
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'Invalid start, end, minutes or resolution'}), 400
+    if start > end:
+        return jsonify({'ok': False, 'error': 'start must not be after end'}), 400
+    if resolution and resolution not in timeseries.RESOLUTIONS:
+        return jsonify({'ok': False, 'error': f'resolution must be one of {list(timeseries.RESOLUTIONS)}'}), 400
+    series = [s for s in (request.args.get('series') or '').split(',') if s]
+    resolution, data = density_store.query(event.id, start, end, resolution, series)
+    zone_names = {f'zone:{z.id}': z.name for z in Zone.query.filter_by(event_id=event.id).all()}
+    return jsonify({
+        'ok': True,
+        'event_id': event.id,
+        'start': start,
+        'end': end,
+        'resolution': resolution,
+        'series': [
+            {
+                'key': key,
+                'label': 'Venue' if key == 'venue' else zone_names.get(key, key),
+                'points': [[ts, round(mean, 3), round(lo, 3), round(hi, 3)] for ts, mean, lo, hi in points]
+            } for key, points in sorted(data.items())
+        ]
+    })
+
+@app.route('/api/event/<int:event_id>/density/forecast')
+@login_required
+def api_density_forecast(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    fc = forecaster.forecast(event.id)
+    if fc is None:
+        return jsonify({'ok': True, 'event_id': event.id, 'horizons': []})
+
+    def values(row):
+        return [None if math.isnan(v) else round(v * DENSITY_SCALE, 2) for v in row.tolist()]
+
+    horizons = []
+    for i, minutes in enumerate(fc.minutes):
+        peak = _peak_forecast(event.id, minutes)
+        horizons.append({
+            'minutes': minutes,
+            'peak': None if peak is None else {
+                'lat': peak[0], 'lng': peak[1], 'density': round(peak[2], 2), 'confidence': round(peak[3], 3)
+            },
+            'mean': values(fc.mean[i]),
+            'lower': values(fc.lower[i]),
+            'upper': values(fc.upper[i]),
+            'confidence': [None if math.isnan(v) else round(v, 3) for v in fc.confidence[i].tolist()]
+        })
+    return jsonify({
+        'ok': True,
+        'event_id': event.id,
+        'ts': fc.ts,
+        'grid_size': density_engine.grid_size,
+        'horizons': horizons
+    })
 
 # API endpoint for AI chatbot
 @app.route('/api/chatbot', methods=['POST'])
@@ -352,12 +509,41 @@ def chatbot():
     query = data.get('query')
     zone = data.get('zone')
     
-    # This would be replaced with actual AI processing
-    response = {
-        'answer': f"Analysis for zone {zone}: Currently moderate crowd density observed. Prediction for next 20 minutes: Potential bottleneck forming near the main entrance due to increased arrival rate. Recommend opening additional entry points."
-    }
-
-    return jsonify(response)
+    snapshot = _chat_situation(_event_id_arg(event_id))
+    if snapshot is None:
+        answer = f"Analysis for zone {zone}: no situation data is available for this event."
+    else:
+        answer = f"Analysis for zone {zone}:\n{snapshot.summary()}"
+        if not snapshot.density:
+            answer += "\nNo live density data yet; open the bottleneck dashboard to start the density stream."
+    return jsonify({'answer': answer})
+
+def _chat_model():
+    if app.config.get('CHAT_MODEL', os.getenv('CHAT_MODEL')) == 'fake':
+        return chat.FakeModel()
+    # Use a fast, cost-efficient model for realtime UX
+    return chat.GeminiModel(os.environ.get('GOOGLE_API_KEY'), app.config.get('GEMINI_MODEL', 'gemini-1.5-flash'))
+
+chat_backend = chat.ChatBackend(
+    _chat_model(),
+    cache_ttl=app.config.get('CHAT_CACHE_SECONDS', chat.CACHE_TTL),
+    max_concurrent=app.config.get('CHAT_MAX_CONCURRENT', chat.MAX_CONCURRENT),
+    start_task=socketio.start_background_task
+)
+def _chat_situation(event_id):
+    # Only the organizer's questions get the event's live picture
+    event = db.session.get(Event, event_id) if event_id is not None else None
+    if event is None or event.organizer != current_user:
+        return None
+    return situations.get(event.id)
+
+def _chat_context(event_id, zone):
+    # Prompt context and the snapshot version it was built from
+    context = f"Event ID: {event_id}. Zone: {zone}."
+    snapshot = _chat_situation(event_id)
+    if snapshot is None:
+        return context, 0
+    return context + "\nCurrent situation:\n" + snapshot.summary(), snapshot.version
 
 # Streaming Gemini AI responses over Server-Sent Events (SSE)
 @app.route('/api/chatbot/stream', methods=['GET'])
@@ -366,34 +552,16 @@ def chatbot_stream():
     event_id = request.args.get('event_id')
     query = request.args.get('query')
     zone = request.args.get('zone')
+    context, version = _chat_context(_event_id_arg(event_id), zone)
+    key = (event_id, zone, chat.normalize_query(query), version)
 
     def generate():
-        api_key = os.environ.get('GOOGLE_API_K')
-        if not api_key:
-            yield f"event: error\ndata: {json.dumps({'error': 'GOOGLE_API_KEY not set'})}\n\n"
-            return
-
-        genai.configure(api_key=api_key)
-        # Use a fast, cost‑efficient model for realtime UX
-        model = genai.GenerativeModel("gemini-1.5-flash")
-
-        system_prompt = (
-            "You are CrowdSafe, a concise, helpful assistant for event crowd "
-            "safety. When asked, provide short, actionable guidance. "
-            f"Event ID: {event_id}. Zone: {zone}."
-        )
-        user_prompt = query or ""
-        full_prompt = system_prompt + "\n\nUser question: " + user_prompt
-
         try:
-            # Stream tokens as they arrive
-            for chunk in model.generate_content(full_prompt, stream=True):
-                text = getattr(chunk, 'text', '') or ''
-                if text:
-                    # Send each delta as an SSE message
-                    yield f"data: {json.dumps({'delta': text})}\n\n"
+            # Identical questions share one generation; cached answers replay chunk by chunk
+            for text in chat_backend.stream(key, context, query):
+                yield f"data: {json.dumps({'delta': text})}\n\n"
             yield "event: done\ndata: [DONE]\n\n"
-        except Exception as e:
+        except chat.ChatUnavailable as e:
             yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
 
     resp = Response(stream_with_context(generate()), mimetype='text/event-stream')
@@ -406,64 +574,188 @@ def chatbot_stream():
 # ==========================
 # Real-time Crowd Density IO
 # ==========================
-active_simulations = {}
-
-def _risk_from_intensity(x):
-    if x >= 0.8:
-        return 'Critical'
-    if x >= 0.6:
-        return 'High'
-    if x >= 0.4:
-        return 'Medium'
-    return 'Low'
-
-def simulate_density(event_id):
-    import random
-    import time
-    from models import Event
-    # Ensure DB access happens within app context
+# Stream leases and cache generations, shared by every worker when it points at Redis
+lease_store = cluster.lease_store(app.config.get('STREAM_LEASE_URL'))
+stream_manager = streams.StreamManager()
+# Coalesces repeated bottleneck/capacity alerts per (type, event, zone)
+alert_gate = alerts.AlertGate(window_seconds=app.config.get('ALERT_SUPPRESSION_SECONDS', 300))
+ALERT_LADDERS = {'bottleneck': alerts.DENSITY_LADDER, 'capacity': alerts.CAPACITY_LADDER}
+# Per-event picture for the chatbot, dashboards and capacity API, kept current by deltas
+situations = situation.SituationService(max_age=app.config.get('SITUATION_MAX_AGE_SECONDS', situation.MAX_AGE_SECONDS))
+
+# Per-process caches drop an event's entry once any worker invalidates it
+recipients.tables.shared = cluster.SharedGenerations(lease_store, 'recipients')
+geofence.indexes.shared = cluster.SharedGenerations(lease_store, 'geofence')
+evacuation.routers.shared = cluster.SharedGenerations(lease_store, 'evacuation')
+alert_gate.shared = cluster.SharedGenerations(lease_store, 'alerts')
+situations.shared = cluster.SharedGenerations(lease_store, 'situation')
+
+def _sensor_zones(event_id):
+    # Capacity and a representative point per zone: polygon centroid, else the venue
+    event = db.session.get(Event, event_id)
+    zones = {}
+    for z in Zone.query.filter_by(event_id=event_id).all():
+        coords = geofence.parse_polygon(z.coordinates) if z.coordinates else None
+        lat, lng = coords.mean(axis=0).tolist() if coords is not None else (event.latitude, event.longitude)
+        zones[z.id] = (z.max_capacity, lat, lng)
+    return zones
+
+sensor_hub = sensors.SensorHub(
+    _sensor_zones,
+    rate=app.config.get('SENSOR_MAX_READINGS_PER_SECOND', sensors.MAX_READINGS_PER_SECOND)
+)
+
+density_engine = density.DensityEngine(
+    points_per_event=app.config.get('DENSITY_POINTS_PER_EVENT', 25),
+    tick_seconds=app.config.get('DENSITY_TICK_SECONDS', 2.0),
+    grid_size=app.config.get('DENSITY_GRID_SIZE', 12),
+    live_source=sensor_hub.frames
+)
+# Clients get a keyframe of the quantized grid on join, then only changed cells
+grid_encoder = gridcodec.GridEncoder(binary=app.config.get('DENSITY_GRID_BINARY', True))
+DENSITY_SCALE = 10.0  # people/m² at intensity 1.0
+forecaster = forecast.HoltForecaster(tick_seconds=density_engine.tick_seconds)
+density_store = timeseries.DensitySeriesStore(
+    retention_seconds=app.config.get('DENSITY_RAW_RETENTION_SECONDS', timeseries.RAW_RETENTION_SECONDS)
+)
+
+def _density_readings(frame, hits):
+    # Mean density for the whole venue and for every zone polygon that has points
+    readings = {'venue': float(frame.intensities.mean()) * DENSITY_SCALE} if frame.total else {}
+    if frame.zone_ids is not None:
+        # Sensor frames carry one point per zone
+        for zone_id, value in zip(frame.zone_ids, frame.intensities.tolist()):
+            readings[f'zone:{zone_id}'] = value * DENSITY_SCALE
+        return readings
+    for kind, zone_id, idx in hits:
+        if kind == 'zone':
+            readings[f'zone:{zone_id}'] = float(frame.intensities[idx].mean()) * DENSITY_SCALE
+    return readings
+
+def _event_id_arg(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _peak_forecast(event_id, minutes):
+    # (lat, lng, people/m², confidence) of the hottest grid cell at one horizon
+    fc = forecaster.forecast(event_id)
+    peak = fc.peak(minutes) if fc else None
+    if peak is None:
+        return None
+    cell, mean, confidence = peak
+    lat, lng = density_engine.cell_center(event_id, cell) or (None, None)
+    return lat, lng, mean * DENSITY_SCALE, confidence
+
+def _forecast_summary(event_id):
+    # One line per horizon for the chatbot; None until the event has density data
+    fc = forecaster.forecast(event_id) if event_id is not None else None
+    if fc is None:
+        return None
+    parts = []
+    for minutes in fc.minutes:
+        venue, peak = fc.venue(minutes), fc.peak(minutes)
+        if venue is None:
+            continue
+        parts.append(
+            f"in {minutes} min venue average {venue[0] * DENSITY_SCALE:.1f} people/m², "
+            f"peak {peak[1] * DENSITY_SCALE:.1f} people/m² ({density.RISK_LEVELS[density.risk_codes(peak[1])]} risk, "
+            f"{peak[2]:.0%} confidence)"
+        )
+    return 'Forecast ' + '; '.join(parts) + '.' if parts else None
+
+def _bottleneck_prediction(event_id):
+    peak = _peak_forecast(event_id, 10)
+    if peak is None:
+        return 'Overflow likely within 10 minutes; open additional exits'
+    lat, lng, value, confidence = peak
+    return f'Peak density forecast {value:.1f} people/m² in 10 minutes ({confidence:.0%} confidence); open additional exits'
+
+def _emit_density_frame(frame):
+    event_id = frame.event_id
+    alert = None
+    if frame.cells is not None:
+        forecaster.update(event_id, frame.cells, time.time())
+    decision = alert_gate.observe(('bottleneck', event_id, 'main'), alerts.DENSITY_LADDER, frame.critical_ratio)
+    if decision.notify:
+        alert = {
+            'message': 'Predictive overflow detected near main area. Open additional exits.',
+            'level': decision.level
+        }
+        # Broadcast at the centroid of critical points with their average intensity
+        event = db.session.get(Event, event_id)
+        if event:
+            avg_lat, avg_lng = frame.critical_centroid
+            try:
+                broadcast_bottleneck_alert(event, decision.level, alert['message'], avg_lat, avg_lng, density_level=round(frame.critical_mean * DENSITY_SCALE, 2), prediction=_bottleneck_prediction(event_id), suppressed=decision.suppressed)
+            except Exception as e:
+                print('Broadcast bottleneck error:', e)
+
+    hits = _geofence_index(event_id).classify(frame.lats, frame.lngs)
+    density_store.record(event_id, _density_readings(frame, hits))
+    restricted = geofence.count_hits(hits, frame.total)
+    situations.density_changed(
+        event_id, decision.level,
+        {'critical': frame.critical, 'total': frame.total, 'restricted': restricted},
+        lambda: _forecast_summary(event_id)
+    )
+
+    origin = density_engine.grid_origin(event_id)
+    if stream_coordinator.keyframe_requested(event_id):
+        grid_encoder.remove(event_id)  # re-encoding from scratch broadcasts a keyframe
+    if frame.cells is not None and origin is not None:
+        socketio.emit('density_grid', {
+            'event_id': event_id,
+            'data': grid_encoder.encode(event_id, frame.cells, origin)
+        }, room=f"event_{event_id}")
+
+    socketio.emit('density_update', {
+        'event_id': event_id,
+        'stats': {
+            'critical': frame.critical,
+            'total': frame.total,
+            'restricted': restricted
+        },
+        'alert': alert
+    }, room=f"event_{event_id}")
+
+def _run_in_app_context(fn, *args):
+    # Background tasks touch the DB, so give them an app context
     with app.app_context():
-        event = Event.query.get(event_id)
-        if not event:
-            return
-        # Simple simulation around venue coordinates
-        while active_simulations.get(event_id):
-            points = []
-            for _ in range(25):
-                lat = event.latitude + random.uniform(-0.001, 0.001)
-                lng = event.longitude + random.uniform(-0.001, 0.001)
-                intensity = max(0.0, min(1.0, random.random() * 1.2))
-                risk = _risk_from_intensity(intensity)
-                points.append({'lat': lat, 'lng': lng, 'intensity': intensity, 'risk': risk})
-
-            critical_count = sum(1 for p in points if p['intensity'] >= 0.8)
-            alert = None
-            if critical_count >= 5:
-                alert = {
-                    'message': 'Predictive overflow detected near main area. Open additional exits.',
-                    'level': 'Critical'
-                }
-                # Compute centroid of critical points and average intensity, then broadcast to contacts
-                crit_points = [p for p in points if p['intensity'] >= 0.8]
-                if crit_points:
-                    avg_lat = sum(p['lat'] for p in crit_points) / len(crit_points)
-                    avg_lng = sum(p['lng'] for p in crit_points) / len(crit_points)
-                    avg_intensity = sum(p['intensity'] for p in crit_points) / len(crit_points)
-                    try:
-                        broadcast_bottleneck_alert(event, 'Critical', alert['message'], avg_lat, avg_lng, density_level=round(avg_intensity * 10.0, 2), prediction='Overflow likely within 10 minutes; open additional exits')
-                    except Exception as e:
-                        print('Broadcast bottleneck error:', e)
-
-            socketio.emit('density_update', {
-                'event_id': event_id,
-                'points': points,
-                'stats': {
-                    'critical': critical_count,
-                    'total': len(points)
-                },
-                'alert': alert
-            }, room=f"event_{event_id}")
-            time.sleep(2)
+        fn(*args)
+
+def _start_density_stream(event):
+    # One shared scheduler ticks every active event
+    density_engine.add_event(event.id, event.latitude, event.longitude)
+    density_engine.ensure_running(
+        lambda *args: socketio.start_background_task(_run_in_app_context, *args),
+        _emit_density_frame,
+        socketio.sleep
+    )
+
+def _stop_density_stream(event_id):
+    density_engine.remove_event(event_id)
+    density_store.flush(event_id)
+    forecaster.remove(event_id)
+    grid_encoder.remove(event_id)
+
+def _lead_density_stream(event_id):
+    event = db.session.get(Event, event_id)
+    if event:
+        _start_density_stream(event)
+
+# With several workers, the lease holder runs an event's stream while anyone in the cluster watches it
+stream_coordinator = cluster.StreamCoordinator(
+    lease_store,
+    lambda: stream_manager.stats()['subscribers'],
+    on_lead=_lead_density_stream,
+    on_release=_stop_density_stream,
+    lease_seconds=app.config.get('STREAM_LEASE_SECONDS', cluster.LEASE_SECONDS)
+)
+
+def _publish_subscribers(event_id):
+    stream_coordinator.publish(event_id, stream_manager.subscribers(event_id))
 
 @socketio.on('join_event')
 def on_join_event(data):
@@ -472,10 +764,33 @@ def on_join_event(data):
     except Exception:
         return
     join_room(f"event_{event_id}")
-    # Start simulation if not already running
-    if not active_simulations.get(event_id):
-        active_simulations[event_id] = True
-        socketio.start_background_task(simulate_density, event_id)
+    stream_manager.subscribe(request.sid, event_id)
+    _publish_subscribers(event_id)
+    # First subscriber in the cluster starts the stream; later joins just share it
+    if not density_engine.is_active(event_id):
+        stream_coordinator.claim(event_id)
+    stream_coordinator.ensure_running(
+        lambda *args: socketio.start_background_task(_run_in_app_context, *args),
+        socketio.sleep
+    )
+    _emit_grid_keyframe(event_id)
+
+def _emit_grid_keyframe(event_id):
+    # Deltas only make sense on top of the current grid
+    keyframe = grid_encoder.keyframe(event_id)
+    if keyframe is not None:
+        emit('density_grid', {'event_id': event_id, 'data': keyframe})
+    elif not stream_coordinator.is_leader(event_id):
+        # The stream runs in another worker; it broadcasts a keyframe on its next tick
+        stream_coordinator.request_keyframe(event_id)
+
+@socketio.on('density_resync')
+def on_density_resync(data):
+    # Client saw a sequence gap
+    try:
+        _emit_grid_keyframe(int(data.get('event_id')))
+    except Exception:
+        return
 
 @socketio.on('leave_event')
 def on_leave_event(data):
@@ -484,8 +799,138 @@ def on_leave_event(data):
     except Exception:
         return
     leave_room(f"event_{event_id}")
+    if stream_manager.unsubscribe(request.sid, event_id):
+        _publish_subscribers(event_id)
+        stream_coordinator.release_if_idle(event_id)
+
+@socketio.on('disconnect')
+def on_disconnect():
+    for event_id in stream_manager.disconnect(request.sid):
+        _publish_subscribers(event_id)
+        stream_coordinator.release_if_idle(event_id)
+
+@app.route('/api/streams')
+@login_required
+def api_streams():
+    stats = stream_manager.stats()
+    return jsonify({
+        'worker': stream_coordinator.worker_id,
+        'active_streams': stats['active_streams'],
+        'ticking_events': len(density_engine.active_events()),
+        'leading': sorted(stream_coordinator.leading()),
+        'subscribers': {str(k): v for k, v in stats['subscribers'].items()},
+        'global_subscribers': {str(k): stream_coordinator.subscribers(k) for k in stats['subscribers']},
+        'sensors': {str(k): v for k, v in sensor_hub.stats().items()}
+    })
+
+# Sensor ingestion: camera counters / turnstiles report {"sensor_id", "zone_id", "count", "ts"}
+def _sensor_authorized(event, token=None):
+    # Devices authenticate with SENSOR_INGEST_TOKEN when configured, otherwise as the organizer
+    expected = app.config.get('SENSOR_INGEST_TOKEN')
+    if expected and token and hmac.compare_digest(str(token), expected):
+        return True
+    return current_user.is_authenticated and event.organizer == current_user
+
+@app.route('/api/event/<int:event_id>/sensors/readings', methods=['POST'])
+def ingest_sensor_readings(event_id):
+    event = Event.query.get_or_404(event_id)
+    auth = request.headers.get('Authorization', '')
+    if not _sensor_authorized(event, auth[7:] if auth.startswith('Bearer ') else None):
+        abort(403)
+    if request.content_length and request.content_length > app.config.get('SENSOR_MAX_BODY_BYTES', 4 * 1024 * 1024):
+        return jsonify({'ok': False, 'error': 'Request body too large'}), 413
+    try:
+        readings = sensors.decode_batch(request.get_data(), request.content_type)
+        accepted, errors = sensor_hub.ingest(event.id, readings)
+    except sensors.Backpressure as e:
+        response = jsonify({'ok': False, 'error': str(e), 'retry_after': round(e.retry_after, 2)})
+        response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+        return response, 429
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    return jsonify({'ok': True, 'accepted': accepted, 'rejected': len(errors), 'errors': errors[:50]})
+
+@socketio.on('sensor_readings')
+def on_sensor_readings(data):
+    # {"event_id", "token", "readings": [...]} as JSON, or the same map msgpack-encoded as binary
+    try:
+        if isinstance(data, (bytes, bytearray)):
+            data = sensors.unpack_message(bytes(data))
+        event = db.session.get(Event, int(data.get('event_id')))
+    except Exception:
+        return {'ok': False, 'error': 'Invalid message'}
+    if event is None or not _sensor_authorized(event, data.get('token')):
+        return {'ok': False, 'error': 'Forbidden'}
+    readings = data.get('readings')
+    if not isinstance(readings, list):
+        return {'ok': False, 'error': 'Expected a list of readings'}
+    try:
+        accepted, errors = sensor_hub.ingest(event.id, readings)
+    except sensors.Backpressure as e:
+        return {'ok': False, 'error': str(e), 'retry_after': round(e.retry_after, 2)}
+    except ValueError as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': True, 'accepted': accepted, 'rejected': len(errors), 'errors': errors[:50]}
+
+# Geofencing
+def _geofence_index(event_id):
+    # Polygons are parsed once per event and cached until an area or zone changes
+    return geofence.indexes.get(event_id, lambda: geofence.build_index(
+        RestrictedArea.query.filter_by(event_id=event_id).all(),
+        Zone.query.filter_by(event_id=event_id).all()
+    ))
+
+@app.route('/api/event/<int:event_id>/geofence/classify', methods=['POST'])
+@login_required
+def api_geofence_classify(event_id):
+    event = Event.query.get_or_404(event_id)
+    data = request.get_json() or {}
+    points = data.get('points') or []
+    try:
+        lats = [float(p[0]) for p in points]
+        lngs = [float(p[1]) for p in points]
+    except Exception:
+        return jsonify({'ok': False, 'error': 'points must be [[lat, lng], ...]'}), 400
+    if not all(map(math.isfinite, lats + lngs)):
+        return jsonify({'ok': False, 'error': 'points must be finite numbers'}), 400
+    index = _geofence_index(event.id)
+    results = index.membership(lats, lngs)
+    return jsonify({
+        'ok': True,
+        'event_id': event.id,
+        'results': results,
+        'restricted_count': sum(1 for r in results if r['restricted'])
+    })
 
 # Evacuation Routes
+def _evacuation_hazards(event_id):
+    polygons = [p.coords for p in _geofence_index(event_id).of_kind('restricted')]
+    incidents = [
+        {'latitude': inc.latitude, 'longitude': inc.longitude, 'severity': inc.severity, 'status': inc.status}
+        for inc in Incident.query.filter_by(event_id=event_id).all()
+    ]
+    return polygons, incidents
+
+def _evacuation_router(event):
+    def build():
+        stored = EvacuationExit.query.filter_by(event_id=event.id, is_active=True).all()
+        exits = evacuation.exits_for_event(event, stored)
+        polygons, incidents = _evacuation_hazards(event.id)
+        grid = evacuation.grid_for_event(event, exits, polygons, incidents)
+        return evacuation.EvacuationRouter(grid, exits, polygons, incidents)
+    return evacuation.routers.get(event.id, build)
+
+def _refresh_evacuation_hazards(event):
+    # Only repair fields that are already built; otherwise the next lookup builds fresh
+    router = evacuation.routers.peek(event.id)
+    if router is None:
+        return
+    try:
+        router.update_hazards(*_evacuation_hazards(event.id))
+    except Exception as e:
+        print('Evacuation field update error:', e)
+        evacuation.routers.invalidate(event.id)
+
 @app.route('/event/<int:event_id>/evacuation')
 @login_required
 def evacuation_routes(event_id):
@@ -514,47 +959,128 @@ def evacuation_routes(event_id):
             'coordinates': ra.coordinates
         } for ra in restricted_areas
     ]
+    exits_data = evacuation.exits_for_event(event, EvacuationExit.query.filter_by(event_id=event.id, is_active=True).all())
     return render_template(
         'evacuation_routes.html',
         title='Evacuation Routes',
         event=event,
         incidents=incidents_data,
-        restricted_areas=restricted_areas_data
+        restricted_areas=restricted_areas_data,
+        exits=exits_data
     )
 
+@app.route('/api/event/<int:event_id>/exits', methods=['GET', 'POST'])
+@login_required
+def api_event_exits(event_id):
+    event = Event.query.get_or_404(event_id)
+    if request.method == 'POST':
+        if event.organizer != current_user:
+            abort(403)
+        data = request.get_json() or {}
+        try:
+            latitude = float(data.get('latitude'))
+            longitude = float(data.get('longitude'))
+        except Exception:
+            return jsonify({'ok': False, 'error': 'latitude and longitude required'}), 400
+        name = (data.get('name') or 'Exit').strip()[:100]
+        exit_rec = EvacuationExit(name=name, latitude=latitude, longitude=longitude, event_id=event.id)
+        db.session.add(exit_rec)
+        db.session.commit()
+        # Exits change the field set itself, so rebuild on next lookup
+        evacuation.routers.invalidate(event.id)
+    stored = EvacuationExit.query.filter_by(event_id=event.id, is_active=True).all()
+    return jsonify({'ok': True, 'event_id': event.id, 'exits': evacuation.exits_for_event(event, stored)})
+
+@app.route('/api/event/<int:event_id>/evacuation/route')
+@login_required
+def api_evacuation_route(event_id):
+    event = Event.query.get_or_404(event_id)
+    try:
+        lat = float(request.args.get('lat', event.latitude))
+        lng = float(request.args.get('lng', event.longitude))
+    except Exception:
+        return jsonify({'ok': False, 'error': 'Invalid parameters'}), 400
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        return jsonify({'ok': False, 'error': 'Invalid parameters'}), 400
+    route = _evacuation_router(event).route(lat, lng)
+    if not route:
+        return jsonify({'ok': False, 'error': 'No reachable exit'}), 404
+    return jsonify({'ok': True, 'event_id': event.id, **route})
+
+@app.route('/api/event/<int:event_id>/evacuation/routes', methods=['POST'])
+@login_required
+def api_evacuation_routes_batch(event_id):
+    event = Event.query.get_or_404(event_id)
+    data = request.get_json() or {}
+    points = data.get('points') or []
+    try:
+        lats = [float(p[0]) for p in points]
+        lngs = [float(p[1]) for p in points]
+    except Exception:
+        return jsonify({'ok': False, 'error': 'points must be [[lat, lng], ...]'}), 400
+    if not all(map(math.isfinite, lats + lngs)):
+        return jsonify({'ok': False, 'error': 'points must be finite numbers'}), 400
+    routes = _evacuation_router(event).route_many(lats, lngs)
+    return jsonify({'ok': True, 'event_id': event.id, 'routes': routes})
+
 # ==========================
 # Emergency Contacts & Alerts
 # ==========================
 
-def _send_email(subject, recipients, body):
-    if not app.config.get('MAIL_SERVER'):
-        print('[Email disabled] Would send email:', subject, recipients, body)
-        return
-    try:
-        msg = Message(subject=subject, recipients=recipients, body=body, sender=app.config.get('MAIL_DEFAULT_SENDER'))
+def _record_deliveries(job, status, error, recipients):
+    # Own session: dropped jobs are recorded on the submitting request's thread,
+    # whose pending work must not be committed or rolled back from here
+    now = datetime.utcnow()
+    with Session(db.engine) as session:
+        session.add_all([
+            NotificationDelivery(
+                event_id=job.event_id,
+                channel=job.channel,
+                recipient=r,
+                subject=(job.subject or '')[:200],
+                status=status,
+                attempts=job.attempts,
+                error=error,
+                created_at=job.queued_at,
+                updated_at=now
+            ) for r in recipients
+        ])
+        session.commit()
+
+def _notification_transports():
+    transports = {}
+    if app.config.get('MAIL_SERVER'):
         from app import mail
-        mail.send(msg)
-    except Exception as e:
-        print('Email error:', e)
-
-def _send_sms(recipients, body):
+        transports['email'] = notifications.SMTPTransport(mail, app.config.get('MAIL_DEFAULT_SENDER'))
+    else:
+        transports['email'] = notifications.LocalTransport('Email')
     sid = os.getenv('TWILIO_ACCOUNT_SID')
     token = os.getenv('TWILIO_AUTH_TOKEN')
     from_number = os.getenv('TWILIO_FROM_NUMBER')
-    if not (sid and token and from_number):
-        print('[SMS disabled] Would send SMS to:', recipients, body)
-        return
-    try:
-        client = Client(sid, token)
-        for r in recipients:
-            if r:
-                client.messages.create(to=r, from_=from_number, body=body)
-    except Exception as e:
-        print('SMS error:', e)
+    if sid and token and from_number:
+        transports['sms'] = notifications.TwilioTransport(sid, token, from_number)
+    else:
+        transports['sms'] = notifications.LocalTransport('SMS')
+    return transports
+
+notifier = notifications.NotificationDispatcher(
+    _notification_transports(),
+    workers=app.config.get('NOTIFY_WORKERS', 4),
+    queue_size=app.config.get('NOTIFY_QUEUE_SIZE', 1000),
+    recorder=_record_deliveries,
+    wrap=_run_in_app_context
+)
+
+def _send_email(subject, recipients, body, event_id=None):
+    # Queued; a notifier worker delivers it over a pooled SMTP connection
+    notifier.submit('email', subject, recipients, body, event_id=event_id)
+
+def _send_sms(recipients, body, event_id=None):
+    notifier.submit('sms', None, recipients, body, event_id=event_id)
 
 def broadcast_incident_alert(incident: Incident):
     event = incident.event
-    contacts = EmergencyContact.query.filter_by(event_id=event.id, is_active=True).all()
+    routing = recipients.tables.get(event.id)
     # Prepare message
     subject = f"[CrowdSafe] {incident.severity} Incident: {incident.incident_type}"
     body = (
@@ -564,9 +1090,6 @@ def broadcast_incident_alert(incident: Incident):
         f"Description: {incident.description}\n"
         f"Event: {event.name}"
     )
-    # Collect recipients by channel
-    email_recipients = [c.email for c in contacts if c and c.email and ('email' in c.channels())]
-    sms_recipients = [c.phone for c in contacts if c and c.phone and ('sms' in c.channels())]
     # In-app notifications via Socket.IO
     socketio.emit('alert_broadcast', {
         'event_id': event.id,
@@ -578,18 +1101,21 @@ def broadcast_incident_alert(incident: Incident):
         'timestamp': incident.timestamp.isoformat()
     }, room=f"event_{event.id}")
     # Email and SMS
-    _send_email(subject, email_recipients, body)
-    _send_sms(sms_recipients, body)
+    _send_email(subject, routing.email, body, event_id=event.id)
+    _send_sms(routing.sms, body, event_id=event.id)
+
+def _suppressed_note(suppressed):
+    return f"\n({suppressed} repeat alert(s) suppressed since the previous notice)" if suppressed else ''
 
-def broadcast_bottleneck_alert(event: Event, risk_level: str, message: str, latitude: float, longitude: float, density_level: float = None, prediction: str = None):
-    contacts = EmergencyContact.query.filter_by(event_id=event.id, is_active=True).all()
+def broadcast_bottleneck_alert(event: Event, risk_level: str, message: str, latitude: float, longitude: float, density_level: float = None, prediction: str = None, suppressed: int = 0):
+    routing = recipients.tables.get(event.id)
     subject = f"[CrowdSafe] {risk_level} Bottleneck Alert"
     body = (
         f"Risk Level: {risk_level}\n"
         f"Location: ({latitude:.6f}, {longitude:.6f})\n"
         f"Details: {message}\n"
         f"Event: {event.name}"
-    )
+    ) + _suppressed_note(suppressed)
     try:
         alert = BottleneckAlert(
             location_description='Predicted Overflow Area',
@@ -598,10 +1124,12 @@ def broadcast_bottleneck_alert(event: Event, risk_level: str, message: str, lati
             density_level=density_level or 0.0,
             risk_level=risk_level,
             prediction=prediction,
+            suppressed_count=suppressed,
             event_id=event.id
         )
         db.session.add(alert)
         db.session.commit()
+        situations.alert_added(event.id, situation.bottleneck_alert(risk_level, alert.density_level, prediction, alert.timestamp))
     except Exception as e:
         print('Persist bottleneck alert error:', e)
 
@@ -614,20 +1142,18 @@ def broadcast_bottleneck_alert(event: Event, risk_level: str, message: str, lati
         'timestamp': datetime.utcnow().isoformat()
     }, room=f"event_{event.id}")
 
-    email_recipients = [c.email for c in contacts if c and c.email and ('email' in c.channels())]
-    sms_recipients = [c.phone for c in contacts if c and c.phone and ('sms' in c.channels())]
-    _send_email(subject, email_recipients, body)
-    _send_sms(sms_recipients, body)
+    _send_email(subject, routing.email, body, event_id=event.id)
+    _send_sms(routing.sms, body, event_id=event.id)
 
-def broadcast_capacity_alert(event: Event, zone: Zone, alert_type: str, message: str = None):
-    contacts = EmergencyContact.query.filter_by(event_id=event.id, is_active=True).all()
+def broadcast_capacity_alert(event: Event, zone: Zone, alert_type: str, message: str = None, suppressed: int = 0):
+    routing = recipients.tables.get(event.id)
     subject = f"[CrowdSafe] {alert_type.capitalize()} Capacity Alert - {zone.name}"
     body = (
         f"Zone: {zone.name}\n"
         f"Capacity: {zone.current_capacity}/{zone.max_capacity} ({zone.capacity_percentage:.1f}%)\n"
         f"Event: {event.name}\n"
         f"Details: {message or ''}"
-    )
+    ) + _suppressed_note(suppressed)
 
     # Persist alert
     try:
@@ -638,10 +1164,12 @@ def broadcast_capacity_alert(event: Event, zone: Zone, alert_type: str, message:
             current_count=zone.current_capacity,
             max_capacity=zone.max_capacity,
             message=message or '',
+            suppressed_count=suppressed,
             event_id=event.id
         )
         db.session.add(alert)
         db.session.commit()
+        situations.alert_added(event.id, situation.capacity_alert(alert_type, zone.name, alert.capacity_percentage, alert.timestamp))
     except Exception as e:
         print('Persist capacity alert error:', e)
 
@@ -656,10 +1184,47 @@ def broadcast_capacity_alert(event: Event, zone: Zone, alert_type: str, message:
         'timestamp': datetime.utcnow().isoformat()
     }, room=f"event_{event.id}")
 
-    email_recipients = [c.email for c in contacts if c and c.email and ('email' in c.channels())]
-    sms_recipients = [c.phone for c in contacts if c and c.phone and ('sms' in c.channels())]
-    _send_email(subject, email_recipients, body)
-    _send_sms(sms_recipients, body)
+    _send_email(subject, routing.email, body, event_id=event.id)
+    _send_sms(routing.sms, body, event_id=event.id)
+
+@app.route('/api/event/<int:event_id>/notifications')
+@login_required
+def api_notification_status(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    deliveries = (NotificationDelivery.query.filter_by(event_id=event.id)
+                  .order_by(NotificationDelivery.created_at.desc()).limit(200).all())
+    return jsonify({
+        'ok': True,
+        'event_id': event.id,
+        'queued': notifier.queue.qsize(),
+        'deliveries': [
+            {
+                'channel': d.channel,
+                'recipient': d.recipient,
+                'subject': d.subject,
+                'status': d.status,
+                'attempts': d.attempts,
+                'error': d.error,
+                'created_at': d.created_at.isoformat(),
+                'updated_at': d.updated_at.isoformat()
+            } for d in deliveries
+        ]
+    })
+
+@app.route('/api/event/<int:event_id>/alerts/state')
+@login_required
+def api_alert_state(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    return jsonify({
+        'ok': True,
+        'event_id': event.id,
+        'window_seconds': alert_gate.window,
+        'alerts': alert_gate.snapshot(event.id, ALERT_LADDERS)
+    })
 
 # Manual notify to emergency contacts from Bottleneck Analysis UI
 @app.route('/event/<int:event_id>/bottleneck/notify', methods=['POST'])
@@ -697,17 +1262,37 @@ def notify_bottleneck_contacts(event_id):
     except Exception as e:
         return jsonify({'ok': False, 'error': str(e)}), 500
 
-def _qr_png_base64(data: str) -> str:
-    if not qrcode:
-        return ''
-    try:
-        img = qrcode.make(data)
-        buf = io.BytesIO()
-        img.save(buf, format='PNG')
-        return base64.b64encode(buf.getvalue()).decode('utf-8')
-    except Exception as e:
-        print('QR generation error:', e)
-        return ''
+qr_cache = qr.QRCache(
+    app.config.get('QR_CACHE_DIR') or os.path.join(app.instance_path, 'qr_cache'),
+    memory_items=app.config.get('QR_CACHE_MEMORY_ITEMS', 2048)
+)
+QR_MAX_AGE = 365 * 24 * 3600  # images are content-addressed, so they never change under a URL's ETag
+
+@app.route('/event/<int:event_id>/attendees/<int:attendee_id>/qr.<fmt>')
+@login_required
+def attendee_qr(event_id, attendee_id, fmt):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    if fmt not in qr.MIME_TYPES or not qr.qrcode:
+        abort(404)
+    code = db.session.scalar(
+        db.select(Attendee.qr_code).where(Attendee.id == attendee_id, Attendee.event_id == event.id)
+    )
+    if code is None:
+        abort(404)
+    etag = qr.QRCache.key(code, fmt)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        image, etag = qr_cache.get(code, fmt)
+        response = Response(image, mimetype=qr.MIME_TYPES[fmt])
+    response.set_etag(etag)
+    # Private: the endpoint sits behind login, so shared caches must not keep it
+    response.cache_control.private = True
+    response.cache_control.max_age = QR_MAX_AGE
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/event/<int:event_id>/checkin', methods=['GET', 'POST'])
 @login_required
@@ -719,7 +1304,10 @@ def checkin_dashboard(event_id):
     attendee_form = AttendeeForm()
     checkin_form = CheckInForm()
     zones = Zone.query.filter_by(event_id=event.id).all()
-    attendees = Attendee.query.filter_by(event_id=event.id).order_by(Attendee.registration_time.desc()).limit(20).all()
+    # Presence is a column on the attendee row, so the list renders with one joined query
+    attendees = (Attendee.query.filter_by(event_id=event.id)
+                 .options(joinedload(Attendee.current_zone))
+                 .order_by(Attendee.registration_time.desc()).limit(20).all())
     qr_image = None
     if request.method == 'POST' and attendee_form.validate_on_submit():
         import uuid
@@ -733,11 +1321,38 @@ def checkin_dashboard(event_id):
         )
         db.session.add(attendee)
         db.session.commit()
-        b64 = _qr_png_base64(qr_code)
-        qr_image = f"data:image/png;base64,{b64}" if b64 else None
+        qr_image = url_for('attendee_qr', event_id=event.id, attendee_id=attendee.id, fmt='png') if qr.qrcode else None
         flash('Attendee registered and QR generated.', 'success')
     return render_template('checkin_dashboard.html', title='Check-In & Capacity', event=event, zones=zones, attendees=attendees, zone_form=zone_form, attendee_form=attendee_form, checkin_form=checkin_form, qr_image=qr_image)
 
+@app.route('/event/<int:event_id>/attendees/import', methods=['POST'])
+@login_required
+def import_attendees(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    # Multipart upload from the dashboard, or the raw CSV/JSONL request body
+    upload = request.files.get('file')
+    if upload:
+        stream, filename, content_type = upload.stream, upload.filename, upload.mimetype
+    else:
+        stream, filename, content_type = request.stream, None, request.mimetype
+    fmt = request.args.get('format') or attendee_import.detect_format(filename, content_type)
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'ok': False, 'error': 'format must be csv or jsonl'}), 400
+    try:
+        result = attendee_import.import_attendees(event.id, stream, fmt)
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        return jsonify({'ok': False, 'error': f'Unreadable file: {e}'}), 400
+    if request.args.get('output') == 'zip' or request.form.get('output') == 'zip':
+        archive = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+        qr.write_zip(archive, result.attendees, workers=app.config.get('QR_RENDER_WORKERS'))
+        archive.seek(0)
+        return send_file(archive, mimetype='application/zip', as_attachment=True,
+                         download_name=f'event_{event.id}_qr_codes.zip')
+    return jsonify({'ok': True, **result.summary()})
+
 @app.route('/event/<int:event_id>/zones/new', methods=['POST'])
 @login_required
 def create_zone(event_id):
@@ -755,11 +1370,35 @@ def create_zone(event_id):
         )
         db.session.add(zone)
         db.session.commit()
+        geofence.indexes.invalidate(event.id)
+        sensor_hub.invalidate_zones(event.id)
+        situations.zone_changed(event.id, zone.id, zone.name, zone.current_capacity, zone.max_capacity)
         flash('Zone created.', 'success')
     else:
         flash('Invalid zone data.', 'danger')
     return redirect(url_for('checkin_dashboard', event_id=event.id))
 
+def _emit_capacity_update(event, zone):
+    situations.zone_changed(event.id, zone.id, zone.name, zone.current_capacity, zone.max_capacity)
+    socketio.emit('capacity_update', {
+        'event_id': event.id,
+        'zone_id': zone.id,
+        'current_capacity': zone.current_capacity,
+        'max_capacity': zone.max_capacity,
+        'capacity_percentage': zone.capacity_percentage
+    }, room=f"event_{event.id}")
+
+CAPACITY_ALERT_MESSAGES = {
+    'over_capacity': 'Zone is over capacity. Immediate action required.',
+    'warning': 'Zone is approaching capacity. Consider mitigation.',
+}
+
+def _check_capacity_alert(event, zone):
+    # Called on every occupancy change (in and out) so hysteresis can clear the zone
+    decision = alert_gate.observe(('capacity', event.id, zone.id), alerts.CAPACITY_LADDER, zone.capacity_percentage)
+    if decision.notify:
+        broadcast_capacity_alert(event, zone, decision.level, CAPACITY_ALERT_MESSAGES[decision.level], suppressed=decision.suppressed)
+
 @app.route('/event/<int:event_id>/scan', methods=['POST'])
 @login_required
 def scan_checkin(event_id):
@@ -780,19 +1419,11 @@ def scan_checkin(event_id):
         return jsonify({'ok': False, 'error': 'Attendee already checked in'}), 400
     checkin = CheckIn(attendee_id=attendee.id, zone_id=zone.id, event_id=event.id)
     db.session.add(checkin)
-    zone.current_capacity = (zone.current_capacity or 0) + 1
+    attendee.current_zone_id = zone.id
+    occupancy.apply_delta(zone.id, 1)
     db.session.commit()
-    socketio.emit('capacity_update', {
-        'event_id': event.id,
-        'zone_id': zone.id,
-        'current_capacity': zone.current_capacity,
-        'max_capacity': zone.max_capacity,
-        'capacity_percentage': zone.capacity_percentage
-    }, room=f"event_{event.id}")
-    if zone.is_over_capacity:
-        broadcast_capacity_alert(event, zone, 'over_capacity', 'Zone is over capacity. Immediate action required.')
-    elif zone.is_near_capacity:
-        broadcast_capacity_alert(event, zone, 'warning', 'Zone is approaching capacity. Consider mitigation.')
+    _emit_capacity_update(event, zone)
+    _check_capacity_alert(event, zone)
     return jsonify({'ok': True, 'attendee_id': attendee.id, 'zone_id': zone.id})
 
 @app.route('/event/<int:event_id>/checkout', methods=['POST'])
@@ -812,71 +1443,221 @@ def scan_checkout(event_id):
     if not active:
         return jsonify({'ok': False, 'error': 'Attendee not checked in'}), 400
     active.check_out_time = datetime.utcnow()
+    attendee.current_zone_id = None
     zone = Zone.query.get(active.zone_id)
-    zone.current_capacity = max(0, (zone.current_capacity or 0) - 1)
+    occupancy.apply_delta(zone.id, -1)
     db.session.commit()
-    socketio.emit('capacity_update', {
-        'event_id': event.id,
-        'zone_id': zone.id,
-        'current_capacity': zone.current_capacity,
-        'max_capacity': zone.max_capacity,
-        'capacity_percentage': zone.capacity_percentage
-    }, room=f"event_{event.id}")
+    _emit_capacity_update(event, zone)
+    _check_capacity_alert(event, zone)
     return jsonify({'ok': True, 'attendee_id': attendee.id, 'zone_id': zone.id})
 
+SCAN_BATCH_MAX = 5000
+SQL_IN_CHUNK = 500
+
+def _chunks(items, size=SQL_IN_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _op_field(op, key, default=''):
+    # Scanners may send numbers; anything else that is not a string fails the lookups per operation
+    value = op.get(key)
+    return str(value).strip() if value not in (None, '') else default
+
+@app.route('/event/<int:event_id>/scan/batch', methods=['POST'])
+@login_required
+def scan_batch(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    data = request.get_json() or {}
+    ops = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'ok': False, 'error': 'operations must be a non-empty list'}), 400
+    if len(ops) > SCAN_BATCH_MAX:
+        return jsonify({'ok': False, 'error': f'At most {SCAN_BATCH_MAX} operations per batch'}), 413
+
+    # Resolve every attendee, zone and open check-in up front with set-based queries
+    codes = list({_op_field(op, 'qr_code') for op in ops if isinstance(op, dict)} - {''})
+    attendees = {}
+    for chunk in _chunks(codes):
+        for a in Attendee.query.filter(Attendee.event_id == event.id, Attendee.qr_code.in_(chunk)).all():
+            attendees[a.qr_code] = a
+    zones = {z.id: z for z in Zone.query.filter_by(event_id=event.id).all()}
+    open_checkins = {}
+    attendee_ids = [a.id for a in attendees.values()]
+    for chunk in _chunks(attendee_ids):
+        for ci in CheckIn.query.filter(CheckIn.event_id == event.id, CheckIn.attendee_id.in_(chunk), CheckIn.check_out_time.is_(None)).all():
+            open_checkins[ci.attendee_id] = ci
+
+    now = datetime.utcnow()
+    deltas = {}
+    results = []
+    for op in ops:
+        if not isinstance(op, dict):
+            results.append({'ok': False, 'error': 'Invalid operation'})
+            continue
+        kind = _op_field(op, 'op', 'checkin').lower()
+        attendee = attendees.get(_op_field(op, 'qr_code'))
+        if kind not in ('checkin', 'checkout'):
+            results.append({'ok': False, 'error': 'op must be checkin or checkout'})
+        elif not attendee:
+            results.append({'ok': False, 'error': 'Invalid attendee'})
+        elif kind == 'checkin':
+            try:
+                zone = zones.get(int(op.get('zone_id')))
+            except Exception:
+                zone = None
+            if not zone:
+                results.append({'ok': False, 'error': 'Invalid zone', 'attendee_id': attendee.id})
+            elif attendee.id in open_checkins:
+                results.append({'ok': False, 'error': 'Attendee already checked in', 'attendee_id': attendee.id})
+            else:
+                checkin = CheckIn(attendee_id=attendee.id, zone_id=zone.id, event_id=event.id, check_in_time=now)
+                db.session.add(checkin)
+                open_checkins[attendee.id] = checkin
+                attendee.current_zone_id = zone.id
+                deltas[zone.id] = deltas.get(zone.id, 0) + 1
+                results.append({'ok': True, 'op': 'checkin', 'attendee_id': attendee.id, 'zone_id': zone.id})
+        else:
+            active = open_checkins.pop(attendee.id, None)
+            if not active:
+                results.append({'ok': False, 'error': 'Attendee not checked in', 'attendee_id': attendee.id})
+            else:
+                active.check_out_time = now
+                attendee.current_zone_id = None
+                deltas[active.zone_id] = deltas.get(active.zone_id, 0) - 1
+                results.append({'ok': True, 'op': 'checkout', 'attendee_id': attendee.id, 'zone_id': active.zone_id})
+
+    occupancy.apply_deltas(deltas)
+    db.session.commit()
+
+    # One aggregated update (and at most one alert check) per affected zone
+    for zone_id, delta in deltas.items():
+        zone = zones[zone_id]
+        _emit_capacity_update(event, zone)
+        _check_capacity_alert(event, zone)
+    applied = sum(1 for r in results if r['ok'])
+    return jsonify({'ok': True, 'applied': applied, 'failed': len(results) - applied, 'results': results})
+
 @app.route('/api/event/<int:event_id>/capacity')
 @login_required
 def api_event_capacity(event_id):
     event = Event.query.get_or_404(event_id)
     if event.organizer != current_user:
         abort(403)
-    zones = Zone.query.filter_by(event_id=event.id).all()
+    snapshot = situations.get(event.id)
+    return jsonify({
+        'event_id': event.id,
+        'version': snapshot.version,
+        'zones': snapshot.to_dict()['zones']
+    })
+
+@app.route('/api/event/<int:event_id>/situation')
+@login_required
+def api_event_situation(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    try:
+        since = int(request.args['since']) if request.args.get('since') else None
+    except ValueError:
+        return jsonify({'ok': False, 'error': 'since must be a version number'}), 400
+    # Pollers pass the version they hold and get only the sections changed after it
+    return jsonify({'ok': True, **situations.get(event.id).to_dict(since)})
+
+@app.route('/api/event/<int:event_id>/attendees')
+@login_required
+def api_event_attendees(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    try:
+        limit = min(max(int(request.args.get('limit') or 100), 1), 1000)
+        offset = max(int(request.args.get('offset') or 0), 0)
+    except Exception:
+        return jsonify({'ok': False, 'error': 'Invalid parameters'}), 400
+    query = Attendee.query.filter_by(event_id=event.id)
+    if request.args.get('checked_in') == '1':
+        query = query.filter(Attendee.current_zone_id.isnot(None))
+    attendees = (query.options(joinedload(Attendee.current_zone))
+                 .order_by(Attendee.registration_time.desc())
+                 .offset(offset).limit(limit).all())
     return jsonify({
+        'ok': True,
         'event_id': event.id,
-        'zones': [
+        'attendees': [
             {
-                'id': z.id,
-                'name': z.name,
-                'current_capacity': z.current_capacity,
-                'max_capacity': z.max_capacity,
-                'capacity_percentage': z.capacity_percentage
-            } for z in zones
+                'id': a.id,
+                'name': a.name,
+                'email': a.email,
+                'phone': a.phone,
+                'is_checked_in': a.is_checked_in,
+                'current_zone_id': a.current_zone_id,
+                'current_zone': a.current_zone.name if a.current_zone else None
+            } for a in attendees
         ]
     })
 
-@app.route('/api/event/<int:event_id>/contact_trace')
+@app.route('/api/event/<int:event_id>/capacity/reconcile', methods=['POST'])
 @login_required
-def api_contact_trace(event_id):
+def api_reconcile_capacity(event_id):
     event = Event.query.get_or_404(event_id)
     if event.organizer != current_user:
         abort(403)
+    drift = occupancy.reconcile(event.id)
+    situations.invalidate(event.id)
+    return jsonify({
+        'ok': True,
+        'event_id': event.id,
+        'corrected': [{'zone_id': zid, 'was': old, 'now': new} for zid, (old, new) in drift.items()]
+    })
+
+def _contact_trace_query(event):
+    """Parse trace parameters into (statement, params, start, end) or raise ValueError."""
     try:
         zone_id = int(request.args.get('zone_id')) if request.args.get('zone_id') else None
+        attendee_id = int(request.args.get('attendee_id')) if request.args.get('attendee_id') else None
         minutes = int(request.args.get('minutes') or 60)
+        end = contact_trace.parse_time(request.args['end']) if request.args.get('end') else datetime.utcnow()
+        start = contact_trace.parse_time(request.args['start']) if request.args.get('start') else end - timedelta(minutes=minutes)
     except Exception:
-        return jsonify({'ok': False, 'error': 'Invalid parameters'}), 400
-    if not zone_id:
-        return jsonify({'ok': False, 'error': 'zone_id required'}), 400
-    cutoff = datetime.utcnow() - timedelta(minutes=minutes)
-    from datetime import timezone as _tz
-    # Attendees currently in zone or were within timeframe
-    checkins = CheckIn.query.filter(
-        CheckIn.event_id == event.id,
-        CheckIn.zone_id == zone_id,
-        CheckIn.check_in_time >= cutoff
-    ).all()
-    results = []
-    for ci in checkins:
-        att = Attendee.query.get(ci.attendee_id)
-        results.append({
-            'attendee_id': att.id,
-            'name': att.name,
-            'email': att.email,
-            'phone': att.phone,
-            'check_in_time': ci.check_in_time.isoformat(),
-            'check_out_time': ci.check_out_time.isoformat() if ci.check_out_time else None
-        })
-    return jsonify({'ok': True, 'zone_id': zone_id, 'minutes': minutes, 'attendees': results})
+        raise ValueError('Invalid parameters')
+    if attendee_id:
+        stmt = contact_trace.shared_contacts_query(event.id, attendee_id, start, end, zone_id=zone_id)
+    elif zone_id:
+        stmt = contact_trace.zone_presence_query(event.id, zone_id, start, end)
+    else:
+        raise ValueError('zone_id or attendee_id required')
+    params = {'zone_id': zone_id, 'attendee_id': attendee_id, 'minutes': minutes, 'start': start.isoformat(), 'end': end.isoformat()}
+    return stmt, params, start, end
+
+@app.route('/api/event/<int:event_id>/contact_trace')
+@login_required
+def api_contact_trace(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    try:
+        stmt, params, start, end = _contact_trace_query(event)
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    # Everyone present at any point of the window, not just those who arrived during it
+    results = list(contact_trace.iter_results(stmt, start, end))
+    return jsonify({'ok': True, **params, 'attendees': results})
+
+@app.route('/api/event/<int:event_id>/contact_trace/stream')
+@login_required
+def api_contact_trace_stream(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    try:
+        stmt, params, start, end = _contact_trace_query(event)
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    # JSON lines so large traces stream instead of building one response body
+    return Response(stream_with_context(contact_trace.iter_json_lines(stmt, start, end)), mimetype='application/x-ndjson')
+
 @app.route('/event/<int:event_id>/contacts', methods=['GET', 'POST'])
 @login_required
 def event_contacts(event_id):
@@ -896,6 +1677,7 @@ def event_contacts(event_id):
         )
         db.session.add(contact)
         db.session.commit()
+        recipients.tables.invalidate(event.id)
         flash('Emergency contact added.', 'success')
         return redirect(url_for('event_contacts', event_id=event.id))
     contacts = EmergencyContact.query.filter_by(event_id=event.id).order_by(EmergencyContact.timestamp.desc()).all()
@@ -912,6 +1694,7 @@ def toggle_contact(event_id, contact_id):
         abort(403)
     contact.is_active = not contact.is_active
     db.session.commit()
+    recipients.tables.invalidate(event.id)
     flash('Contact status updated.', 'info')
     return redirect(url_for('event_contacts', event_id=event.id))
 
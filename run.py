@@ -0,0 +1,20 @@
+import os
+
+
+def main():
+    # Imported here, not at module level: spawned detection and QR workers re-run the
+    # main script, and from this one they get nothing but the module they are sent
+    from app import app, db, socketio
+    import schema
+
+    with app.app_context():
+        db.create_all()
+        schema.upgrade()
+        # Ensure upload folder exists
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Run with SocketIO to enable WebSocket transport
+    socketio.run(app, debug=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import random
+import sys
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import create_engine, insert, inspect, select
+from sqlalchemy.schema import CreateColumn
+
+from app import app, db
+from models import Incident, BottleneckAlert, CapacityAlert, MissingPerson, EmergencyContact, Zone, Attendee, CheckIn
+import occupancy
+
+
+# Columns added after a table first shipped, with how to fill them for existing rows
+BACKFILLS = {
+    ('attendee', 'current_zone_id'): occupancy.rebuild_presence,
+}
+
+
+def _add_missing_columns(engine, table):
+    have = {col['name'] for col in inspect(engine).get_columns(table.name)}
+    added = []
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name in have:
+                continue
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+            added.append(f'{table.name}.{column.name}')
+            backfill = BACKFILLS.get((table.name, column.name))
+            if backfill:
+                backfill(conn)
+    return added
+
+
+def upgrade(engine=None):
+    """Bring an existing database up to the current models.
+
+    Creates missing tables, adds (and backfills) missing columns and creates
+    any index declared in the models that the database does not have yet.
+    Safe to run repeatedly. Returns the names of what was added.
+    """
+    engine = engine or db.engine
+    existing_tables = set(inspect(engine).get_table_names())
+    db.metadata.create_all(engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        created.extend(_add_missing_columns(engine, table))
+        have = {ix['name'] for ix in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in have:
+                index.create(bind=engine, checkfirst=True)
+                created.append(index.name)
+    return created
+
+
+# Hot lookups from the scan, trace, presence and dashboard paths
+def hot_queries():
+    since = datetime.utcnow() - timedelta(hours=1)
+    return {
+        'open_checkin_for_attendee': select(CheckIn).where(CheckIn.event_id == 1, CheckIn.attendee_id == 1, CheckIn.check_out_time.is_(None)),
+        'attendee_by_qr': select(Attendee).where(Attendee.event_id == 1, Attendee.qr_code == 'qr-1'),
+        'zone_checkins_since': select(CheckIn).where(CheckIn.event_id == 1, CheckIn.zone_id == 1, CheckIn.check_in_time >= since),
+        'attendee_presence': select(CheckIn).where(CheckIn.attendee_id == 1, CheckIn.check_out_time.is_(None)),
+        'recent_attendees': select(Attendee).where(Attendee.event_id == 1).order_by(Attendee.registration_time.desc()).limit(20),
+        'event_incidents': select(Incident).where(Incident.event_id == 1).order_by(Incident.timestamp.desc()),
+        'incident_feed_since': select(Incident).where(Incident.event_id == 1, Incident.timestamp.is_not(None), Incident.id > 1).order_by(Incident.id).limit(51),
+        'event_bottleneck_alerts': select(BottleneckAlert).where(BottleneckAlert.event_id == 1).order_by(BottleneckAlert.timestamp.desc()),
+        'event_capacity_alerts': select(CapacityAlert).where(CapacityAlert.event_id == 1).order_by(CapacityAlert.timestamp.desc()),
+        'event_missing_persons': select(MissingPerson).where(MissingPerson.event_id == 1).order_by(MissingPerson.timestamp.desc()),
+        'active_contacts': select(EmergencyContact).where(EmergencyContact.event_id == 1, EmergencyContact.is_active.is_(True)),
+        'event_zones': select(Zone).where(Zone.event_id == 1),
+    }
+
+
+def _plan(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = []
+    for key in compiled.positiontup or ():
+        value = compiled.params[key]
+        params.append(value.isoformat(' ') if isinstance(value, datetime) else value)
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), tuple(params)).all()
+    return [row[-1] for row in rows]
+
+
+def _is_table_scan(detail, tables):
+    # "SCAN check_in" reads the whole table and "SCAN check_in USING [COVERING] INDEX ..." the whole
+    # index, which grows just the same; only SEARCH narrows to a range
+    words = detail.split()
+    return len(words) > 1 and words[0] == 'SCAN' and words[1] in tables
+
+
+def seed_large_dataset(engine, events=20, attendees=50000, zones_per_event=10):
+    """Fill an empty database with enough rows for SQLite to prefer real plans."""
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Zone), [
+            {'id': e * zones_per_event + z + 1, 'name': f'Z{z}', 'max_capacity': 1000, 'current_capacity': 0, 'event_id': e + 1}
+            for e in range(events) for z in range(zones_per_event)
+        ])
+        conn.execute(insert(Attendee), [
+            {'id': i + 1, 'name': f'A{i}', 'qr_code': f'qr-{i}', 'event_id': i % events + 1,
+             'registration_time': now - timedelta(minutes=rng.randint(0, 5000))}
+            for i in range(attendees)
+        ])
+        checkins = []
+        for i in range(attendees * 2):
+            attendee = rng.randint(1, attendees)
+            event_id = (attendee - 1) % events + 1
+            t_in = now - timedelta(minutes=rng.randint(0, 3000))
+            checkins.append({
+                'attendee_id': attendee, 'event_id': event_id,
+                'zone_id': (event_id - 1) * zones_per_event + rng.randint(1, zones_per_event),
+                'check_in_time': t_in,
+                'check_out_time': None if i % 5 == 0 else t_in + timedelta(minutes=rng.randint(1, 120)),
+            })
+        conn.execute(insert(CheckIn), checkins)
+        conn.execute(insert(Incident), [
+            {'incident_type': 'Other', 'description': 'x', 'location_description': 'x', 'latitude': 0.0, 'longitude': 0.0,
+             'severity': 'Low', 'status': 'Reported', 'timestamp': now - timedelta(seconds=i), 'user_id': 1, 'event_id': i % events + 1}
+            for i in range(attendees // 5)
+        ])
+        conn.execute(insert(BottleneckAlert), [
+            {'location_description': 'x', 'latitude': 0.0, 'longitude': 0.0, 'density_level': 1.0, 'risk_level': 'High',
+             'timestamp': now - timedelta(seconds=i), 'event_id': i % events + 1}
+            for i in range(attendees // 5)
+        ])
+        conn.execute(insert(CapacityAlert), [
+            {'zone_id': 1, 'alert_type': 'warning', 'capacity_percentage': 80.0, 'current_count': 8, 'max_capacity': 10,
+             'timestamp': now - timedelta(seconds=i), 'event_id': i % events + 1}
+            for i in range(attendees // 5)
+        ])
+        conn.execute(insert(MissingPerson), [
+            {'name': 'x', 'description': 'x', 'last_seen_location': 'x', 'last_seen_time': now, 'reporter_name': 'x',
+             'reporter_contact': '00000', 'timestamp': now - timedelta(seconds=i), 'event_id': i % events + 1}
+            for i in range(attendees // 10)
+        ])
+        conn.execute(insert(EmergencyContact), [
+            {'event_id': i % events + 1, 'name': 'x', 'preferred_channels': 'email', 'is_active': i % 3 != 0, 'timestamp': now}
+            for i in range(events * 20)
+        ])
+        conn.exec_driver_sql('ANALYZE')
+
+
+def check_query_plans(engine=None, seed_rows=None):
+    """Run EXPLAIN QUERY PLAN on every hot query.
+
+    With `seed_rows`, plans are checked against a fresh in-memory database
+    seeded with that many attendees instead of the configured one. Returns
+    {name: (plan_lines, has_table_scan)}, where a scan is any SCAN of one
+    of the query's own tables, through an index or not.
+    """
+    if seed_rows:
+        engine = create_engine('sqlite://')
+        db.metadata.create_all(engine)
+        seed_large_dataset(engine, attendees=seed_rows)
+    engine = engine or db.engine
+    report = {}
+    with engine.connect() as conn:
+        for name, stmt in hot_queries().items():
+            plan = _plan(conn, stmt)
+            tables = {table.name for table in stmt.get_final_froms()}
+            report[name] = (plan, any(_is_table_scan(line, tables) for line in plan))
+    return report
+
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Create missing tables, columns and indexes on the configured database."""
+    created = upgrade()
+    click.echo(f"Added {len(created)} column(s)/index(es): {', '.join(created) or '-'}")
+
+
+@app.cli.command('check-query-plans')
+@click.option('--seed', default=50000, show_default=True, help='Attendees to seed into an in-memory database; 0 checks the configured database.')
+def check_query_plans_command(seed):
+    """Fail if a hot query falls back to a full table scan."""
+    report = check_query_plans(seed_rows=seed or None)
+    failed = False
+    for name, (plan, scans) in report.items():
+        click.echo(f"{'FAIL' if scans else 'ok  '} {name}: {' | '.join(plan)}")
+        failed = failed or scans
+    if failed:
+        click.echo('Hot queries scan a whole table or index; add or fix the index they need.', err=True)
+        sys.exit(1)
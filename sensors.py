@@ -0,0 +1,226 @@
+import json
+import math
+import threading
+import time
+
+import density
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+MAX_BATCH = 10000               # readings per HTTP request / socket message
+MAX_READINGS_PER_SECOND = 5000  # sustained ingest rate per event; bursts up to twice that
+MAX_SENSORS_PER_EVENT = 5000
+STALE_SECONDS = 10              # a sensor silent this long no longer counts towards its zone
+MAX_CLOCK_SKEW = 300            # readings stamped further from now than this are rejected
+MAX_COUNT = 100000
+
+
+class Backpressure(Exception):
+    """The event's ingest budget is exhausted; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Ingest rate exceeded; retry after {retry_after:.2f}s')
+        self.retry_after = retry_after
+
+
+def unpack_message(raw):
+    """Decode a binary (msgpack) socket message into a dict."""
+    if msgpack is None:
+        raise ValueError('msgpack is not installed on this server')
+    try:
+        data = msgpack.unpackb(raw, raw=False)
+    except Exception as e:
+        raise ValueError(f'Invalid msgpack: {e}')
+    if not isinstance(data, dict):
+        raise ValueError('Expected a map')
+    return data
+
+
+def decode_batch(body, content_type):
+    """Parse a request body into a list of reading dicts.
+
+    Accepts JSON lines, a JSON array or {"readings": [...]}, and msgpack
+    (array of maps, or a map with "readings") when msgpack is installed.
+    Raises ValueError on malformed input.
+    """
+    content_type = (content_type or '').lower()
+    if 'msgpack' in content_type:
+        if msgpack is None:
+            raise ValueError('msgpack is not installed on this server')
+        try:
+            data = msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise ValueError(f'Invalid msgpack: {e}')
+    elif 'ndjson' in content_type or 'jsonl' in content_type:
+        data = []
+        for line in body.decode('utf-8').splitlines():
+            if line.strip():
+                data.append(json.loads(line))
+    else:
+        data = json.loads(body.decode('utf-8') or 'null')
+    if isinstance(data, dict):
+        data = data.get('readings')
+    if not isinstance(data, list):
+        raise ValueError('Expected a list of readings')
+    return data
+
+
+class _TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, now):
+        self.rate = rate
+        self.capacity = 2 * rate
+        self.tokens = self.capacity
+        self.updated = now
+
+    def take(self, n, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if n > self.tokens:
+            return (n - self.tokens) / self.rate
+        self.tokens -= n
+        return 0.0
+
+
+class _EventState:
+    __slots__ = ('sensors', 'bucket')
+
+    def __init__(self, rate, now):
+        self.sensors = {}  # sensor_id -> (zone_id, count, ts)
+        self.bucket = _TokenBucket(rate, now)
+
+
+class SensorHub:
+    """Latest reading per sensor, aggregated per zone on every density tick.
+
+    Memory is bounded by the number of sensors (capped per event), never by
+    the reading rate: a reading only replaces its sensor's previous one. A
+    per-event token bucket rejects whole batches with `Backpressure` when
+    senders exceed the sustained rate.
+
+    `zone_loader(event_id)` returns {zone_id: (max_capacity, lat, lng)}; it
+    is cached per event until `invalidate_zones` is called.
+    """
+
+    def __init__(self, zone_loader, rate=MAX_READINGS_PER_SECOND, clock=time.time):
+        self.zone_loader = zone_loader
+        self.rate = rate
+        self.clock = clock
+        self._events = {}
+        self._zones = {}
+        self._lock = threading.Lock()
+
+    def zones(self, event_id):
+        with self._lock:
+            zones = self._zones.get(event_id)
+        if zones is None:
+            zones = self.zone_loader(event_id)
+            with self._lock:
+                self._zones[event_id] = zones
+        return zones
+
+    def invalidate_zones(self, event_id):
+        with self._lock:
+            self._zones.pop(event_id, None)
+
+    def ingest(self, event_id, readings):
+        """Validate and store a batch; returns (accepted, errors).
+
+        Raises ValueError if the batch is too large and Backpressure if the
+        event is over its rate budget.
+        """
+        if len(readings) > MAX_BATCH:
+            raise ValueError(f'At most {MAX_BATCH} readings per batch')
+        now = self.clock()
+        zones = self.zones(event_id)
+        with self._lock:
+            state = self._events.get(event_id)
+            if state is None:
+                state = self._events[event_id] = _EventState(self.rate, now)
+            wait = state.bucket.take(len(readings), now)
+            if wait:
+                raise Backpressure(wait)
+            accepted, errors = 0, []
+            for i, reading in enumerate(readings):
+                try:
+                    sensor_id, zone_id, count, ts = self._validate(reading, zones, now)
+                except ValueError as e:
+                    errors.append({'index': i, 'error': str(e)})
+                    continue
+                if sensor_id not in state.sensors and len(state.sensors) >= MAX_SENSORS_PER_EVENT:
+                    errors.append({'index': i, 'error': 'Too many sensors for this event'})
+                    continue
+                previous = state.sensors.get(sensor_id)
+                if previous is None or previous[2] <= ts:
+                    state.sensors[sensor_id] = (zone_id, count, ts)
+                accepted += 1
+        return accepted, errors
+
+    @staticmethod
+    def _validate(reading, zones, now):
+        if not isinstance(reading, dict):
+            raise ValueError('Reading must be an object')
+        sensor_id = reading.get('sensor_id')
+        if not isinstance(sensor_id, (str, int)) or not str(sensor_id) or len(str(sensor_id)) > 64:
+            raise ValueError('sensor_id must be a string of 1-64 characters')
+        try:
+            zone_id = int(reading.get('zone_id'))
+            count = float(reading.get('count'))
+            ts = float(reading.get('ts') or now)
+        except (TypeError, ValueError):
+            raise ValueError('zone_id, count and ts must be numbers')
+        if not (math.isfinite(count) and math.isfinite(ts)):
+            raise ValueError('count and ts must be finite')
+        if zone_id not in zones:
+            raise ValueError(f'Unknown zone {zone_id}')
+        if not 0 <= count <= MAX_COUNT:
+            raise ValueError(f'count must be between 0 and {MAX_COUNT}')
+        if abs(ts - now) > MAX_CLOCK_SKEW:
+            raise ValueError('ts is too far from server time')
+        return str(sensor_id), zone_id, count, ts
+
+    def zone_counts(self, event_id):
+        """{zone_id: summed count of the zone's live sensors}; drops stale sensors."""
+        cutoff = self.clock() - STALE_SECONDS
+        with self._lock:
+            state = self._events.get(event_id)
+            if state is None:
+                return {}
+            totals = {}
+            for sensor_id, (zone_id, count, ts) in list(state.sensors.items()):
+                if ts < cutoff:
+                    del state.sensors[sensor_id]
+                    continue
+                totals[zone_id] = totals.get(zone_id, 0.0) + count
+            if not state.sensors:
+                del self._events[event_id]
+        return totals
+
+    def frames(self, event_ids):
+        """Density frames for the events that have live sensor data (DensityEngine live source)."""
+        out = {}
+        for event_id in event_ids:
+            totals = self.zone_counts(event_id)
+            if not totals:
+                continue
+            zones = self.zones(event_id)
+            ids, lats, lngs, intensities = [], [], [], []
+            for zone_id, count in totals.items():
+                if zone_id not in zones:
+                    continue
+                capacity, lat, lng = zones[zone_id]
+                ids.append(zone_id)
+                lats.append(lat)
+                lngs.append(lng)
+                intensities.append(count / capacity if capacity else 1.0)
+            if ids:
+                out[event_id] = density.frame_from_points(event_id, lats, lngs, intensities, ids)
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {event_id: len(state.sensors) for event_id, state in self._events.items()}
@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import func, select
+
+from app import db
+from models import Zone, Incident, MissingPerson, BottleneckAlert, CapacityAlert
+
+RECENT_ALERTS = 10
+MAX_AGE_SECONDS = 60           # snapshots are rebuilt from the database this often, bounding drift
+DENSITY_REFRESH_SECONDS = 60   # density figures bump the version at most this often unless the risk level changes
+SECTIONS = ('zones', 'incidents', 'alerts', 'missing', 'density')
+OPEN_INCIDENT = 'Resolved'     # incidents with any other status count as open
+
+
+def _percentage(current, maximum):
+    return (current / maximum) * 100 if maximum else 0
+
+
+class Situation:
+    """Everything the dashboards and the chatbot need to know about one event.
+
+    `version` goes up on every change; `changed[section]` is the version at
+    which that section last changed, so pollers can ask only for what moved.
+    """
+
+    def __init__(self, event_id, zones, incidents, alerts, missing):
+        self.event_id = event_id
+        self.version = 1
+        self.zones = zones          # zone_id -> {'name', 'current_capacity', 'max_capacity'}
+        self.incidents = incidents  # severity -> open count
+        self.alerts = alerts        # deque of recent alert dicts, newest first
+        self.missing = missing      # status -> count
+        self.density = None         # {'level', 'critical', 'total', 'restricted', 'forecast'}
+        self.density_at = None
+        self.built_at = None
+        self.changed = {section: 1 for section in SECTIONS}
+
+    def _section(self, name):
+        if name == 'zones':
+            return [
+                {'id': zone_id, 'name': z['name'], 'current_capacity': z['current_capacity'],
+                 'max_capacity': z['max_capacity'],
+                 'capacity_percentage': _percentage(z['current_capacity'], z['max_capacity'])}
+                for zone_id, z in sorted(self.zones.items())
+            ]
+        if name == 'alerts':
+            return list(self.alerts)
+        return dict(getattr(self, name)) if getattr(self, name) is not None else None
+
+    def to_dict(self, since=None):
+        """Sections changed after version `since` (all of them when `since` is None)."""
+        return {
+            'event_id': self.event_id,
+            'version': self.version,
+            **{name: self._section(name) for name in SECTIONS if since is None or self.changed[name] > since}
+        }
+
+    def summary(self):
+        """Plain-text picture of the event for model prompts and canned answers."""
+        lines = []
+        if self.zones:
+            lines.append('Zones: ' + '; '.join(
+                f"{z['name']} {z['current_capacity']}/{z['max_capacity']} "
+                f"({_percentage(z['current_capacity'], z['max_capacity']):.0f}%)"
+                for z in self.zones.values()))
+        open_incidents = {s: n for s, n in self.incidents.items() if n}
+        lines.append('Open incidents: ' + (', '.join(f'{n} {s}' for s, n in open_incidents.items()) or 'none'))
+        if self.missing.get('Missing'):
+            lines.append(f"Missing persons: {self.missing['Missing']} still missing")
+        if self.alerts:
+            lines.append('Recent alerts: ' + '; '.join(a['title'] for a in list(self.alerts)[:3]))
+        if self.density:
+            lines.append(f"Crowd density risk: {self.density['level'] or 'Normal'}; "
+                         f"{self.density['critical']}/{self.density['total']} hotspots critical")
+            if self.density.get('forecast'):
+                lines.append(self.density['forecast'])
+        return '\n'.join(lines)
+
+
+def build_situation(event_id):
+    """Load a snapshot with one grouped query per section."""
+    zones = {
+        zone_id: {'name': name, 'current_capacity': current or 0, 'max_capacity': maximum}
+        for zone_id, name, current, maximum in db.session.execute(
+            select(Zone.id, Zone.name, Zone.current_capacity, Zone.max_capacity).where(Zone.event_id == event_id))
+    }
+    incidents = dict(db.session.execute(
+        select(Incident.severity, func.count(Incident.id))
+        .where(Incident.event_id == event_id, func.coalesce(Incident.status, '') != OPEN_INCIDENT)
+        .group_by(Incident.severity)).all())
+    missing = {
+        status or 'Missing': count
+        for status, count in db.session.execute(
+            select(MissingPerson.status, func.count(MissingPerson.id))
+            .where(MissingPerson.event_id == event_id).group_by(MissingPerson.status))
+    }
+    bottlenecks = db.session.execute(
+        select(BottleneckAlert.risk_level, BottleneckAlert.density_level, BottleneckAlert.prediction, BottleneckAlert.timestamp)
+        .where(BottleneckAlert.event_id == event_id)
+        .order_by(BottleneckAlert.timestamp.desc()).limit(RECENT_ALERTS)).all()
+    capacity = db.session.execute(
+        select(CapacityAlert.alert_type, CapacityAlert.zone_id, CapacityAlert.capacity_percentage, CapacityAlert.timestamp)
+        .where(CapacityAlert.event_id == event_id)
+        .order_by(CapacityAlert.timestamp.desc()).limit(RECENT_ALERTS)).all()
+    alerts = [bottleneck_alert(*row) for row in bottlenecks] + [
+        capacity_alert(alert_type, zones.get(zone_id, {}).get('name', f'Zone {zone_id}'), pct, ts)
+        for alert_type, zone_id, pct, ts in capacity
+    ]
+    alerts.sort(key=lambda a: a['timestamp'], reverse=True)
+    return Situation(event_id, zones, incidents, deque(alerts[:RECENT_ALERTS], maxlen=RECENT_ALERTS), missing)
+
+
+def bottleneck_alert(risk_level, density_level, prediction, timestamp):
+    return {'type': 'bottleneck', 'title': f'{risk_level} bottleneck', 'severity': risk_level,
+            'density_level': density_level, 'prediction': prediction, 'timestamp': timestamp.isoformat()}
+
+
+def capacity_alert(alert_type, zone_name, capacity_percentage, timestamp):
+    return {'type': 'capacity', 'title': f'{zone_name} {alert_type.replace("_", " ")}', 'severity': alert_type,
+            'zone': zone_name, 'capacity_percentage': capacity_percentage, 'timestamp': timestamp.isoformat()}
+
+
+class SituationService:
+    """Per-event snapshots kept current by applying deltas from the write paths.
+
+    `get` builds a snapshot on first use, and again after MAX_AGE_SECONDS to
+    bound drift. Each `*_changed` / `*_added` call mutates the snapshot in
+    place and bumps its version; calls for an event without a snapshot are
+    dropped, since the next build reads them anyway. With several workers,
+    set `shared` to a cluster.SharedGenerations: other workers then rebuild
+    after an invalidation or a zone, incident, missing-person or alert delta.
+    Density deltas stay local, as only the worker running the stream has them.
+    """
+
+    def __init__(self, loader=build_situation, max_age=MAX_AGE_SECONDS, clock=time.monotonic):
+        self.loader = loader
+        self.max_age = max_age
+        self.clock = clock
+        self._situations = {}
+        self._versions = {}  # event_id -> last version handed out, kept across rebuilds
+        self._applied = {}   # event_id -> deltas applied, to spot ones that race a rebuild
+        self._lock = threading.Lock()
+        self.shared = None
+
+    def get(self, event_id):
+        if self.shared is not None and self.shared.changed(event_id):
+            self._drop(event_id)
+        with self._lock:
+            situation = self._situations.get(event_id)
+            if situation is not None and self.clock() - situation.built_at < self.max_age:
+                return situation
+            applied = self._applied.get(event_id, 0)
+        fresh = self.loader(event_id)
+        fresh.built_at = self.clock()
+        with self._lock:
+            current = self._situations.get(event_id)
+            version = self._versions.get(event_id, 0)
+            if self._applied.get(event_id, 0) != applied:
+                # A delta landed while loading and may be missing from this read. The cached
+                # snapshot has it applied; without one, hand out this read uncached under a new version.
+                if current is not None:
+                    return current
+                fresh.version = self._versions[event_id] = version + 1
+                fresh.changed = {section: fresh.version for section in SECTIONS}
+                return fresh
+            if current is None:
+                fresh.version = version + 1
+                fresh.changed = {section: fresh.version for section in SECTIONS}
+            else:
+                # Only sections that actually differ move, so an idle event keeps its version
+                fresh.density, fresh.density_at = current.density, current.density_at
+                moved = [name for name in SECTIONS if fresh._section(name) != current._section(name)]
+                fresh.version = version + 1 if moved else current.version
+                fresh.changed = {name: fresh.version if name in moved else current.changed[name] for name in SECTIONS}
+            self._versions[event_id] = fresh.version
+            self._situations[event_id] = fresh
+            return fresh
+
+    def invalidate(self, event_id):
+        self._drop(event_id)
+        if self.shared is not None:
+            self.shared.bump(event_id)
+
+    def _drop(self, event_id):
+        with self._lock:
+            self._situations.pop(event_id, None)
+            self._applied[event_id] = self._applied.get(event_id, 0) + 1
+
+    def _apply(self, event_id, section, change):
+        with self._lock:
+            situation = self._situations.get(event_id)
+            if situation is not None and change(situation) is False:
+                return  # nothing moved, so a rebuild in progress is still accurate
+            self._applied[event_id] = self._applied.get(event_id, 0) + 1
+            if situation is not None:
+                situation.version = self._versions[event_id] = situation.version + 1
+                situation.changed[section] = situation.version
+        if self.shared is not None and section != 'density':
+            self.shared.bump(event_id)
+
+    def zone_changed(self, event_id, zone_id, name, current_capacity, max_capacity):
+        def change(s):
+            s.zones[zone_id] = {'name': name, 'current_capacity': current_capacity or 0, 'max_capacity': max_capacity}
+        self._apply(event_id, 'zones', change)
+
+    def incident_added(self, event_id, severity):
+        def change(s):
+            s.incidents[severity] = s.incidents.get(severity, 0) + 1
+        self._apply(event_id, 'incidents', change)
+
+    def missing_added(self, event_id, status='Missing'):
+        def change(s):
+            s.missing[status] = s.missing.get(status, 0) + 1
+        self._apply(event_id, 'missing', change)
+
+    def alert_added(self, event_id, alert):
+        self._apply(event_id, 'alerts', lambda s: s.alerts.appendleft(alert))
+
+    def density_changed(self, event_id, level, stats, forecast=None):
+        """Record density figures, at most every DENSITY_REFRESH_SECONDS unless the risk level changes.
+
+        `forecast` may be a callable so the text is only built when it is stored.
+        """
+        def change(s):
+            now = self.clock()
+            if s.density is not None and s.density['level'] == level and now - s.density_at < DENSITY_REFRESH_SECONDS:
+                return False
+            s.density = {'level': level, **stats, 'forecast': forecast() if callable(forecast) else forecast}
+            s.density_at = now
+        self._apply(event_id, 'density', change)
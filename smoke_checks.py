@@ -0,0 +1,229 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _event(name):
+    """A user and an event of theirs, committed; call inside an app context."""
+    from app import db
+    from models import User, Event
+    user = User(username=name, email=f'{name}@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+    event = Event(name=name, objective='o', target_audience='t', date_time=datetime.utcnow(), venue_name='v',
+                  venue_address='a', latitude=0.0, longitude=0.0, description='d', user_id=user.id)
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+
+def _incident(event, description, timestamp):
+    from models import Incident
+    return Incident(event_id=event.id, user_id=event.user_id, incident_type='Other', description=description,
+                    location_description='x', latitude=0.0, longitude=0.0, severity='Low', timestamp=timestamp)
+
+
+def check_alert_ladder():
+    import alerts
+    ladder = alerts.CAPACITY_LADDER
+    level = -1
+    for value, expected in [(79, -1), (80, 0), (76, 0), (74, -1), (100, 1), (96, 1), (94, 0), (81, 0), (74.9, -1)]:
+        level = ladder.level(value, level)
+        assert level == expected, f'{value}% gave level {level}, expected {expected}'
+
+
+def check_alert_gate():
+    import alerts
+    clock = FakeClock()
+    gate = alerts.AlertGate(window_seconds=300, clock=clock)
+    key = ('capacity', 1, 7)
+
+    def observe(value, at):
+        clock.now = 1000.0 + at
+        return gate.observe(key, alerts.CAPACITY_LADDER, value)
+
+    first = observe(85, 0)
+    assert first.notify and first.level == 'warning' and first.escalated
+    repeat = observe(86, 10)
+    assert not repeat.notify and repeat.suppressed == 1
+    up = observe(100, 20)
+    assert up.notify and up.escalated and up.level == 'over_capacity' and up.suppressed == 1
+    assert not observe(97, 30).notify  # hovering above the exit threshold stays suppressed
+    again = observe(97, 330)
+    assert again.notify and not again.escalated and again.suppressed == 1
+    assert observe(50, 340).level is None
+    assert observe(85, 350).notify  # cleared, so the next crossing notifies at once
+    gate.reset(1)
+    assert gate.snapshot(1, {'capacity': alerts.CAPACITY_LADDER}) == []
+
+
+def check_lease_store():
+    import cluster
+    clock = FakeClock()
+    store = cluster.LocalLeaseStore(clock=clock)
+    assert store.acquire('lease', 'a', 10)
+    assert not store.acquire('lease', 'b', 10)
+    clock.now += 9
+    assert store.acquire('lease', 'a', 10), 'holder could not renew'
+    clock.now += 9
+    assert store.owner('lease') == 'a', 'renewed lease expired early'
+    clock.now += 2
+    assert store.owner('lease') is None, 'lease outlived its ttl'
+    assert store.acquire('lease', 'b', 10), 'expired lease was not taken over'
+    store.release('lease', 'a')  # a late release from the old holder must not drop b's lease
+    assert store.owner('lease') == 'b'
+    store.release('lease', 'b')
+    assert store.owner('lease') is None
+
+    store.set_count('subs', 'a', 2, 10)
+    store.set_count('subs', 'b', 3, 30)
+    assert store.total('subs') == 5
+    clock.now += 11
+    assert store.total('subs') == 3, "a dead worker's count did not age out"
+    store.set_flag('flag', 5)
+    assert store.take_flag('flag') and not store.take_flag('flag')
+
+
+def check_stream_takeover():
+    import cluster
+    clock = FakeClock()
+    store = cluster.LocalLeaseStore(clock=clock)
+    events = []
+    workers = {
+        name: cluster.StreamCoordinator(
+            store, lambda: {1: 1},
+            on_lead=lambda e, name=name: events.append((name, 'lead', e)),
+            on_release=lambda e, name=name: events.append((name, 'release', e)),
+            lease_seconds=10, worker_id=name)
+        for name in ('a', 'b')
+    }
+    workers['a'].heartbeat()
+    workers['b'].heartbeat()
+    assert workers['a'].leading() == {1} and not workers['b'].leading()
+    clock.now += 11  # a stalls past its lease
+    workers['b'].heartbeat()
+    assert workers['b'].leading() == {1}, 'orphaned stream was not taken over'
+    workers['a'].heartbeat()
+    assert not workers['a'].leading(), 'stalled leader kept running the stream'
+    assert events == [('a', 'lead', 1), ('b', 'lead', 1), ('a', 'release', 1)], events
+
+
+def check_feed_cursor():
+    import feeds
+    for ts in (datetime(2024, 5, 1, 12, 30), datetime(2024, 5, 1, 12, 30, 5, 123456)):
+        row = SimpleNamespace(timestamp=ts, id=42)
+        assert feeds.decode_cursor(feeds.encode_cursor(row)) == (ts, 42)
+    for bad in ('', 'not a cursor', feeds.encode_cursor(SimpleNamespace(timestamp=datetime(2024, 1, 1), id=1))[:-3]):
+        try:
+            feeds.decode_cursor(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f'{bad!r} decoded')
+
+
+def check_feed_paging():
+    from app import app, db
+    import feeds
+    with app.app_context():
+        event = _event('feeds')
+        # Ties on timestamp must neither repeat nor skip rows across page boundaries
+        base = datetime(2024, 5, 1, 12)
+        db.session.add_all([_incident(event, f'i{n}', base + timedelta(seconds=n // 3)) for n in range(25)])
+        db.session.commit()
+        seen, cursor = [], None
+        while True:
+            page = feeds.fetch('incidents', event.id, before=cursor, limit=4)
+            seen.extend(item['id'] for item in page['items'])
+            cursor = page['next']
+            if cursor is None:
+                break
+        assert len(seen) == 25 and len(set(seen)) == 25, seen
+        newest = feeds.fetch('incidents', event.id, limit=1)['latest']
+        db.session.add(_incident(event, 'late', base + timedelta(hours=1)))
+        db.session.commit()
+        page = feeds.fetch('incidents', event.id, since=newest)
+        assert [item['timestamp'] for item in page['items']] == [(base + timedelta(hours=1)).isoformat()], page
+        # Committed after that poll but stamped earlier (a slow writer), and one without a timestamp
+        db.session.add(_incident(event, 'slow', base - timedelta(hours=1)))
+        db.session.add(_incident(event, 'undated', None))
+        db.session.commit()
+        db.session.execute(db.text("UPDATE incident SET timestamp = NULL WHERE description = 'undated'"))
+        db.session.commit()
+        page = feeds.fetch('incidents', event.id, since=page['latest'])
+        assert [item['timestamp'] for item in page['items']] == [(base - timedelta(hours=1)).isoformat()], page
+        assert len(feeds.fetch('incidents', event.id, limit=200)['items']) == 27
+
+
+def check_contact_times():
+    import contact_trace
+    assert contact_trace.parse_time('2024-05-01T12:00:00') == datetime(2024, 5, 1, 12)
+    assert contact_trace.parse_time('2024-05-01T14:00:00+02:00') == datetime(2024, 5, 1, 12)
+    assert contact_trace.parse_time('2024-05-01T12:00:00Z') == datetime(2024, 5, 1, 12)
+    assert contact_trace.parse_time(datetime(2024, 5, 1, 12, tzinfo=timezone.utc).isoformat()).tzinfo is None
+
+
+def check_occupancy():
+    from app import app, db
+    from models import Zone, Attendee, CheckIn
+    import occupancy
+    with app.app_context():
+        event = _event('occupancy')
+        zone = Zone(name='Gate', max_capacity=10, current_capacity=0, event_id=event.id)
+        db.session.add(zone)
+        db.session.commit()
+        occupancy.apply_delta(zone.id, -1)
+        db.session.commit()
+        db.session.refresh(zone)
+        assert zone.current_capacity == 0, 'occupancy went below zero'
+        attendees = [Attendee(name=f'A{i}', qr_code=f'SMOKE-{i}', event_id=event.id) for i in range(3)]
+        db.session.add_all(attendees)
+        db.session.commit()
+        db.session.add_all([CheckIn(attendee_id=a.id, zone_id=zone.id, event_id=event.id) for a in attendees[:2]])
+        occupancy.apply_deltas({zone.id: 5})
+        db.session.commit()
+        drift = occupancy.reconcile(event.id)
+        assert drift == {zone.id: (5, 2)}, drift
+        db.session.refresh(zone)
+        assert zone.current_capacity == 2
+        assert {a.id: a.current_zone_id for a in Attendee.query.filter_by(event_id=event.id)} == {
+            attendees[0].id: zone.id, attendees[1].id: zone.id, attendees[2].id: None}
+
+
+CHECKS = [
+    check_alert_ladder, check_alert_gate, check_lease_store, check_stream_takeover,
+    check_feed_cursor, check_feed_paging, check_contact_times, check_occupancy,
+]
+
+
+def run(checks=CHECKS):
+    """Run each check and print ok/FAIL; returns the number that failed."""
+    failed = 0
+    for check in checks:
+        try:
+            check()
+            print('ok  ', check.__name__)
+        except Exception as e:
+            failed += 1
+            print('FAIL', check.__name__, '-', f'{type(e).__name__}: {e}')
+    return failed
+
+
+if __name__ == '__main__':
+    # python smoke_checks.py; checks that need a database get a throwaway SQLite file
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'smoke.db')
+        os.environ.pop('MAIL_SERVER', None)
+        from app import app, db
+        with app.app_context():
+            db.create_all()
+        sys.exit(1 if run() else 0)
@@ -90,36 +90,17 @@ function initChatbot(eventId) {
 }
 
 // Bottleneck Analysis Dashboard
+const DENSITY_SERIES_COLORS = ['255, 99, 132', '54, 162, 235', '255, 206, 86', '75, 192, 192', '153, 102, 255', '255, 159, 64'];
+
 function initBottleneckDashboard(eventId) {
     const densityChart = document.getElementById('density-chart');
     
     if (densityChart) {
-        // Sample data - in a real application, this would come from the server
+        // History comes from the density time-series store (1m/5m/1h rollups picked by the server)
         const ctx = densityChart.getContext('2d');
         const chart = new Chart(ctx, {
             type: 'line',
-            data: {
-                labels: ['12:00', '12:15', '12:30', '12:45', '13:00', '13:15', '13:30', '13:45', '14:00'],
-                datasets: [{
-                    label: 'Main Entrance',
-                    data: [1.2, 1.5, 2.1, 3.2, 4.5, 5.1, 4.8, 3.9, 3.2],
-                    borderColor: 'rgba(255, 99, 132, 1)',
-                    backgroundColor: 'rgba(255, 99, 132, 0.2)',
-                    tension: 0.4
-                }, {
-                    label: 'Food Court',
-                    data: [0.8, 1.2, 1.8, 2.5, 3.1, 3.8, 4.2, 4.5, 4.1],
-                    borderColor: 'rgba(54, 162, 235, 1)',
-                    backgroundColor: 'rgba(54, 162, 235, 0.2)',
-                    tension: 0.4
-                }, {
-                    label: 'Stage Area',
-                    data: [0.5, 0.8, 1.2, 2.8, 4.2, 5.8, 6.5, 6.2, 5.8],
-                    borderColor: 'rgba(255, 206, 86, 1)',
-                    backgroundColor: 'rgba(255, 206, 86, 0.2)',
-                    tension: 0.4
-                }]
-            },
+            data: { labels: [], datasets: [] },
             options: {
                 responsive: true,
                 plugins: {
@@ -149,9 +130,78 @@ function initBottleneckDashboard(eventId) {
                 }
             }
         });
+
+        const minutes = parseInt(densityChart.dataset.minutes || '60', 10);
+        async function refresh() {
+            try {
+                const res = await fetch(`/api/event/${eventId}/density/series?minutes=${minutes}`);
+                const data = await res.json();
+                if (!data.ok) return;
+                // Align every series on the union of bucket timestamps
+                const stamps = [...new Set(data.series.flatMap(s => s.points.map(p => p[0])))].sort((a, b) => a - b);
+                chart.data.labels = stamps.map(ts => new Date(ts * 1000).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }));
+                chart.data.datasets = data.series.map((s, i) => {
+                    const byTs = new Map(s.points.map(p => [p[0], p[1]]));
+                    const color = DENSITY_SERIES_COLORS[i % DENSITY_SERIES_COLORS.length];
+                    return {
+                        label: s.label,
+                        data: stamps.map(ts => byTs.has(ts) ? byTs.get(ts) : null),
+                        borderColor: `rgba(${color}, 1)`,
+                        backgroundColor: `rgba(${color}, 0.2)`,
+                        spanGaps: true,
+                        tension: 0.4
+                    };
+                });
+                chart.update();
+            } catch (e) {
+                console.error('Density series error:', e);
+            }
+        }
+
+        refresh();
+        const live = document.getElementById('live-update');
+        setInterval(() => {
+            if (!live || live.checked) refresh();
+        }, 30000);
+        return chart;
     }
 }
 
+// Zone status from the situation snapshot; only sections newer than our version come back
+function initSituationPanel(eventId) {
+    const list = document.getElementById('zone-status');
+    let version = null;
+    const badge = (pct) => pct >= 100 ? ['danger', 'Critical'] : (pct >= 80 ? ['warning', 'Warning'] : ['success', 'Normal']);
+    async function poll() {
+        try {
+            const res = await fetch(`/api/event/${eventId}/situation` + (version === null ? '' : `?since=${version}`));
+            const data = await res.json();
+            if (!data.ok) return;
+            version = data.version;
+            if (!data.zones) return;
+            list.innerHTML = '';
+            if (!data.zones.length) {
+                list.innerHTML = '<li class="list-group-item text-muted">No zones configured</li>';
+            }
+            data.zones.forEach(z => {
+                const [cls, label] = badge(z.capacity_percentage);
+                const li = document.createElement('li');
+                li.className = 'list-group-item d-flex justify-content-between align-items-center';
+                li.textContent = `${z.name} (${z.current_capacity}/${z.max_capacity})`;
+                const span = document.createElement('span');
+                span.className = `badge bg-${cls} rounded-pill`;
+                span.textContent = label;
+                li.appendChild(span);
+                list.appendChild(li);
+            });
+        } catch (e) {
+            console.error('Situation poll error:', e);
+        }
+    }
+    poll();
+    setInterval(poll, 10000);
+}
+
 // Notify emergency contacts from Bottleneck Analysis panel
 function initBottleneckNotify(eventId) {
     try {
@@ -208,7 +258,34 @@ function initBottleneckNotify(eventId) {
 }
 
 // Evacuation Routes Map
-function initEvacuationMap(eventId, latitude, longitude, restrictedAreas = [], incidents = []) {
+// Decode a density_grid payload: a JSON object, or the binary layout from gridcodec.py
+function decodeDensityGrid(data) {
+    if (!(data instanceof ArrayBuffer) && !ArrayBuffer.isView(data)) {
+        return data;
+    }
+    const bytes = data instanceof ArrayBuffer ? new Uint8Array(data) : new Uint8Array(data.buffer, data.byteOffset, data.byteLength);
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    const seq = view.getUint32(1, true);
+    if (bytes[0] === 75) {  // 'K'
+        const size = view.getUint16(5, true);
+        return {
+            key: true, seq, size,
+            levels: view.getUint16(7, true),
+            south: view.getFloat64(9, true),
+            west: view.getFloat64(17, true),
+            step: view.getFloat64(25, true),
+            values: Array.from(bytes.subarray(33, 33 + size * size))
+        };
+    }
+    const count = view.getUint16(5, true);
+    const cells = [];
+    for (let i = 0; i < count; i++) {
+        cells.push(view.getUint16(7 + 2 * i, true));
+    }
+    return { key: false, seq, cells, values: Array.from(bytes.subarray(7 + 2 * count, 7 + 3 * count)) };
+}
+
+function initEvacuationMap(eventId, latitude, longitude, restrictedAreas = [], incidents = [], exits = []) {
     const mapContainer = document.getElementById('evacuation-map');
     
     if (mapContainer) {
@@ -287,16 +364,9 @@ function initEvacuationMap(eventId, latitude, longitude, restrictedAreas = [], i
             setTimeout(() => banner.remove(), 6000);
         };
         
-        // Sample exit points - in a real application, these would come from the database
-        const exits = [
-            { name: "Main Exit", lat: latitude + 0.0005, lng: longitude + 0.0005 },
-            { name: "Emergency Exit 1", lat: latitude - 0.0003, lng: longitude + 0.0007 },
-            { name: "Emergency Exit 2", lat: latitude + 0.0008, lng: longitude - 0.0003 }
-        ];
-        
         // Add exit markers
-        exits.forEach(exit => {
-            const exitMarker = L.marker([exit.lat, exit.lng], {
+        (exits || []).forEach(exit => {
+            const exitMarker = L.marker([exit.latitude, exit.longitude], {
                 icon: L.divIcon({
                     className: 'exit-marker',
                     html: '<i class="fas fa-door-open text-success fa-2x"></i>',
@@ -308,20 +378,55 @@ function initEvacuationMap(eventId, latitude, longitude, restrictedAreas = [], i
             exitMarker.bindPopup("<b>" + exit.name + "</b>");
         });
 
+        // Restricted areas are routed around server-side; draw them for context
+        (restrictedAreas || []).forEach(area => {
+            try {
+                L.polygon(JSON.parse(area.coordinates), { color: 'red', fillOpacity: 0.2 }).addTo(map);
+            } catch (e) {
+                console.error('Invalid restricted area coordinates', e);
+            }
+        });
+
         // Socket.IO: subscribe to real-time density updates
         try {
             if (typeof io !== 'undefined') {
                 const socket = io();
                 socket.emit('join_event', { event_id: eventId });
-                socket.on('density_update', (payload) => {
-                    const { points = [], stats = {}, alert } = payload || {};
-                    // Update heat layer with [lat, lng, intensity]
-                    const latlngs = points.map(p => [p.lat, p.lng, p.intensity]);
+                // Quantized venue grid: a keyframe on join, then only the cells that changed
+                let grid = null;
+                const applyGrid = (data) => {
+                    const msg = decodeDensityGrid(data);
+                    if (msg.key) {
+                        grid = msg;
+                    } else if (!grid || msg.seq <= grid.seq) {
+                        return;
+                    } else if (msg.seq !== grid.seq + 1) {
+                        grid = null;
+                        socket.emit('density_resync', { event_id: eventId });
+                        return;
+                    } else {
+                        msg.cells.forEach((cell, i) => { grid.values[cell] = msg.values[i]; });
+                        grid.seq = msg.seq;
+                    }
+                    const latlngs = [];
+                    grid.values.forEach((v, cell) => {
+                        if (!v) return;
+                        const row = Math.floor(cell / grid.size), col = cell % grid.size;
+                        latlngs.push([grid.south + (row + 0.5) * grid.step, grid.west + (col + 0.5) * grid.step, v / (grid.levels - 1)]);
+                    });
                     heatLayer.setLatLngs(latlngs);
+                };
+                socket.on('density_grid', (payload) => {
+                    if (payload && String(payload.event_id) === String(eventId) && payload.data) {
+                        applyGrid(payload.data);
+                    }
+                });
+                socket.on('density_update', (payload) => {
+                    const { stats = {}, alert } = payload || {};
                     // Update stats in legend
                     const statsEl = document.getElementById('density-stats');
                     if (statsEl && stats && typeof stats.critical !== 'undefined') {
-                        statsEl.textContent = `Critical hotspots: ${stats.critical}/${stats.total || latlngs.length}`;
+                        statsEl.textContent = `Critical hotspots: ${stats.critical}/${stats.total}`;
                     }
                     // Show predictive overflow alert
                     if (alert && alert.message) {
@@ -333,82 +438,24 @@ function initEvacuationMap(eventId, latitude, longitude, restrictedAreas = [], i
             console.warn('Socket.IO not available:', e);
         }
         
-        // Helper: point-in-polygon (ray casting)
-        const isPointInPolygon = (point, polygonCoords) => {
-            let x = point.lng, y = point.lat;
-            let inside = false;
-            for (let i = 0, j = polygonCoords.length - 1; i < polygonCoords.length; j = i++) {
-                const xi = polygonCoords[i][1], yi = polygonCoords[i][0];
-                const xj = polygonCoords[j][1], yj = polygonCoords[j][0];
-                const intersect = ((yi > y) !== (yj > y)) &&
-                    (x < (xj - xi) * (y - yi) / (yj - yi + 0.0000001) + xi);
-                if (intersect) inside = !inside;
-            }
-            return inside;
-        };
-
-        // Prepare restricted polygons
-        const restrictedPolygons = (restrictedAreas || []).map(area => {
-            try {
-                const coords = JSON.parse(area.coordinates);
-                return { name: area.name, coords };
-            } catch (e) {
-                console.error('Invalid restricted area coordinates', e);
-                return null;
-            }
-        }).filter(Boolean);
-
-        // Severity weights for safety scoring
-        const severityWeight = { Low: 10, Medium: 20, High: 50, Critical: 100 };
-
         // Attempt to use user's live location
         let userMarker;
-        let routingControl;
-        const routeToExit = (userLatLng) => {
-            // Compute safety-aware score for each exit
-            let best = exits[0];
-            let bestScore = Infinity;
-            exits.forEach(exit => {
-                const baseDist = Math.hypot(exit.lat - userLatLng.lat, exit.lng - userLatLng.lng);
-                // Penalize exits inside restricted polygons
-                let restrictedPenalty = 0;
-                for (const poly of restrictedPolygons) {
-                    if (isPointInPolygon({ lat: exit.lat, lng: exit.lng }, poly.coords)) {
-                        restrictedPenalty += 1000; // large penalty to avoid
-                    }
-                }
-                // Penalize exits near high-severity incidents
-                let incidentPenalty = 0;
-                (incidents || []).forEach(inc => {
-                    const d = Math.hypot(inc.latitude - exit.lat, inc.longitude - exit.lng);
-                    const weight = severityWeight[inc.severity] || 0;
-                    // inverse distance weighting (avoid divide-by-zero)
-                    incidentPenalty += weight / Math.max(d, 0.0001);
-                });
-                const score = baseDist + restrictedPenalty + incidentPenalty;
-                if (score < bestScore) {
-                    bestScore = score;
-                    best = exit;
+        let routeLine;
+        // Exit choice and path come from the server's precomputed exit distance fields
+        const routeToExit = async (userLatLng) => {
+            try {
+                const res = await fetch(`/api/event/${eventId}/evacuation/route?lat=${userLatLng.lat}&lng=${userLatLng.lng}`);
+                const json = await res.json().catch(() => ({}));
+                if (!res.ok || !json.ok) throw new Error(json.error || 'Route unavailable');
+                if (routeLine) {
+                    routeLine.remove();
                 }
-            });
-
-            // Draw route using Leaflet Routing Machine (OSRM)
-            if (routingControl) {
-                routingControl.remove();
+                routeLine = L.polyline(json.path, { color: 'green', weight: 6, opacity: 0.8 }).addTo(map);
+                routeLine.bindPopup(`<b>${json.exit.name}</b><br>${json.length_m} m`);
+                map.fitBounds(routeLine.getBounds(), { padding: [20, 20] });
+            } catch (e) {
+                console.warn('Evacuation route failed:', e);
             }
-            routingControl = L.Routing.control({
-                waypoints: [
-                    L.latLng(userLatLng.lat, userLatLng.lng),
-                    L.latLng(best.lat, best.lng)
-                ],
-                lineOptions: {
-                    styles: [{ color: 'green', weight: 6, opacity: 0.8 }]
-                },
-                fitSelectedRoutes: true,
-                show: false,
-                addWaypoints: false,
-                routeWhileDragging: false
-            }).addTo(map);
         };
 
         const onGeolocateSuccess = (pos) => {
@@ -685,6 +732,10 @@ document.addEventListener('DOMContentLoaded', function() {
         if (document.getElementById('density-chart')) {
             initBottleneckDashboard(eventId);
         }
+
+        if (document.getElementById('zone-status')) {
+            initSituationPanel(eventId);
+        }
         
         if (document.getElementById('evacuation-map')) {
             initEvacuationMap(eventId, latitude, longitude);
@@ -713,6 +764,13 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize missing person form if present
     initMissingPersonForm();
+
+    document.querySelectorAll('[data-feed-url]').forEach(initFeed);
+
+    const detectionJob = document.getElementById('detection-job');
+    if (detectionJob && detectionJob.dataset.jobId) {
+        initDetectionJob(detectionJob);
+    }
 });
 
 // In-app notifications: listen for alert_broadcast and show Bootstrap alert
@@ -742,3 +800,164 @@ function initAlertNotifications(eventId) {
         console.warn('Alert notifications unavailable:', e);
     }
 }
+
+// Paged history feeds: "Load older" follows the next cursor, polling with since= prepends new rows
+const FEED_POLL_MS = 15000;
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+}
+
+function feedTime(iso) {
+    return iso ? iso.slice(0, 16).replace('T', ' ') : '';
+}
+
+const FEED_RENDERERS = {
+    'incidents': (i) => {
+        const cls = i.severity === 'Critical' ? 'bg-danger' : (i.severity === 'High' ? 'bg-warning text-dark' : (i.severity === 'Medium' ? 'bg-info text-dark' : 'bg-secondary'));
+        return `<tr><td><a href="/incident/${i.id}" target="_self" class="text-decoration-none">${escapeHtml(i.incident_type)}</a></td>` +
+            `<td><span class="badge ${cls}">${escapeHtml(i.severity)}</span></td>` +
+            `<td>${escapeHtml(i.location_description)}</td>` +
+            `<td>${Number(i.latitude).toFixed(6)}, ${Number(i.longitude).toFixed(6)}</td>` +
+            `<td>${escapeHtml(i.status)}</td><td>${feedTime(i.timestamp)}</td></tr>`;
+    },
+    'missing': (p) => `<div class="col-md-6 mb-4"><div class="card h-100">` +
+        `<div class="card-header bg-info text-white"><h5 class="mb-0">${escapeHtml(p.name)}${p.age ? ` (${escapeHtml(p.age)})` : ''}</h5></div>` +
+        `<div class="card-body"><p><strong>Status:</strong> ${escapeHtml(p.status)}</p>` +
+        `<p><strong>Description:</strong> ${escapeHtml(p.description)}</p>` +
+        `<p><strong>Last Seen:</strong> ${escapeHtml(p.last_seen_location)} at ${feedTime(p.last_seen_time)}</p>` +
+        `<p><strong>Reported by:</strong> ${escapeHtml(p.reporter_name)} (${escapeHtml(p.reporter_contact)})</p>` +
+        `<p><strong>Reported at:</strong> ${feedTime(p.timestamp)}</p>` +
+        `<a class="btn btn-outline-info" href="/missing/${p.id}" target="_self">Manage Media &amp; Detection</a></div></div></div>`,
+    'bottleneck-alerts': (a) => {
+        const cls = a.risk_level === 'Critical' ? 'bg-danger' : (a.risk_level === 'High' ? 'bg-warning text-dark' : 'bg-info text-dark');
+        return `<tr><td><span class="badge ${cls}">${escapeHtml(a.risk_level)}</span></td>` +
+            `<td>${escapeHtml(a.location_description)}</td>` +
+            `<td>${a.density_level == null ? '' : Number(a.density_level).toFixed(1)}</td><td>${feedTime(a.timestamp)}</td></tr>`;
+    },
+    'capacity-alerts': (a) => {
+        const cls = a.alert_type === 'over_capacity' ? 'bg-danger' : 'bg-warning text-dark';
+        return `<tr><td><span class="badge ${cls}">${escapeHtml(a.alert_type.replace(/_/g, ' '))}</span></td>` +
+            `<td>${escapeHtml(a.zone)}</td><td>${Math.round(a.capacity_percentage)}%</td><td>${feedTime(a.timestamp)}</td></tr>`;
+    }
+};
+
+function initFeed(container) {
+    const url = container.dataset.feedUrl;
+    const kind = url.split('/').pop();
+    const render = FEED_RENDERERS[kind];
+    const more = document.querySelector(`[data-feed-more="${container.id}"]`);
+    if (!render) return;
+    let next = container.dataset.next || null;
+    let latest = container.dataset.latest || null;
+    let polling = false;
+
+    const rows = (items) => items.map(render).join('');
+    const clearEmpty = () => container.querySelectorAll('.feed-empty').forEach(el => el.remove());
+
+    async function loadOlder() {
+        if (!next) return;
+        more.disabled = true;
+        try {
+            const res = await fetch(`${url}?before=${encodeURIComponent(next)}`);
+            const data = await res.json();
+            if (!data.ok) return;
+            container.insertAdjacentHTML('beforeend', rows(data.items));
+            next = data.next;
+        } catch (e) {
+            console.error('Feed page error:', e);
+        } finally {
+            more.disabled = false;
+            more.style.display = next ? '' : 'none';
+        }
+    }
+
+    async function poll() {
+        if (polling || document.hidden) return;
+        polling = true;
+        try {
+            let caughtUp = false;
+            while (!caughtUp) {
+                // Without a cursor yet (empty feed), the first page doubles as the catch-up
+                const res = await fetch(latest ? `${url}?since=${encodeURIComponent(latest)}` : url);
+                const data = await res.json();
+                if (!data.ok) return;
+                if (data.items.length) {
+                    clearEmpty();
+                    const items = latest ? data.items.slice().reverse() : data.items;
+                    container.insertAdjacentHTML('afterbegin', rows(items));
+                }
+                if (!latest && data.next && !next) {
+                    next = data.next;
+                    if (more) more.style.display = '';
+                }
+                latest = data.latest || latest;
+                caughtUp = !data.more;
+            }
+        } catch (e) {
+            console.error('Feed poll error:', e);
+        } finally {
+            polling = false;
+        }
+    }
+
+    if (more) more.addEventListener('click', loadOlder);
+    setInterval(poll, FEED_POLL_MS);
+}
+
+// Detection job progress on the missing person page; results are rendered server-side, so reload when done
+function initDetectionJob(panel) {
+    const jobId = panel.dataset.jobId;
+    const status = document.getElementById('detection-job-status');
+    const bar = document.getElementById('detection-job-bar');
+    const cancel = document.getElementById('detection-job-cancel');
+    const active = (s) => s === 'queued' || s === 'running';
+    if (!active(panel.dataset.status)) return;
+    let timer = null;
+
+    function show(job) {
+        const done = job.processed + job.failed;
+        status.textContent = `Detection ${job.status}: ${done}/${job.total} media` +
+            (job.skipped ? `, ${job.skipped} skipped` : '') + (job.detections ? `, ${job.detections} detections` : '');
+        bar.style.width = job.total ? `${Math.round(done * 100 / job.total)}%` : '0%';
+        cancel.style.display = active(job.status) && !job.cancel_requested ? '' : 'none';
+        if (!active(job.status)) {
+            clearInterval(timer);
+            window.location.reload();
+        }
+    }
+
+    async function poll() {
+        try {
+            const res = await fetch(`/api/detection/jobs/${jobId}`);
+            const data = await res.json();
+            if (data.ok) show(data.job);
+        } catch (e) {
+            console.error('Detection job poll error:', e);
+        }
+    }
+
+    cancel.addEventListener('click', async function() {
+        cancel.disabled = true;
+        try {
+            const res = await fetch(`/api/detection/jobs/${jobId}/cancel`, { method: 'POST' });
+            const data = await res.json();
+            if (data.job) show(data.job);
+        } catch (e) {
+            console.error('Detection cancel error:', e);
+        } finally {
+            cancel.disabled = false;
+        }
+    });
+
+    if (typeof io !== 'undefined') {
+        const socket = io();
+        socket.emit('join_event', { event_id: panel.dataset.eventId });
+        socket.on('detection_progress', (job) => {
+            if (String(job.id) === String(jobId)) show(job);
+        });
+    }
+    // Socket updates are best effort; polling catches anything missed
+    timer = setInterval(poll, 3000);
+    poll();
+}
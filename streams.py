@@ -0,0 +1,64 @@
+import threading
+
+
+class StreamManager:
+    """Counts Socket.IO subscribers per event room.
+
+    A stream should only produce ticks while its room has at least one
+    subscriber; `subscribe` and `unsubscribe` report the transitions that
+    start and stop it. Disconnects release every room the socket had joined.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}  # event_id -> set of sids
+        self._sids = {}   # sid -> set of event_ids
+
+    def subscribe(self, sid, event_id):
+        """Register a subscriber; returns True when the room was previously empty."""
+        with self._lock:
+            members = self._rooms.setdefault(event_id, set())
+            first = not members
+            members.add(sid)
+            self._sids.setdefault(sid, set()).add(event_id)
+            return first
+
+    def unsubscribe(self, sid, event_id):
+        """Remove a subscriber; returns True when the room is now empty."""
+        with self._lock:
+            return self._remove(sid, event_id)
+
+    def disconnect(self, sid):
+        """Drop a socket from all of its rooms; returns the event ids that emptied."""
+        with self._lock:
+            emptied = []
+            for event_id in list(self._sids.get(sid, ())):
+                if self._remove(sid, event_id):
+                    emptied.append(event_id)
+            return emptied
+
+    def _remove(self, sid, event_id):
+        members = self._rooms.get(event_id)
+        joined = self._sids.get(sid)
+        if joined is not None:
+            joined.discard(event_id)
+            if not joined:
+                del self._sids[sid]
+        if not members or sid not in members:
+            return False
+        members.discard(sid)
+        if members:
+            return False
+        del self._rooms[event_id]
+        return True
+
+    def subscribers(self, event_id):
+        with self._lock:
+            return len(self._rooms.get(event_id, ()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active_streams': len(self._rooms),
+                'subscribers': {event_id: len(sids) for event_id, sids in self._rooms.items()},
+            }
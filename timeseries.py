@@ -0,0 +1,252 @@
+import math
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import DensityBlock, DensityRollup
+
+SLOTS = 60                            # 1-second readings per block
+ROLLUP_RESOLUTIONS = (60, 300, 3600)  # seconds
+RESOLUTIONS = (1,) + ROLLUP_RESOLUTIONS
+RAW_RETENTION_SECONDS = 24 * 3600     # 1-second blocks older than this are pruned; rollups are kept
+PRUNE_EVERY_SECONDS = 600
+MAX_POINTS = 720                      # point budget when the caller does not pick a resolution
+
+
+def pack(values):
+    return np.asarray(values, dtype='<f4').tobytes()
+
+
+def unpack(blob):
+    return np.frombuffer(blob, dtype='<f4')
+
+
+def pick_resolution(span_seconds, max_points=MAX_POINTS):
+    for resolution in RESOLUTIONS:
+        if span_seconds / resolution <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def _stats(values):
+    present = values[~np.isnan(values)]
+    if not len(present):
+        return None
+    return len(present), float(present.sum()), float(present.min()), float(present.max())
+
+
+_rollup_upserts = {}
+
+
+def _rollup_upsert():
+    """INSERT ... ON CONFLICT that adds a bucket's stats to an existing rollup row (built once per dialect)."""
+    dialect = db.session.get_bind().dialect.name
+    stmt = _rollup_upserts.get(dialect)
+    if stmt is None:
+        if dialect == 'postgresql':
+            insert, least, greatest = postgresql.insert, func.least, func.greatest
+        else:
+            insert, least, greatest = sqlite.insert, func.min, func.max
+        stmt = insert(DensityRollup)
+        stmt = _rollup_upserts[dialect] = stmt.on_conflict_do_update(
+            index_elements=['event_id', 'series', 'resolution', 'bucket'],
+            set_={
+                'count': DensityRollup.count + stmt.excluded['count'],
+                'total': DensityRollup.total + stmt.excluded.total,
+                'min_value': least(DensityRollup.min_value, stmt.excluded.min_value),
+                'max_value': greatest(DensityRollup.max_value, stmt.excluded.max_value),
+            },
+        )
+    return stmt
+
+
+class _Buffer:
+    __slots__ = ('minute', 'values')
+
+    def __init__(self, minute):
+        self.minute = minute
+        self.values = np.full(SLOTS, np.nan, dtype=np.float32)
+
+
+class DensitySeriesStore:
+    """Per-minute blocks of 1-second density readings with incremental rollups.
+
+    Readings for the current minute stay in memory; when a series moves to
+    the next minute its block is written as one row and its count, sum, min
+    and max are added to the 1m/5m/1h rollup rows. A slot that already holds
+    a reading is never overwritten, so flushing a partial minute early (on
+    shutdown or when a stream stops) and later readings for the same minute
+    never double count. Range queries merge the unflushed minute in.
+    """
+
+    def __init__(self, retention_seconds=RAW_RETENTION_SECONDS, clock=time.time):
+        self.retention = retention_seconds
+        self.clock = clock
+        self._buffers = {}  # event_id -> {series: _Buffer}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def record(self, event_id, readings, ts=None):
+        """Store {series: value} readings taken at `ts` (epoch seconds, default now)."""
+        ts = int(self.clock() if ts is None else ts)
+        minute = ts - ts % SLOTS
+        finished = []
+        with self._lock:
+            buffers = self._buffers.setdefault(event_id, {})
+            # Series that went quiet are finished as soon as the event moves on
+            for series, buf in list(buffers.items()):
+                if buf.minute < minute:
+                    finished.append((event_id, series, buffers.pop(series)))
+            for series, value in readings.items():
+                buf = buffers.get(series)
+                if buf is None or buf.minute != minute:
+                    if buf is not None:
+                        # Late reading for an older minute: merge it straight into its block
+                        late = _Buffer(minute)
+                        late.values[ts - minute] = value
+                        finished.append((event_id, series, late))
+                        continue
+                    buf = buffers[series] = _Buffer(minute)
+                buf.values[ts - minute] = value
+        if finished:
+            self._write(finished)
+
+    def flush(self, event_id=None):
+        """Write buffered minutes (of one event, or all) without waiting for the minute to end."""
+        with self._lock:
+            events = [event_id] if event_id is not None else list(self._buffers)
+            finished = [
+                (eid, series, buf)
+                for eid in events
+                for series, buf in self._buffers.pop(eid, {}).items()
+            ]
+        if finished:
+            self._write(finished)
+
+    def _write(self, finished):
+        try:
+            groups = {}
+            for event_id, series, buf in finished:
+                groups.setdefault((event_id, buf.minute), []).append((series, buf))
+            rollups = []
+            for (event_id, minute), bufs in groups.items():
+                existing = {
+                    block.series: block
+                    for block in db.session.scalars(select(DensityBlock).where(
+                        DensityBlock.event_id == event_id, DensityBlock.minute == minute,
+                        DensityBlock.series.in_([series for series, _ in bufs])))
+                }
+                for series, buf in bufs:
+                    block = existing.get(series)
+                    if block is None:
+                        fresh = buf.values
+                        db.session.add(DensityBlock(event_id=event_id, series=series, minute=minute, values=pack(fresh)))
+                    else:
+                        old = unpack(block.values)
+                        fill = np.isnan(old) & ~np.isnan(buf.values)
+                        fresh = np.where(fill, buf.values, np.nan).astype(np.float32)
+                        block.values = pack(np.where(fill, buf.values, old))
+                    stats = _stats(fresh)
+                    if stats is None:
+                        continue
+                    count, total, lo, hi = stats
+                    rollups.extend(
+                        {'event_id': event_id, 'series': series, 'resolution': resolution,
+                         'bucket': minute - minute % resolution, 'count': count, 'total': total,
+                         'min_value': lo, 'max_value': hi}
+                        for resolution in ROLLUP_RESOLUTIONS
+                    )
+            if rollups:
+                db.session.execute(_rollup_upsert(), rollups)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print('Density series write error:', e)
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        now = self.clock()
+        if now - self._last_prune < PRUNE_EVERY_SECONDS:
+            return
+        self._last_prune = now
+        try:
+            db.session.execute(delete(DensityBlock).where(DensityBlock.minute < int(now) - self.retention))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print('Density series prune error:', e)
+
+    def _live(self, event_id):
+        with self._lock:
+            return [(series, buf.minute, buf.values.copy()) for series, buf in self._buffers.get(event_id, {}).items()]
+
+    def query(self, event_id, start, end, resolution=None, series=None):
+        """Readings between epoch seconds `start` and `end`.
+
+        Returns (resolution, {series: [(ts, mean, min, max), ...]}) with
+        points in time order. Resolution 1 reads raw blocks; coarser ones
+        read the rollup rows.
+        """
+        resolution = resolution or pick_resolution(end - start)
+        wanted = set(series) if series else None
+        buckets = {}  # series -> {ts: [count, total, min, max]}
+
+        def add(name, ts, count, total, lo, hi):
+            acc = buckets.setdefault(name, {}).get(ts)
+            if acc is None:
+                buckets[name][ts] = [count, total, lo, hi]
+            else:
+                acc[0] += count
+                acc[1] += total
+                acc[2] = min(acc[2], lo)
+                acc[3] = max(acc[3], hi)
+
+        def add_block(name, minute, values):
+            if resolution == 1:
+                for offset in np.flatnonzero(~np.isnan(values)).tolist():
+                    ts = minute + offset
+                    if start <= ts <= end:
+                        v = float(values[offset])
+                        add(name, ts, 1, v, v, v)
+            else:
+                stats = _stats(values)
+                if stats:
+                    add(name, minute - minute % resolution, *stats)
+
+        if resolution == 1:
+            stmt = select(DensityBlock.series, DensityBlock.minute, DensityBlock.values).where(
+                DensityBlock.event_id == event_id,
+                DensityBlock.minute >= start - start % SLOTS,
+                DensityBlock.minute <= end)
+            if wanted:
+                stmt = stmt.where(DensityBlock.series.in_(wanted))
+            for name, minute, blob in db.session.execute(stmt):
+                add_block(name, minute, unpack(blob))
+        else:
+            stmt = select(DensityRollup.series, DensityRollup.bucket, DensityRollup.count, DensityRollup.total,
+                          DensityRollup.min_value, DensityRollup.max_value).where(
+                DensityRollup.event_id == event_id,
+                DensityRollup.resolution == resolution,
+                DensityRollup.bucket >= start - start % resolution,
+                DensityRollup.bucket <= end)
+            if wanted:
+                stmt = stmt.where(DensityRollup.series.in_(wanted))
+            for row in db.session.execute(stmt):
+                add(*row)
+        # The current minute has not been written yet
+        for name, minute, values in self._live(event_id):
+            if (wanted is None or name in wanted) and start - SLOTS < minute <= end:
+                add_block(name, minute, values)
+
+        out = {}
+        for name, points in buckets.items():
+            out[name] = [
+                (ts, total / count, lo, hi)
+                for ts, (count, total, lo, hi) in sorted(points.items())
+                if count and not math.isnan(total)
+            ]
+        return resolution, out